@@ -79,7 +79,8 @@ def rebuild_daily(config_dict,
                   to_date=None,
                   db_binding='wx_binding',
                   dry_run=False,
-                  no_confirm=False):
+                  no_confirm=False,
+                  workers=1):
     """Rebuild the daily summaries."""
 
     manager_dict = weewx.manager.get_manager_dict_from_config(config_dict, db_binding)
@@ -138,7 +139,8 @@ def rebuild_daily(config_dict,
             # Do the actual rebuild
             nrecs, ndays = dbm.backfill_day_summary(start_d=from_d,
                                                     stop_d=to_d,
-                                                    trans_days=20)
+                                                    trans_days=20,
+                                                    workers=workers)
     tdiff = time.time() - t1
     # advise the user/log what we did
     log.info(f"Rebuild of daily summaries in database '{database_name}' complete.")
@@ -630,7 +632,8 @@ def reweight_daily(config_dict,
                    to_date=None,
                    db_binding='wx_binding',
                    dry_run=False,
-                   no_confirm=False):
+                   no_confirm=False,
+                   workers=1):
     """Recalculate the weighted sums in the daily summaries."""
 
     manager_dict = weewx.manager.get_manager_dict_from_config(config_dict, db_binding)
@@ -672,7 +675,7 @@ def reweight_daily(config_dict,
         print(msg)
         if not dry_run:
             # Do the actual recalculations
-            dbmanager.recalculate_weights(start_d=from_d, stop_d=to_d)
+            dbmanager.recalculate_weights(start_d=from_d, stop_d=to_d, workers=workers)
 
     msg = "Finished reweighting in %.1f seconds." % (time.time() - t1)
     log.info(msg)
@@ -20,7 +20,7 @@ drop_daily_usage = f"""{bcolors.BOLD}weectl database drop-daily
             [--dry-run] [-y]{bcolors.ENDC}"""
 rebuild_usage = f"""{bcolors.BOLD}weectl database rebuild-daily
             [[--date=YYYY-mm-dd] | [--from=YYYY-mm-dd] [--to=YYYY-mm-dd]]
-            [--config=FILENAME] [--binding=BINDING-NAME] 
+            [--config=FILENAME] [--binding=BINDING-NAME] [--workers=INT]
             [--dry-run] [-y]{bcolors.ENDC}"""
 add_column_usage = f"""{bcolors.BOLD}weectl database add-column NAME
             [--type=COLUMN-DEF]
@@ -49,7 +49,7 @@ update_usage = f"""{bcolors.BOLD}weectl database update
             [--dry-run] [-y]{bcolors.ENDC}"""
 reweight_usage = f"""{bcolors.BOLD}weectl database reweight
             [[--date=YYYY-mm-dd] | [--from=YYYY-mm-dd] [--to=YYYY-mm-dd]]
-            [--config=FILENAME] [--binding=BINDING-NAME] 
+            [--config=FILENAME] [--binding=BINDING-NAME] [--workers=INT]
             [--dry-run] [-y]{bcolors.ENDC}"""
 
 database_usage = '\n       '.join((create_usage,
@@ -140,6 +140,12 @@ def add_subparser(subparsers):
                                 metavar="YYYY-mm-dd",
                                 dest='to_date',
                                 help="Rebuild ending with this date.")
+    rebuild_parser.add_argument("--workers",
+                                metavar="INT",
+                                type=int,
+                                default=1,
+                                help="Use INT processes to calculate the statistics. "
+                                     "Default is 1.")
     _add_common_args(rebuild_parser)
     rebuild_parser.set_defaults(func=weectllib.dispatch)
     rebuild_parser.set_defaults(action_func=rebuild_daily)
@@ -301,6 +307,12 @@ def add_subparser(subparsers):
                                  metavar="YYYY-mm-dd",
                                  dest='to_date',
                                  help="Reweight ending with this date.")
+    reweight_parser.add_argument("--workers",
+                                 metavar="INT",
+                                 type=int,
+                                 default=1,
+                                 help="Use INT processes to calculate the statistics. "
+                                      "Default is 1.")
     _add_common_args(reweight_parser)
     reweight_parser.set_defaults(func=weectllib.dispatch)
     reweight_parser.set_defaults(action_func=reweight_daily)
@@ -332,7 +344,8 @@ def rebuild_daily(config_dict, namespace):
                                              to_date=namespace.to_date,
                                              db_binding=namespace.binding,
                                              dry_run=namespace.dry_run,
-                                             no_confirm=namespace.yes)
+                                             no_confirm=namespace.yes,
+                                             workers=namespace.workers)
 
 
 def add_column(config_dict, namespace):
@@ -417,7 +430,8 @@ def reweight_daily(config_dict, namespace):
                                               to_date=namespace.to_date,
                                               db_binding=namespace.binding,
                                               dry_run=namespace.dry_run,
-                                              no_confirm=namespace.yes)
+                                              no_confirm=namespace.yes,
+                                              workers=namespace.workers)
 
 
 def _add_common_args(subparser):
@@ -12,8 +12,68 @@ try:
 except ImportError:
     raise ImportError("InfluxDB client not found. Install it with 'pip install influxdb-client'")
 
+import calendar
+import datetime
+import functools
+import itertools
+import logging
+import math
+import os
+import re
+import threading
+import time
+
 import weedb
-from weeutil.weeutil import to_bool
+from weeutil.weeutil import to_float, to_int
+
+log = logging.getLogger(__name__)
+
+# Tracing of individual statements, points and rows. There is a lot of it, so it is off, even
+# when debugging, unless it gets turned on in the [Logging] section of weewx.conf, either
+# altogether, or for one subsystem. For example:
+#
+#   [Logging]
+#       [[loggers]]
+#           [[[weedb.influx.trace.insert]]]
+#               level = DEBUG
+#
+trace = logging.getLogger(__name__ + '.trace')
+# Leave alone a level that has already been configured
+if trace.level == logging.NOTSET:
+    trace.setLevel(logging.INFO)
+# Inserts, and the points they write
+trace_insert = trace.getChild('insert')
+# Queries, and the rows they return
+trace_fetch = trace.getChild('fetch')
+
+# In 'batch' write mode, buffered points are written out when there are this many of them...
+DEFAULT_BATCH_SIZE = 5000
+# ... or when the oldest of them has been waiting this many seconds.
+DEFAULT_FLUSH_INTERVAL = 10.0
+
+
+def _convert_exception(e):
+    """Convert an InfluxDB, or connection, exception into the matching weedb exception."""
+    if isinstance(e, weedb.DatabaseError):
+        return e
+    if isinstance(e, ApiException):
+        # Map InfluxDB exceptions to weedb exceptions based on status code and error message
+        if e.status == 401:
+            return weedb.BadPasswordError(e)
+        elif e.status == 403:
+            return weedb.PermissionError(e)
+        elif e.status == 404:
+            if "bucket" in str(e).lower():
+                return weedb.NoDatabaseError(e)
+            else:
+                return weedb.OperationalError(e)
+        elif e.status == 409:
+            return weedb.DatabaseExistsError(e)
+        else:
+            return weedb.OperationalError(e)
+    if isinstance(e, ConnectionError):
+        return weedb.CannotConnectError("Cannot connect to InfluxDB server")
+    return weedb.OperationalError(e)
 
 
 def guard(fn):
@@ -22,34 +82,102 @@ def guard(fn):
     def guarded_fn(*args, **kwargs):
         try:
             return fn(*args, **kwargs)
-        except ApiException as e:
-            # Map InfluxDB exceptions to weedb exceptions based on status code and error message
-            if e.status == 401:
-                raise weedb.BadPasswordError(e)
-            elif e.status == 403:
-                raise weedb.PermissionError(e)
-            elif e.status == 404:
-                if "bucket" in str(e).lower():
-                    raise weedb.NoDatabaseError(e)
-                else:
-                    raise weedb.OperationalError(e)
-            elif e.status == 409:
-                raise weedb.DatabaseExistsError(e)
-            else:
-                raise weedb.OperationalError(e)
-        except ConnectionError:
-            raise weedb.CannotConnectError("Cannot connect to InfluxDB server")
+        except weedb.DatabaseError:
+            raise
         except Exception as e:
-            raise weedb.OperationalError(e)
+            raise _convert_exception(e)
 
     return guarded_fn
 
 
-def connect(host='localhost', port=8086, org='', token='', bucket='', driver='', 
-            protocol='http', **kwargs):
+class _SharedClient(object):
+    """An InfluxDB client, and its query and write APIs, shared by all the connections to a
+    bucket within this process. The APIs are safe to use from several threads at once."""
+
+    def __init__(self, key, url, token, org, bucket, **kwargs):
+        self.key = key
+        self.client = InfluxDBClient(url=url, token=token, org=org, **kwargs)
+        try:
+            # Verify the connection by checking if the bucket exists. Because the client is
+            # shared, this gets done once per process, not once per connection.
+            buckets = self.client.buckets_api().find_buckets().buckets
+            if not any(existing_bucket.name == bucket for existing_bucket in buckets):
+                raise weedb.NoDatabaseError(f"Bucket '{bucket}' does not exist")
+            self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+            self.query_api = self.client.query_api()
+        except Exception:
+            self.client.close()
+            raise
+        # The number of connections using this client
+        self.refcount = 0
+        # Things that rarely change, such as the unit system, schemas, and first and last
+        # timestamps, cached for all the connections. See Connection.invalidate_cache().
+        self.cache = {}
+
+    def close(self):
+        try:
+            self.write_api.close()
+            self.client.close()
+        except Exception:
+            pass
+
+
+# The shared clients, keyed by (url, org, token, bucket, extra client arguments)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _acquire_client(url, token, org, bucket, **kwargs):
+    """Return the shared client for a bucket, creating it if necessary."""
+    key = (url, org, token, bucket, tuple(sorted((k, str(v)) for k, v in kwargs.items())))
+    with _clients_lock:
+        shared = _clients.get(key)
+        if shared is None:
+            shared = _clients[key] = _SharedClient(key, url, token, org, bucket, **kwargs)
+        shared.refcount += 1
+        return shared
+
+
+def _release_client(shared):
+    """A connection is done with a shared client. Close it if nobody else uses it."""
+    with _clients_lock:
+        shared.refcount -= 1
+        if shared.refcount > 0:
+            return
+        if _clients.get(shared.key) is shared:
+            del _clients[shared.key]
+    shared.close()
+
+
+def _forget_bucket(bucket):
+    """Forget the shared clients of a bucket, so the next connection checks it again.
+    Connections that already use them are not affected."""
+    with _clients_lock:
+        for key in [key for key in _clients if key[3] == bucket]:
+            del _clients[key]
+
+
+def _forget_clients():
+    """The shared clients of a parent process cannot be used by a forked child: they would share
+    its sockets. The child creates its own."""
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_clients)
+
+
+def connect(host='localhost', port=8086, org='', token='', bucket='', driver='',
+            protocol='http', write_mode='sync', batch_size=DEFAULT_BATCH_SIZE,
+            flush_interval=DEFAULT_FLUSH_INTERVAL, **kwargs):
     """Connect to the specified InfluxDB database"""
-    return Connection(host=host, port=port, org=org, token=token, bucket=bucket, 
-                      protocol=protocol, **kwargs)
+    if 'connection_pool_maxsize' in kwargs:
+        kwargs['connection_pool_maxsize'] = to_int(kwargs['connection_pool_maxsize'])
+    return Connection(host=host, port=port, org=org, token=token, bucket=bucket,
+                      protocol=protocol, write_mode=write_mode, batch_size=to_int(batch_size),
+                      flush_interval=to_float(flush_interval), **kwargs)
 
 
 @guard
@@ -96,6 +224,7 @@ def drop(host='localhost', port=8086, org='', token='', bucket='', driver='',
         
         # Delete the bucket
         buckets_api.delete_bucket(bucket_id)
+        _forget_bucket(bucket)
     finally:
         client.close()
 
@@ -105,7 +234,8 @@ class Connection(weedb.Connection):
 
     @guard
     def __init__(self, host='localhost', port=8086, org='', token='', bucket='',
-                 protocol='http', **kwargs):
+                 protocol='http', write_mode='sync', batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, **kwargs):
         """Initialize an instance of Connection.
 
         Args:
@@ -115,7 +245,17 @@ class Connection(weedb.Connection):
             token (str): The authentication token
             bucket (str): The bucket to use (equivalent to database_name)
             protocol (str): The protocol to use (http or https)
-            kwargs (dict): Any extra arguments to pass to the InfluxDB client
+            write_mode (str): How points get written. Either 'sync', where each point is
+                written as soon as it is inserted, or 'batch', where points are buffered and
+                written out as one line-protocol batch. A batch is written when it holds
+                batch_size points, when its oldest point is flush_interval seconds old, or
+                when the transaction is committed. Default is 'sync'.
+            batch_size (int): The largest number of points in a batch.
+            flush_interval (float): The longest time in seconds a point waits in a batch.
+            kwargs (dict): Any extra arguments to pass to the InfluxDB client. For example,
+                connection_pool_maxsize caps the number of sockets the client keeps open.
+                Connections with the same URL, organization, token, bucket and extra
+                arguments share one client.
         """
         self.host = host
         self.port = port
@@ -124,29 +264,26 @@ class Connection(weedb.Connection):
         self.bucket = bucket
         self.protocol = protocol
         self.kwargs = kwargs
+
+        write_mode = write_mode.lower()
+        if write_mode not in ('sync', 'batch'):
+            raise ValueError("Unknown InfluxDB write mode '%s'" % write_mode)
+        self.write_mode = write_mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Points waiting to be written, in line protocol, and the time the oldest arrived
+        self._batch = []
+        self._batch_time = None
+        self._batch_lock = threading.Lock()
         
-        # Initialize the InfluxDB client
+        # Get the InfluxDB client. It is shared with any other connection to the same bucket,
+        # so they all use the same pool of HTTP sessions.
         url = f"{protocol}://{host}:{port}"
-        self.client = InfluxDBClient(url=url, token=token, org=org, **kwargs)
-        
-        # Verify the connection by checking if the bucket exists
-        buckets_api = self.client.buckets_api()
-        buckets = buckets_api.find_buckets().buckets
-        bucket_exists = False
-        for existing_bucket in buckets:
-            if existing_bucket.name == bucket:
-                bucket_exists = True
-                break
-        
-        if not bucket_exists:
-            self.close()
-            raise weedb.NoDatabaseError(f"Bucket '{bucket}' does not exist")
-        
-        # Initialize the write API for this connection
-        self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
-        
-        # Initialize the query API for this connection
-        self.query_api = self.client.query_api()
+        self._shared = _acquire_client(url, token, org, bucket, **kwargs)
+        self.client = self._shared.client
+        self.write_api = self._shared.write_api
+        self.query_api = self._shared.query_api
+        self._cache = self._shared.cache
         
         # Import Point class for creating data points
         from influxdb_client import Point
@@ -179,47 +316,77 @@ class Connection(weedb.Connection):
         
         return table_list
 
-    @guard
     def get_unit_system(self):
-        """Get the unit system from the metadata measurement"""
-        import sys
-        try:
-            # Query to get the most recent unit system value
-            query = f'''
-            from(bucket: "{self.bucket}")
-              |> range(start: -30d)
-              |> filter(fn: (r) => r._measurement == "weewx_metadata")
-              |> filter(fn: (r) => r.type == "unit_system")
-              |> last()
-            '''
-            result = self.query_api.query(query=query, org=self.org)
+        """Get the unit system from the metadata measurement. The result is cached until the
+        unit system gets written, or invalidate_cache() is called."""
+        if 'unit_system' not in self._cache:
+            # In 'batch' write mode, a unit system that has not been written out yet is the
+            # latest one, and queries cannot see it.
+            unit_system = self._get_batched_unit_system()
+            if unit_system is None:
+                try:
+                    unit_system = self._get_unit_system()
+                except weedb.DatabaseError as e:
+                    # The default is only a guess, so it does not get cached. Ask again next time.
+                    log.error("Unable to get unit system: %s. Using US.", e)
+                    return 1  # Default to US units (0x01) on error
+                if unit_system is None and self._batch:
+                    # The points waiting to be written out may yet settle it
+                    return None
+            self._cache['unit_system'] = unit_system
+        return self._cache['unit_system']
+
+    def _get_batched_unit_system(self):
+        """Return the last unit system waiting in the batch buffer, or None if there is none."""
+        with self._batch_lock:
+            for line in reversed(self._batch):
+                if line.startswith(_UNIT_SYSTEM_LINE):
+                    return int(line[len(_UNIT_SYSTEM_LINE):].split()[0].rstrip('i'))
+        return None
+
+    @guard
+    def _get_unit_system(self):
+        # Query to get the most recent unit system value
+        query = f'''
+        from(bucket: "{self.bucket}")
+          |> range(start: 0)
+          |> filter(fn: (r) => r._measurement == "weewx_metadata")
+          |> filter(fn: (r) => r.type == "unit_system")
+          |> last()
+        '''
+        result = self.query_api.query(query=query, org=self.org)
+        
+        if result and len(result) > 0 and len(result[0].records) > 0:
+            unit_system = result[0].records[0].values.get('_value')
+            # FIXME: this is hacky, but it works for now
+            # Make sure it's an integer, not a string or timestamp
+            if isinstance(unit_system, str) and unit_system.isdigit():
+                unit_system = int(unit_system)
+            elif not isinstance(unit_system, int):
+                log.warning("Unparseable unit system '%s' in metadata. Using US.",
+                            unit_system)
+                unit_system = 1  # Default to US units if not parseable
             
-            if result and len(result) > 0 and len(result[0].records) > 0:
-                unit_system = result[0].records[0].values.get('_value')
-                # FIXME: this is hacky, but it works for now
-                # Make sure it's an integer, not a string or timestamp
-                if isinstance(unit_system, str) and unit_system.isdigit():
-                    unit_system = int(unit_system)
-                elif not isinstance(unit_system, int):
-                    print(f"DEBUG: Converting unit system to integer: {unit_system}", file=sys.stderr)
-                    unit_system = 1  # Default to US units if not parseable
-                
-                print(f"DEBUG: Found unit system in metadata: {unit_system}", file=sys.stderr)
-                return unit_system
-            else:
-                print(f"DEBUG: No unit system found in metadata, using default (1)", file=sys.stderr)
-                return 1  # Default to US units (0x01)
-        except Exception as e:
-            print(f"DEBUG: Error getting unit system: {e}, using default (1)", file=sys.stderr)
-            return 1  # Default to US units (0x01) on error
+            log.debug("Found unit system 0x%02x in metadata", unit_system)
+            return unit_system
+        else:
+            # The bucket has never been written to, so the unit system is still
+            # indeterminate.
+            return None
         
-    @guard
     def genSchemaOf(self, measurement):
         """Return a summary of the schema of the specified measurement.
         
         In InfluxDB, we don't have a fixed schema, but we can try to discover 
-        the fields being used in a measurement."""
-        
+        the fields being used in a measurement. What is discovered is cached until a new
+        field gets inserted, or invalidate_cache() is called."""
+        key = ('schema', measurement)
+        schema = self._cache.get(key)
+        if schema is None:
+            schema = self._cache[key] = list(self._gen_schema(measurement))
+        return iter(schema)
+
+    def _gen_schema(self, measurement):
         try:
             # Query to get field keys for the specified measurement
             query = f'''
@@ -250,10 +417,15 @@ class Connection(weedb.Connection):
             # Map fields to types
             # This is a simplification as InfluxDB has different field types
             # For now, assume everything is REAL since we're dealing with weather data
-            irow = 0
+            # The timestamp of a point plays the part of the primary key, dateTime.
+            yield (0, 'dateTime', 'INTEGER', False, None, True)
+            irow = 1
             for field in field_list:
+                if field == 'dateTime':
+                    continue
                 # Yield tuple of (number, column_name, column_type, can_be_null, default_value, is_primary)
-                yield (irow, field, 'REAL', True, None, False)
+                yield (irow, field, 'INTEGER' if field in _INTEGER_COLUMNS else 'REAL',
+                       True, None, False)
                 irow += 1
             
             # Add tags
@@ -325,6 +497,78 @@ class Connection(weedb.Connection):
         """Return the unit system in use by this database."""
         return self.get_unit_system()
 
+    def first_last(self, measurement):
+        """Return the first and last timestamps of a measurement, as a tuple. They are cached
+        until invalidate_cache() is called, and kept up to date by inserts."""
+        key = ('first_last', measurement)
+        if key not in self._cache:
+            with self.cursor() as cursor:
+                self._cache[key] = tuple(cursor.execute(
+                    "SELECT MIN(dateTime), MAX(dateTime) FROM %s" % measurement).fetchone())
+        return self._cache[key]
+
+    def invalidate_cache(self):
+        """Forget the cached unit system, schemas, and first and last timestamps. Because the
+        cache is shared, this affects all connections to the bucket."""
+        self._cache.clear()
+
+    def _note_insert(self, measurement, columns, timestamp):
+        """A point with the given columns and timestamp has been inserted into a measurement.
+        Bring the cache up to date."""
+        schema = self._cache.get(('schema', measurement))
+        if schema is not None and not set(columns) <= {row[1] for row in schema}:
+            # There is a new field
+            del self._cache[('schema', measurement)]
+        first_last = self._cache.get(('first_last', measurement))
+        if first_last is not None and isinstance(timestamp, (int, float)):
+            first, last = first_last
+            self._cache[('first_last', measurement)] \
+                = (timestamp if first is None else min(first, timestamp),
+                   timestamp if last is None else max(last, timestamp))
+
+    def write_point(self, point):
+        """Write a point to the bucket. In 'batch' write mode, the point is buffered, and the
+        buffer is written out if it is full, or has been waiting too long.
+
+        Args:
+            point (influxdb_client.Point): The point to be written.
+        """
+        if self.write_mode == 'sync':
+            self.write_api.write(bucket=self.bucket, org=self.org, record=point)
+            return
+
+        with self._batch_lock:
+            if not self._batch:
+                self._batch_time = time.time()
+            self._batch.append(point.to_line_protocol())
+            if len(self._batch) < self.batch_size \
+                    and time.time() - self._batch_time < self.flush_interval:
+                return
+        self.flush()
+
+    def is_pending(self, point):
+        """True if a point is waiting in the batch buffer to be written out.
+
+        Args:
+            point (influxdb_client.Point): The point to look for.
+        """
+        line = point.to_line_protocol()
+        with self._batch_lock:
+            # A point being looked for is most likely one of the last ones
+            return any(pending == line for pending in reversed(self._batch))
+
+    @guard
+    def flush(self):
+        """Write out any buffered points as a single batch."""
+        with self._batch_lock:
+            batch = self._batch
+            self._batch = []
+            self._batch_time = None
+            if batch:
+                # If the write fails, the points are dropped. The caller will see the exception,
+                # just as it would have in 'sync' mode.
+                self.write_api.write(bucket=self.bucket, org=self.org, record=batch)
+
     @guard
     def begin(self):
         """InfluxDB doesn't support traditional transactions in the same way as SQL databases.
@@ -333,26 +577,32 @@ class Connection(weedb.Connection):
 
     @guard
     def commit(self):
-        """InfluxDB doesn't support traditional transactions in the same way as SQL databases.
-        This is a no-op for compatibility."""
-        pass
+        """InfluxDB doesn't support traditional transactions. However, in 'batch' write mode,
+        the points inserted since the last commit get written out."""
+        self.flush()
 
     @guard
     def rollback(self):
-        """InfluxDB doesn't support traditional transactions in the same way as SQL databases.
-        This is a no-op for compatibility."""
-        pass
+        """InfluxDB doesn't support traditional transactions. However, in 'batch' write mode,
+        any points that have not yet been written out get discarded."""
+        with self._batch_lock:
+            if any(line.startswith(_UNIT_SYSTEM_LINE) for line in self._batch):
+                # The unit system that was cached is not going to be written
+                self._cache.pop('unit_system', None)
+            self._batch = []
+            self._batch_time = None
 
     @guard
     def close(self):
         """Close the database connection."""
         try:
-            if hasattr(self, 'write_api') and self.write_api:
-                self.write_api.close()
-            if hasattr(self, 'client') and self.client:
-                self.client.close()
-        except Exception:
-            pass
+            if hasattr(self, '_batch'):
+                self.flush()
+        finally:
+            # The client is shared. Let it go, rather than close it.
+            shared, self._shared = getattr(self, '_shared', None), None
+            if shared is not None:
+                _release_client(shared)
 
 
 class Cursor(weedb.Cursor):
@@ -365,12 +615,11 @@ class Cursor(weedb.Cursor):
         connection: An instance of weedb.influx.Connection"""
         self.connection = connection
         self.query_api = connection.query_api
-        self.write_api = connection.write_api
         self.org = connection.org
         self.bucket = connection.bucket
-        self._results = None
+        # Iterator over the rows of the current result set. Each row is a tuple.
+        self._rows = iter(())
         self._rowcount = 0
-        self._current_record_index = 0
 
     @guard
     def execute(self, sql_string, sql_tuple=()):
@@ -379,60 +628,60 @@ class Cursor(weedb.Cursor):
         sql_string: A query string. This can be either SQL or Flux.
         sql_tuple: Values to be substituted into the query placeholders.
         """
-        self._results = None
+        self._rows = iter(())
         self._rowcount = 0
-        self._current_record_index = 0
-        
+
         # Check if this is an INSERT statement
         if sql_string.strip().upper().startswith('INSERT'):
             return self._execute_insert(sql_string, sql_tuple)
         
-        # Check if this is a direct Flux query (starts with 'from' or another Flux keyword)
-        elif sql_string.strip().lower().startswith(('from', 'import')):
+        # Check if this is a direct Flux query (starts with 'from' or another Flux keyword, or
+        # uses the pipe-forward operator, which SQL never does)
+        elif sql_string.strip().lower().startswith(('from', 'import')) or '|>' in sql_string:
             return self._execute_flux(sql_string, sql_tuple)
         
         # Otherwise, attempt to translate SQL to Flux
         else:
             return self._execute_sql(sql_string, sql_tuple)
     
+    def executemany(self, sql_string, sql_tuples):
+        """Execute a statement once for each of a sequence of tuples. The points of INSERT
+        statements are buffered by the connection, like any others."""
+        for sql_tuple in sql_tuples:
+            self.execute(sql_string, sql_tuple)
+        return self
+
     @guard
     def _execute_insert(self, sql_string, sql_tuple=()):
         """Handle INSERT statements by converting to InfluxDB point format."""
         # Parse the INSERT statement
         # Example: INSERT INTO archive (dateTime, outTemp, barometer) VALUES (?, ?, ?)
-        
-        # Add debug logging
-        import sys
-        print(f"DEBUG: Processing INSERT statement into InfluxDB", file=sys.stderr)
-        print(f"DEBUG: SQL: {sql_string}", file=sys.stderr)
-        print(f"DEBUG: Values: {sql_tuple}", file=sys.stderr)
-        
+
+        # Tracing is decided once per statement, so nothing gets formatted if it is off.
+        tracing = trace_insert.isEnabledFor(logging.DEBUG)
+        if tracing:
+            trace_insert.debug("SQL: %s; values: %s", sql_string, sql_tuple)
+
         # First, extract the table/measurement name
-        import re
         match = re.search(r'INSERT\s+INTO\s+(\w+)', sql_string, re.IGNORECASE)
         if not match:
-            print(f"DEBUG: Error - Invalid INSERT statement format", file=sys.stderr)
             raise weedb.OperationalError("Invalid INSERT statement format")
         
         measurement = match.group(1)
-        print(f"DEBUG: Measurement/Table: {measurement}", file=sys.stderr)
         
         # Extract column names and values
         columns_match = re.search(r'\(([^)]+)\)\s+VALUES\s+\(([^)]+)\)', sql_string, re.IGNORECASE)
         if not columns_match:
-            print(f"DEBUG: Error - Could not extract columns and values", file=sys.stderr)
             raise weedb.OperationalError("Invalid INSERT statement format")
         
         # Get column names and strip any backticks
         columns = [col.strip().strip('`') for col in columns_match.group(1).split(',')]
-        print(f"DEBUG: Columns: {columns}", file=sys.stderr)
         
         # Get placeholders and check if they match the provided values
         placeholders = columns_match.group(2).split(',')
         if len(placeholders) != len(sql_tuple):
-            print(f"DEBUG: Error - Mismatch between placeholders and values", file=sys.stderr)
-            print(f"DEBUG: Placeholders: {len(placeholders)}, Values: {len(sql_tuple)}", file=sys.stderr)
-            raise weedb.OperationalError("Mismatch between placeholders and values")
+            raise weedb.OperationalError("Mismatch between placeholders (%d) and values (%d)"
+                                         % (len(placeholders), len(sql_tuple)))
         
         # Create a Point object for the measurement
         from influxdb_client import Point
@@ -457,78 +706,74 @@ class Cursor(weedb.Cursor):
                 if not isinstance(usunits_value, int) or usunits_value > 255:
                     usunits_value = 1  # Default to US units (0x01)
                     
-                print(f"DEBUG: Setting unit system to: {usunits_value}", file=sys.stderr)
-                
-                # Write a special record for unit system tracking
-                unit_point = Point('weewx_metadata')
-                unit_point = unit_point.tag('type', 'unit_system')
-                unit_point = unit_point.field('value', usunits_value)
-                
-                try:
-                    self.write_api.write(bucket=self.bucket, org=self.org, record=unit_point)
-                    print(f"DEBUG: Successfully stored unit system metadata: {usunits_value}", file=sys.stderr)
-                except Exception as e:
-                    print(f"DEBUG: Error storing unit system metadata: {e}", file=sys.stderr)
+                # Write a special record for unit system tracking. There is no need if it is
+                # already known to be there.
+                if self.connection._cache.get('unit_system') != usunits_value:
+                    unit_point = Point('weewx_metadata')
+                    unit_point = unit_point.tag('type', 'unit_system')
+                    unit_point = unit_point.field('value', usunits_value)
+
+                    try:
+                        self.connection.write_point(unit_point)
+                        self.connection._cache['unit_system'] = usunits_value
+                        if tracing:
+                            trace_insert.debug("Stored unit system metadata: %s", usunits_value)
+                    except Exception as e:
+                        # Whatever is there now is unknown
+                        self.connection._cache.pop('unit_system', None)
+                        log.error("Unable to store unit system metadata: %s", e)
         
         # Map columns to values and add them to the point
         for i, column in enumerate(columns):
             column = column.strip()
             value = sql_tuple[i]
             
-            print(f"DEBUG: Processing column: {column} = {value}", file=sys.stderr)
-            
             # Special handling for dateTime column (used as timestamp in InfluxDB)
             if column.lower() == 'datetime':
                 from datetime import datetime
                 # Convert Unix timestamp to datetime
                 if isinstance(value, (int, float)):
                     timestamp = datetime.utcfromtimestamp(value)
-                    print(f"DEBUG: Using dateTime as timestamp: {timestamp}", file=sys.stderr)
                 else:
                     timestamp = value
-                    print(f"DEBUG: Using dateTime as timestamp (non-numeric): {timestamp}", file=sys.stderr)
             # Special handling for known metadata fields that should be tags, not fields
             elif column.lower() in ('station', 'station_type'):
                 point = point.tag(column, str(value))
-                print(f"DEBUG: Added tag: {column} = {value}", file=sys.stderr)
             # Special handling for usUnits - add as both tag and field for improved compatibility
             elif column.lower() == 'usunits':
                 point = point.tag(column, str(value))
                 point = point.field(column, value)
-                print(f"DEBUG: Added usUnits as both tag and field: {value}", file=sys.stderr)
             # Special handling for interval - add as both tag and field for compatibility
             elif column.lower() == 'interval':
                 point = point.tag(column, str(value))
                 point = point.field(column, value)
-                print(f"DEBUG: Added interval as both tag and field: {value}", file=sys.stderr)
             else:
                 # All other values go into fields
                 try:
                     point = point.field(column, value)
-                    print(f"DEBUG: Added field: {column} = {value}", file=sys.stderr)
                 except Exception as e:
                     # Skip null values for now - InfluxDB doesn't support them
-                    if value is None:
-                        print(f"DEBUG: Skipping NULL value for field: {column}", file=sys.stderr)
-                    else:
-                        print(f"DEBUG: Error adding field {column} = {value}: {e}", file=sys.stderr)
+                    if value is not None:
+                        log.error("Unable to add field %s = %s: %s", column, value, e)
                         raise
         
         # Set the timestamp if one was found
         if timestamp:
             point = point.time(timestamp)
-            print(f"DEBUG: Set point timestamp to: {timestamp}", file=sys.stderr)
         else:
-            print(f"DEBUG: WARNING - No timestamp found in record", file=sys.stderr)
+            log.warning("No timestamp found in record inserted into '%s'", measurement)
         
         # Write the point to InfluxDB
         try:
-            print(f"DEBUG: Writing point to InfluxDB bucket: {self.bucket}", file=sys.stderr)
-            self.write_api.write(bucket=self.bucket, org=self.org, record=point)
-            print(f"DEBUG: Successfully wrote point to InfluxDB", file=sys.stderr)
+            self.connection.write_point(point)
         except Exception as e:
-            print(f"DEBUG: Error writing to InfluxDB: {e}", file=sys.stderr)
+            log.error("Unable to write to InfluxDB bucket '%s': %s", self.bucket, e)
             raise
+        if tracing:
+            trace_insert.debug("Wrote point: %s", point)
+        self.connection._note_insert(measurement, columns,
+                                     sql_tuple[columns.index('dateTime')]
+                                     if 'dateTime' in columns else None)
         
         # Set rowcount to indicate a successful insert
         self._rowcount = 1
@@ -551,47 +796,40 @@ class Cursor(weedb.Cursor):
         else:
             query = flux_query
         
-        # Execute the query
-        self._results = self.query_api.query(query=query, org=self.org)
-        
-        # Count the total number of records
-        self._rowcount = 0
-        if self._results:
-            for table in self._results:
-                self._rowcount += len(table.records)
-        
+        trace_fetch.debug("Flux: %s", query)
+
+        # Stream the results. Rows are converted from Flux records as they are fetched, so
+        # large result sets are never held in memory all at once.
+        records = self.query_api.query_stream(query=query, org=self.org)
+        self._rows = _gen_rows(records)
+        # The number of rows is not known until the stream has been consumed:
+        self._rowcount = -1
+
         return self
-    
+
     @guard
     def _execute_sql(self, sql_string, sql_tuple=()):
         """Translate SQL to Flux and execute."""
         # Handle special cases first
-        import re
-        
+
         # Handle the "SELECT sqlite_version()" query
         if re.search(r'SELECT\s+sqlite_version\(\)', sql_string, re.IGNORECASE):
             # Return a dummy version for compatibility
-            self._results = None
-            self._rowcount = 1
-            self._special_result = [("InfluxDB 2.x compatibility",)]
+            self._set_rows([("InfluxDB 2.x compatibility",)])
             return self
         
         # Handle "SELECT name FROM sqlite_master" query
         if re.search(r'SELECT\s+name\s+FROM\s+sqlite_master', sql_string, re.IGNORECASE):
             # Return the list of measurements as "tables"
             tables = self.connection.tables()
-            self._results = None
-            self._rowcount = len(tables)
-            self._special_result = [(table,) for table in tables]
+            self._set_rows([(table,) for table in tables])
             return self
         
         # Handle "SELECT COUNT(*) FROM sqlite_master" query
         if re.search(r'SELECT\s+COUNT\(\*\)\s+FROM\s+sqlite_master', sql_string, re.IGNORECASE):
             # Return the count of measurements as "tables"
             tables = self.connection.tables()
-            self._results = None
-            self._rowcount = 1
-            self._special_result = [(len(tables),)]
+            self._set_rows([(len(tables),)])
             return self
         
         # Handle "PRAGMA table_info(X)" query
@@ -600,253 +838,535 @@ class Cursor(weedb.Cursor):
             measurement = pragma_match.group(1)
             # Generate schema info for the table
             schema = list(self.connection.genSchemaOf(measurement))
-            self._results = None
-            self._rowcount = len(schema)
-            self._special_result = schema
+            self._set_rows(schema)
             return self
         
-        # Standard SQL query handling
-        try:
-            # Extract the table/measurement name
-            match = re.search(r'FROM\s+(\w+)', sql_string, re.IGNORECASE)
-            if not match:
-                # Some queries from WeeWX don't have a FROM clause, like "SELECT SQLITE_VERSION()"
-                # For these, we'll return empty results
-                self._results = None
-                self._rowcount = 0
-                return self
-            
-            measurement = match.group(1)
-            
-            # Extract the WHERE clause if it exists
-            where_match = re.search(r'WHERE\s+(.+?)(?:ORDER BY|GROUP BY|LIMIT|$)', sql_string, re.IGNORECASE)
-            where_clause = where_match.group(1).strip() if where_match else None
-            
-            # Extract the ORDER BY clause if it exists
-            order_match = re.search(r'ORDER BY\s+(.+?)(?:LIMIT|$)', sql_string, re.IGNORECASE)
-            order_clause = order_match.group(1).strip() if order_match else None
-            
-            # Extract the LIMIT clause if it exists
-            limit_match = re.search(r'LIMIT\s+(\d+)', sql_string, re.IGNORECASE)
-            limit = int(limit_match.group(1)) if limit_match else None
-            
-            # Start building the Flux query
-            flux_query = f'from(bucket: "{self.bucket}")\n'
-            
-            # Add time range filter if specified in WHERE clause
-            # This is a simple implementation - we're looking for datetime comparisons
-            time_range_start = None
-            time_range_stop = None
-            
-            if where_clause:
-                # Look for dateTime > X
-                start_match = re.search(r'dateTime\s*>\s*(\d+)', where_clause)
-                if start_match:
-                    time_range_start = int(start_match.group(1))
-                
-                # Look for dateTime < X
-                stop_match = re.search(r'dateTime\s*<\s*(\d+)', where_clause)
-                if stop_match:
-                    time_range_stop = int(stop_match.group(1))
-            
-            if time_range_start and time_range_stop:
-                # Convert Unix timestamps to RFC3339 format for Flux
-                from datetime import datetime
-                start_time = datetime.utcfromtimestamp(time_range_start).isoformat() + 'Z'
-                stop_time = datetime.utcfromtimestamp(time_range_stop).isoformat() + 'Z'
-                flux_query += f'  |> range(start: {start_time}, stop: {stop_time})\n'
-            elif time_range_start:
-                from datetime import datetime
-                start_time = datetime.utcfromtimestamp(time_range_start).isoformat() + 'Z'
-                flux_query += f'  |> range(start: {start_time})\n'
-            elif time_range_stop:
-                from datetime import datetime
-                stop_time = datetime.utcfromtimestamp(time_range_stop).isoformat() + 'Z'
-                flux_query += f'  |> range(stop: {stop_time})\n'
-            else:
-                # Default to recent data if no time range specified
-                flux_query += '  |> range(start: -30d)\n'
-            
-            # Filter by measurement name
-            flux_query += f'  |> filter(fn: (r) => r._measurement == "{measurement}")\n'
-            
-            # Add ordering if specified
-            if order_clause:
-                if 'desc' in order_clause.lower():
-                    flux_query += '  |> sort(columns: ["_time"], desc: true)\n'
-                else:
-                    flux_query += '  |> sort(columns: ["_time"])\n'
-            
-            # Add limit if specified
-            if limit:
-                flux_query += f'  |> limit(n: {limit})\n'
-            
-            # Execute the generated Flux query
-            return self._execute_flux(flux_query, sql_tuple)
-            
-        except Exception as e:
-            # Log the error for debugging
-            import sys
-            print(f"Error in _execute_sql: {e}", file=sys.stderr)
-            print(f"SQL: {sql_string}", file=sys.stderr)
-            
-            # Return empty results rather than raising an exception
-            self._results = None
-            self._rowcount = 0
+        # Tables (measurements) come into existence when they are first written to
+        if re.match(r'\s*CREATE\s+TABLE', sql_string, re.IGNORECASE):
             return self
 
+        template, params = _normalize(sql_string, sql_tuple)
+        plan = _compile(template)
+        flux_query = plan.flux(self.bucket, params)
+        trace_fetch.debug("SQL: %s; values: %s; Flux: %s", sql_string, sql_tuple, flux_query)
+        if flux_query is None:
+            # The time range is empty. No need to ask the server.
+            self._set_rows(plan.empty_result(params))
+        else:
+            # Rows of a 'SELECT *' are laid out like the schema of the measurement
+            schema = None
+            if plan.items is None:
+                schema = [(row[1], row[2]) for row in self.connection.genSchemaOf(plan.measurement)]
+            records = self.query_api.query_stream(query=flux_query, org=self.org)
+            self._rows = plan.gen_rows(records, params, schema)
+            self._rowcount = -1
+        return self
+
+    def _set_rows(self, rows):
+        """Use an already materialized list of rows as the result set."""
+        self._rows = iter(rows)
+        self._rowcount = len(rows)
+
     def fetchone(self):
-        """Fetch the next row of a query result set."""
-        # Handle special results (sqlite compatibility layer)
-        if hasattr(self, '_special_result'):
-            if self._current_record_index < self._rowcount:
-                result = self._special_result[self._current_record_index]
-                self._current_record_index += 1
-                return result
-            else:
-                return None
-        
-        # Handle normal InfluxDB query results
-        if not self._results or self._current_record_index >= self._rowcount:
-            return None
-        
-        # Find the appropriate record
-        current_count = 0
-        for table in self._results:
-            for record in table.records:
-                if current_count == self._current_record_index:
-                    self._current_record_index += 1
-                    
-                    # Convert InfluxDB record to a tuple format similar to what SQLite would return
-                    values = []
-                    
-                    # Handle timestamp - store it as Unix timestamp for WeeWX compatibility
-                    if '_time' in record.values:
-                        from datetime import datetime
-                        timestamp = record.values.get('_time')
-                        if isinstance(timestamp, datetime):
-                            # Convert to Unix timestamp
-                            import calendar
-                            values.append(calendar.timegm(timestamp.utctimetuple()))
-                        else:
-                            values.append(timestamp)
-                    
-                    # Add all field values, skipping internal fields that start with _
-                    for field in sorted(record.values.keys()):
-                        if field not in ('_time', '_measurement', '_field', '_value', 'result', 'table') and not field.startswith('_'):
-                            value = record.values.get(field)
-                            # Convert known numeric string values to their appropriate type
-                            if field.lower() == 'interval' and isinstance(value, str) and value.isdigit():
-                                value = int(value)
-                            elif field.lower() == 'usunits' and isinstance(value, str) and value.isdigit():
-                                value = int(value)
-                            values.append(value)
-                    
-                    # Ensure essential fields like interval are included
-                    # This handles the case where interval might be stored as a tag and not a field
-                    if 'interval' in record.values and record.values['interval'] not in values:
-                        values.append(record.values['interval'])
-                    # Check for interval in tags (which are not included in record.values by default)
-                    elif hasattr(record, 'values') and record.values.get('_measurement') == 'archive' and 'interval' not in record.values:
-                        # Try to get interval from tags if available
-                        interval_value = None
-                        try:
-                            interval_value = record.values.get('interval')
-                        except:
-                            pass
-                        
-                        if interval_value is not None:
-                            # Convert to int if it's a string
-                            if isinstance(interval_value, str) and interval_value.isdigit():
-                                interval_value = int(interval_value)
-                            values.append(interval_value)
-                        else:
-                            # Add a default interval value of 5 minutes (300 seconds) if not found
-                            import sys
-                            print(f"DEBUG: Adding default interval value for record", file=sys.stderr)
-                            values.append(5)
-                    
-                    # Add _value field which contains the actual measurement value in InfluxDB
-                    if '_value' in record.values:
-                        values.append(record.values.get('_value'))
-                    
-                    return tuple(values)
-                current_count += 1
-        
-        return None
+        """Fetch the next row of a query result set, or None if there are no more rows."""
+        return next(self._rows, None)
 
     def fetchall(self):
         """Fetch all remaining rows of a query result."""
-        # Handle special results
-        if hasattr(self, '_special_result'):
-            # Get all remaining records from the special result
-            results = self._special_result[self._current_record_index:]
-            self._current_record_index = self._rowcount
-            return results
-        
-        # Handle normal results
-        if not self._results:
-            return []
-        
-        all_records = []
-        while True:
-            record = self.fetchone()
-            if record is None:
-                break
-            all_records.append(record)
-        
-        return all_records
+        return list(self._rows)
 
     def fetchmany(self, size=None):
-        """Fetch the next set of rows of a query result."""
-        # Handle special results
-        if hasattr(self, '_special_result'):
-            if size is None:
-                size = self._rowcount
-            
-            end_idx = min(self._current_record_index + size, self._rowcount)
-            results = self._special_result[self._current_record_index:end_idx]
-            self._current_record_index = end_idx
-            return results
-        
-        # Handle normal results
-        if not self._results:
-            return []
-        
+        """Fetch the next set of rows of a query result. If size is None, fetch all
+        remaining rows."""
         if size is None:
-            size = self._rowcount
-        
-        records = []
-        for _ in range(size):
-            record = self.fetchone()
-            if record is None:
-                break
-            records.append(record)
-        
-        return records
+            return self.fetchall()
+        return list(itertools.islice(self._rows, size))
 
     def close(self):
         """Close the cursor."""
-        self._results = None
+        # If a stream is still open, this will close the underlying HTTP response.
+        if hasattr(self._rows, 'close'):
+            self._rows.close()
+        self._rows = iter(())
         self._rowcount = 0
-        self._current_record_index = 0
 
     def __enter__(self):
         return self
 
     def __exit__(self, etyp, einst, etb):
         self.close()
-        
+
     def __iter__(self):
         """Make the cursor iterable."""
-        # Handle special results
-        if hasattr(self, '_special_result'):
-            for record in self._special_result:
-                yield record
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+
+# Columns of the archive that hold integers. InfluxDB may well return them as floats.
+_INTEGER_COLUMNS = {'dateTime', 'usUnits', 'interval'}
+
+# How a line-protocol point of the unit system starts, up to its value
+_UNIT_SYSTEM_LINE = 'weewx_metadata,type=unit_system value='
+
+# Columns added by the Flux engine that do not carry data
+_FLUX_COLUMNS = {'result', 'table', '_start', '_stop', '_time', '_measurement', '_field', '_value'}
+
+
+def _gen_rows(records):
+    """Generator function that converts a stream of Flux records into row tuples.
+
+    All records in a Flux table share the same columns, so the layout of a row is worked
+    out once per table, not once per record.
+
+    Each row holds the timestamp (as unix epoch time), then any tag values in sorted order,
+    then the value of the record.
+    """
+    layout_table = None
+    tag_names = []
+    pad_interval = False
+    tracing = trace_fetch.isEnabledFor(logging.DEBUG)
+    try:
+        for record in records:
+            values = record.values
+            if record.table != layout_table:
+                layout_table = record.table
+                tag_names = sorted(k for k in values
+                                   if k not in _FLUX_COLUMNS and not k.startswith('_'))
+                # Archive records are expected to carry an interval. If it is not a tag,
+                # a default will be substituted.
+                pad_interval = values.get('_measurement') == 'archive' \
+                    and 'interval' not in values
+
+            row = []
+            if '_time' in values:
+                timestamp = values['_time']
+                if isinstance(timestamp, datetime.datetime):
+                    # Convert to unix epoch time
+                    timestamp = calendar.timegm(timestamp.utctimetuple())
+                row.append(timestamp)
+
+            for tag in tag_names:
+                value = values[tag]
+                # Tags are strings. Convert those known to be integers.
+                if tag in ('interval', 'usUnits') and isinstance(value, str) \
+                        and value.isdigit():
+                    value = int(value)
+                row.append(value)
+
+            if pad_interval:
+                # Add a default interval value of 5 minutes
+                if tracing:
+                    trace_fetch.debug("Adding default interval value for record at %s",
+                                      row[0] if row else None)
+                row.append(5)
+
+            # Add _value field which contains the actual measurement value in InfluxDB
+            if '_value' in values:
+                row.append(values['_value'])
+
+            yield tuple(row)
+    except weedb.DatabaseError:
+        raise
+    except Exception as e:
+        raise _convert_exception(e)
+    finally:
+        if hasattr(records, 'close'):
+            records.close()
+
+
+#
+# ######################## Translation of SQL to Flux ##############################
+#
+# The driver understands the subset of SQL that WeeWX uses to read the archive. That is, a single
+# SELECT statement of the form
+#
+#   SELECT * | item [, item ...] FROM table
+#     [WHERE condition [AND condition ...]]
+#     [ORDER BY order [ASC|DESC] [, ...]]
+#     [LIMIT n]
+#
+# where an item is a column, a literal, or one of MIN, MAX, SUM, AVG, COUNT of a column; a
+# condition is 'column op value' or 'column IS [NOT] NULL'; and an order is a column or
+# 'ABS(dateTime - value)'. Conditions on dateTime become the range of the query. The fields
+# that are needed get pivoted into one row per timestamp.
+#
+# Literals are pulled out of a statement before it is parsed, so that statements that differ
+# only in their values share a compiled plan.
+
+# Literal values: placeholders, strings, and numbers that are not part of a name
+_LITERAL_RE = re.compile(r"\?|'(?:[^']|'')*'|(?<![\w.`])\d+(?:\.\d+)?(?![\w.])")
+_TOKEN_RE = re.compile(r"\s*(?:(<=|>=|<>|!=|[=<>(),*;?\-])|`?([A-Za-z_]\w*)`?)")
+
+_AGGREGATES = {'MIN': 'min', 'MAX': 'max', 'SUM': 'sum', 'AVG': 'mean', 'COUNT': 'count'}
+_OPERATORS = {'=': '==', '<>': '!=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+
+def _normalize(sql_string, sql_tuple):
+    """Replace the literals and placeholders in an SQL statement with '?'.
+
+    Returns:
+        tuple[str, list]: The statement, and the values of its placeholders, in order.
+    """
+    params = iter(sql_tuple)
+    values = []
+
+    def replace(match):
+        token = match.group(0)
+        if token == '?':
+            try:
+                values.append(next(params))
+            except StopIteration:
+                raise weedb.ProgrammingError("Not enough parameters for statement: %s"
+                                             % sql_string)
+        elif token[0] == "'":
+            values.append(token[1:-1].replace("''", "'"))
+        elif '.' in token:
+            values.append(float(token))
+        else:
+            values.append(int(token))
+        return '?'
+
+    return _LITERAL_RE.sub(replace, sql_string), values
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(template):
+    """Compile a normalized SQL statement into a plan. Plans are cached."""
+    return _Parser(template).parse()
+
+
+def _flux_value(value):
+    """Express a Python value as a Flux literal."""
+    if isinstance(value, str):
+        return '"%s"' % value.replace('\\', '\\\\').replace('"', '\\"')
+    return repr(value)
+
+
+class _Parser:
+    """A recursive-descent parser for the SQL subset."""
+
+    def __init__(self, template):
+        self.template = template
+        self.tokens = []
+        pos = 0
+        template = template.rstrip()
+        while pos < len(template):
+            match = _TOKEN_RE.match(template, pos)
+            if not match or match.end() == pos:
+                self.fail()
+            self.tokens.append(match.group(1) or match.group(2))
+            pos = match.end()
+        self.pos = 0
+        # Placeholders get numbered in the order they appear
+        self.nparams = 0
+
+    def fail(self):
+        raise weedb.OperationalError("SQL statement not supported by InfluxDB: %s"
+                                     % self.template)
+
+    def peek(self):
+        return self.tokens[self.pos].upper() if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.pos] if self.pos < len(self.tokens) else self.fail()
+        self.pos += 1
+        return token
+
+    def accept(self, keyword):
+        if self.peek() == keyword:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, keyword):
+        if not self.accept(keyword):
+            self.fail()
+
+    def name(self):
+        token = self.take()
+        if not (token[0].isalpha() or token[0] == '_'):
+            self.fail()
+        return token
+
+    def param(self):
+        self.expect('?')
+        self.nparams += 1
+        return self.nparams - 1
+
+    def parse(self):
+        self.expect('SELECT')
+        items = self.parse_items()
+        self.expect('FROM')
+        plan = _Plan(self.name(), items)
+        if self.accept('WHERE'):
+            plan.add_condition(*self.parse_condition())
+            while self.accept('AND'):
+                plan.add_condition(*self.parse_condition())
+        if self.accept('ORDER'):
+            self.expect('BY')
+            plan.add_order(*self.parse_order())
+            while self.accept(','):
+                plan.add_order(*self.parse_order())
+        if self.accept('LIMIT'):
+            plan.limit = self.param()
+        self.accept(';')
+        if self.peek() is not None:
+            self.fail()
+        plan.compile()
+        return plan
+
+    def parse_items(self):
+        if self.accept('*'):
+            return None
+        items = [self.parse_item()]
+        while self.accept(','):
+            items.append(self.parse_item())
+        return items
+
+    def parse_item(self):
+        """Returns a tuple (kind, column, flux_function), where kind is 'literal', 'column' or
+        'aggregate'. The column of a literal is the number of its parameter."""
+        if self.peek() == '?':
+            item = ('literal', self.param(), None)
+        else:
+            column = self.name()
+            if self.accept('('):
+                if column.upper() not in _AGGREGATES:
+                    self.fail()
+                argument = 'dateTime' if self.accept('*') else self.name()
+                self.expect(')')
+                item = ('aggregate', argument, _AGGREGATES[column.upper()])
+            else:
+                item = ('column', column, None)
+        if self.accept('AS'):
+            self.name()
+        return item
+
+    def parse_condition(self):
+        """Returns a tuple (column, operator, parameter)"""
+        column = self.name()
+        if self.accept('IS'):
+            operator = 'IS NOT' if self.accept('NOT') else 'IS'
+            self.expect('NULL')
+            return column, operator, None
+        operator = self.take()
+        if operator not in _OPERATORS:
+            self.fail()
+        return column, operator, self.param()
+
+    def parse_order(self):
+        """Returns a tuple (column, descending, parameter). The parameter is only used by
+        'ABS(dateTime - ?)', for which the column is None."""
+        if self.accept('ABS'):
+            self.expect('(')
+            if self.name() != 'dateTime':
+                self.fail()
+            self.expect('-')
+            param = self.param()
+            self.expect(')')
+            column = None
+        else:
+            column, param = self.name(), None
+        descending = self.accept('DESC')
+        if not descending:
+            self.accept('ASC')
+        return column, descending, param
+
+
+class _Plan:
+    """A compiled SELECT statement."""
+
+    def __init__(self, measurement, items):
+        self.measurement = measurement
+        # None means '*'
+        self.items = items
+        # Bounds on dateTime, as (operator, parameter) pairs
+        self.time_bounds = []
+        # Conditions on other columns, as Flux expressions
+        self.filters = []
+        # Sort keys, as (column, descending)
+        self.orders = []
+        # The parameter holding the time for 'ORDER BY ABS(dateTime - ?)'
+        self.delta_param = None
+        self.limit = None
+        self.columns = set()
+        self.template = None
+
+    @property
+    def is_aggregate(self):
+        return self.items is not None and any(kind == 'aggregate' for kind, _, _ in self.items)
+
+    def add_column(self, column):
+        if column != 'dateTime':
+            self.columns.add(column)
+
+    def add_condition(self, column, operator, param):
+        if column == 'dateTime' and param is not None:
+            self.time_bounds.append((operator, param))
             return
-            
-        # Return an iterator that yields each record
-        record = self.fetchone()
-        while record is not None:
-            yield record
-            record = self.fetchone()
\ No newline at end of file
+        self.add_column(column)
+        if operator == 'IS':
+            self.filters.append('not exists r.%s' % column)
+        elif operator == 'IS NOT':
+            self.filters.append('exists r.%s' % column)
+        else:
+            self.filters.append('r.%s %s %%(p%d)s' % (column, _OPERATORS[operator], param))
+
+    def add_order(self, column, descending, param):
+        if column is None:
+            self.delta_param = param
+            column = '_delta'
+        elif column == 'dateTime':
+            column = '_time'
+        else:
+            self.add_column(column)
+        self.orders.append((column, descending))
+
+    def compile(self):
+        """Put together the Flux template."""
+        if self.items is not None:
+            for kind, column, _ in self.items:
+                if kind != 'literal':
+                    self.add_column(column)
+
+        measurement_filter = 'r._measurement == "%s"' % self.measurement
+        if self.items is not None:
+            # Only fetch the fields that are needed
+            measurement_filter += ' and (%s)' % ' or '.join(
+                'r._field == "%s"' % column for column in sorted(self.columns)) \
+                if self.columns else ''
+        lines = ['from(bucket: "%(bucket)s")',
+                 '  |> %(range)s',
+                 '  |> filter(fn: (r) => %s)' % measurement_filter]
+        if self.columns or self.items is None:
+            # Tags would get in the way of the pivot
+            lines += ['  |> keep(columns: ["_time", "_field", "_value"])',
+                      '  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")']
+        else:
+            # Only the timestamps are needed
+            lines.append('  |> keep(columns: ["_time"]) |> group()')
+            if not self.is_aggregate \
+                    or any(function == 'count' for _, _, function in self.items):
+                lines.append('  |> unique(column: "_time")')
+        if self.filters:
+            lines.append('  |> filter(fn: (r) => %s)' % ' and '.join(self.filters))
+
+        if self.is_aggregate:
+            # Each item becomes its own result
+            lines[0] = 'data = ' + lines[0]
+            for i, (kind, column, function) in enumerate(self.items):
+                if kind == 'literal':
+                    continue
+                flux_column = '_time' if column == 'dateTime' else column
+                if kind == 'column':
+                    # As in SQLite, a bare column takes its value from any one of the rows
+                    function = 'last'
+                lines.append('data |> %s(column: "%s") |> keep(columns: ["%s"]) '
+                             '|> yield(name: "%d")' % (function, flux_column, flux_column, i))
+        else:
+            if self.delta_param is not None:
+                lines.append('  |> map(fn: (r) => ({r with _delta: '
+                             'math.abs(x: float(v: int(v: r._time) / 1000000000) '
+                             '- float(v: %%(p%d)s))}))'
+                             % self.delta_param)
+                lines.insert(0, 'import "math"')
+            for column, descending in self.orders:
+                lines.append('  |> sort(columns: ["%s"], desc: %s)'
+                             % (column, 'true' if descending else 'false'))
+            if self.limit is not None:
+                lines.append('  |> limit(n: %%(p%d)s)' % self.limit)
+        self.template = '\n'.join(lines)
+
+    def time_range(self, params):
+        """Work out the Flux range from the bounds on dateTime.
+
+        Returns:
+            tuple[int, int|None]: Start (inclusive) and stop (exclusive) of the range. A stop of
+                None means no upper limit.
+        """
+        start, stop = 0, None
+        for operator, param in self.time_bounds:
+            value = params[param]
+            if operator in ('>', '>=', '='):
+                bound = math.floor(value) + 1 if operator == '>' else math.ceil(value)
+                start = max(start, bound)
+            if operator in ('<', '<=', '='):
+                bound = math.ceil(value) if operator == '<' else math.floor(value) + 1
+                stop = bound if stop is None else min(stop, bound)
+            if operator in ('<>', '!='):
+                raise weedb.OperationalError("Unsupported condition on dateTime")
+        return start, stop
+
+    def flux(self, bucket, params):
+        """Return the Flux query for a set of parameters, or None if no data can match."""
+        start, stop = self.time_range(params)
+        if stop is None:
+            flux_range = 'range(start: %d)' % start
+        elif start < stop:
+            flux_range = 'range(start: %d, stop: %d)' % (start, stop)
+        else:
+            return None
+        interp_dict = {'p%d' % i: _flux_value(value) for i, value in enumerate(params)}
+        interp_dict['bucket'] = bucket
+        interp_dict['range'] = flux_range
+        return self.template % interp_dict
+
+    def empty_result(self, params):
+        """The result of the statement if there is no data."""
+        return [tuple(self.aggregate_defaults(params))] if self.is_aggregate else []
+
+    def aggregate_defaults(self, params):
+        return [params[column] if kind == 'literal'
+                else 0 if function == 'count' else None
+                for kind, column, function in self.items]
+
+    def gen_rows(self, records, params, schema=None):
+        """Generator function that shapes the Flux records into rows of the statement.
+
+        The pivoted records of a 'SELECT *' are laid out according to schema, a list of
+        (column name, column type) tuples, with None for any field a point does not have.
+        """
+        try:
+            if self.is_aggregate:
+                row = self.aggregate_defaults(params)
+                for record in records:
+                    i = int(record.values['result'])
+                    kind, column, function = self.items[i]
+                    row[i] = _get_column(record.values, column)
+                yield tuple(row)
+            else:
+                if self.items is None:
+                    items = [('column', column, column_type == 'INTEGER')
+                             for column, column_type in schema]
+                else:
+                    items = [(kind, column, column in _INTEGER_COLUMNS)
+                             for kind, column, _ in self.items]
+                for record in records:
+                    yield tuple(params[column] if kind == 'literal'
+                                else _get_column(record.values, column, integer)
+                                for kind, column, integer in items)
+        except weedb.DatabaseError:
+            raise
+        except Exception as e:
+            raise _convert_exception(e)
+        finally:
+            if hasattr(records, 'close'):
+                records.close()
+
+
+def _get_column(values, column, integer=False):
+    """Get the value of a column from the values of a Flux record."""
+    if column == 'dateTime':
+        timestamp = values.get('_time')
+        if isinstance(timestamp, datetime.datetime):
+            timestamp = calendar.timegm(timestamp.utctimetuple())
+        return timestamp
+    value = values.get(column)
+    if integer and value is not None:
+        value = int(value)
+    return value
@@ -248,6 +248,21 @@ class Cursor(weedb.Cursor):
 
         return self
 
+    @guard
+    def executemany(self, sql_string, sql_tuples):
+        """Execute a SQL statement once for each of a sequence of tuples. For an INSERT or
+        REPLACE, MySQLdb sends them to the server as a single statement with many rows.
+
+        sql_string: A SQL statement to be executed. It should use ? as
+        a placeholder.
+
+        sql_tuples: An iterable of tuples with the values to be used in the placeholders."""
+
+        mysql_string = sql_string.replace('?', '%s')
+        self.cursor.executemany(mysql_string, [tuple(sql_tuple) for sql_tuple in sql_tuples])
+
+        return self
+
     def fetchone(self):
         # Get a result from the MySQL cursor, then run it through the _massage
         # filter below
@@ -232,6 +232,10 @@ class Cursor(sqlite3.Cursor, weedb.Cursor):
     def execute(self, *args, **kwargs):
         return sqlite3.Cursor.execute(self, *args, **kwargs)
 
+    @guard
+    def executemany(self, *args, **kwargs):
+        return sqlite3.Cursor.executemany(self, *args, **kwargs)
+
     @guard
     def fetchone(self):
         return sqlite3.Cursor.fetchone(self)
@@ -0,0 +1,539 @@
+#
+#    Copyright (c) 2009-2024 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test the InfluxDB driver of the weedb package.
+
+These tests do not need an InfluxDB server. Instead, the driver is given a stand-in client,
+whose query and write APIs record what they are asked to do, and replay canned Flux records.
+"""
+
+import datetime
+import logging
+import types
+import unittest
+from unittest import mock
+
+try:
+    from influxdb_client.client.flux_table import FluxRecord
+    import weedb.influx
+    have_influx = True
+except ImportError:
+    have_influx = False
+
+import weedb
+
+
+def make_record(table, ts, field, value, **tags):
+    """Make a Flux record, similar to what the query API would return."""
+    values = {'result': '_result', 'table': table,
+              '_time': datetime.datetime.fromtimestamp(ts, datetime.timezone.utc),
+              '_measurement': 'archive', '_field': field, '_value': value}
+    values.update(tags)
+    return FluxRecord(table, values)
+
+
+def make_row(ts, result='_result', **fields):
+    """Make a Flux record, similar to what a pivoted query would return."""
+    values = {'result': result, 'table': 0}
+    if ts is not None:
+        values['_time'] = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+    values.update(fields)
+    return FluxRecord(0, values)
+
+
+class FakeQueryApi:
+    """Replays canned records. Remembers the queries it has been asked to run."""
+
+    def __init__(self, records=None, fields=None, unit_system=None):
+        self.records = records or []
+        # The field keys the schema queries report, and the unit system in the metadata
+        self.fields = fields or []
+        self.unit_system = unit_system
+        self.queries = []
+        self.nstreamed = 0
+
+    def query(self, query, org=None, params=None):
+        self.queries.append(query)
+        if 'schema.fieldKeys' in query:
+            return [types.SimpleNamespace(records=[FluxRecord(0, {'_value': field})
+                                                   for field in self.fields])]
+        if 'weewx_metadata' in query and self.unit_system is not None:
+            return [types.SimpleNamespace(records=[FluxRecord(0, {'_value': self.unit_system})])]
+        return []
+
+    def query_stream(self, query, org=None, params=None):
+        self.queries.append(query)
+        for record in self.records:
+            self.nstreamed += 1
+            yield record
+
+
+class FakeWriteApi:
+    """Remembers what it has been asked to write."""
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, bucket, org=None, record=None, **kwargs):
+        self.writes.append(record)
+
+    def close(self):
+        pass
+
+
+class FakeBucketsApi:
+
+    # How many times the buckets have been looked up
+    nfinds = 0
+
+    def find_buckets(self):
+        FakeBucketsApi.nfinds += 1
+        return types.SimpleNamespace(buckets=[types.SimpleNamespace(name='test_bucket')])
+
+
+class FakeClient:
+    """Stand-in for influxdb_client.InfluxDBClient."""
+
+    # The records the next client will replay, the fields of its schema, and its unit system
+    records = []
+    fields = []
+    unit_system = None
+
+    def __init__(self, url, token, org, **kwargs):
+        self._query_api = FakeQueryApi(FakeClient.records, FakeClient.fields,
+                                       FakeClient.unit_system)
+        self._write_api = FakeWriteApi()
+
+    def buckets_api(self):
+        return FakeBucketsApi()
+
+    def query_api(self):
+        return self._query_api
+
+    def write_api(self, write_options=None):
+        return self._write_api
+
+    def close(self):
+        pass
+
+
+def connect(records=None, fields=None, unit_system=None, **kwargs):
+    """Return a weedb.influx.Connection that uses a FakeClient"""
+    FakeClient.records = records or []
+    FakeClient.fields = fields or []
+    FakeClient.unit_system = unit_system
+    # Start with a fresh client, rather than one shared with an earlier test
+    weedb.influx._clients.clear()
+    with mock.patch('weedb.influx.InfluxDBClient', FakeClient):
+        return weedb.influx.connect(org='test_org', token='test_token', bucket='test_bucket',
+                                    **kwargs)
+
+
+@unittest.skipIf(not have_influx, "InfluxDB client not installed")
+class TestCursor(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [make_record(i // 10, 1000 + 300 * i, 'outTemp', float(i),
+                                    interval='5', usUnits='1')
+                        for i in range(100)]
+        self.connection = connect(self.records)
+
+    def test_fetchone(self):
+        cursor = weedb.influx.Cursor(self.connection)
+        cursor.execute('from(bucket: "test_bucket") |> range(start: 0)')
+        self.assertEqual(cursor.fetchone(), (1000, 5, 1, 0.0))
+        self.assertEqual(cursor.fetchone(), (1300, 5, 1, 1.0))
+        # The stream should be consumed lazily
+        self.assertEqual(self.connection.query_api.nstreamed, 2)
+
+    def test_fetchmany(self):
+        cursor = weedb.influx.Cursor(self.connection)
+        cursor.execute('from(bucket: "test_bucket") |> range(start: 0)')
+        rows = cursor.fetchmany(30)
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(rows[-1][-1], 29.0)
+        self.assertEqual(self.connection.query_api.nstreamed, 30)
+        rows = cursor.fetchmany(100)
+        self.assertEqual(len(rows), 70)
+        self.assertEqual(cursor.fetchmany(10), [])
+        self.assertIsNone(cursor.fetchone())
+
+    def test_fetchall(self):
+        cursor = weedb.influx.Cursor(self.connection)
+        cursor.execute('from(bucket: "test_bucket") |> range(start: 0)')
+        cursor.fetchone()
+        rows = cursor.fetchall()
+        self.assertEqual(len(rows), 99)
+        self.assertEqual([row[-1] for row in rows], [float(i) for i in range(1, 100)])
+
+    def test_iterate(self):
+        cursor = weedb.influx.Cursor(self.connection)
+        rows = list(cursor.execute('from(bucket: "test_bucket") |> range(start: 0)'))
+        self.assertEqual(len(rows), 100)
+        self.assertEqual([row[0] for row in rows], [1000 + 300 * i for i in range(100)])
+
+    def test_reexecute(self):
+        # A special result must not leak into the next query on the same cursor
+        cursor = weedb.influx.Cursor(self.connection)
+        cursor.execute("SELECT sqlite_version()")
+        self.assertEqual(len(cursor.fetchall()), 1)
+        cursor.execute('from(bucket: "test_bucket") |> range(start: 0)')
+        self.assertEqual(len(cursor.fetchall()), 100)
+
+    def test_flux_dispatch(self):
+        # A Flux script that does not start with 'from' should still go straight to the server
+        cursor = weedb.influx.Cursor(self.connection)
+        query = 'data = from(bucket: "test_bucket") |> range(start: 0)\ndata |> last()'
+        cursor.execute(query)
+        cursor.fetchone()
+        self.assertEqual(self.connection.query_api.queries, [query])
+
+    def test_stream_error(self):
+        def bad_stream(query, org=None, params=None):
+            yield self.records[0]
+            raise ConnectionError("Lost connection")
+
+        self.connection.query_api.query_stream = bad_stream
+        cursor = weedb.influx.Cursor(self.connection)
+        cursor.execute('from(bucket: "test_bucket") |> range(start: 0)')
+        cursor.fetchone()
+        with self.assertRaises(weedb.CannotConnectError):
+            cursor.fetchone()
+
+
+@unittest.skipIf(not have_influx, "InfluxDB client not installed")
+class TestSql(unittest.TestCase):
+    """Test the translation of SQL into Flux"""
+
+    def test_select(self):
+        connection = connect([make_row(1000, outTemp=20.5, usUnits=1),
+                              make_row(1300, usUnits=1)])
+        cursor = connection.cursor()
+        rows = cursor.execute("SELECT dateTime, outTemp, usUnits FROM archive "
+                              "WHERE dateTime > ? AND dateTime <= ? ORDER BY dateTime ASC",
+                              (700, 1300)).fetchall()
+        self.assertEqual(rows, [(1000, 20.5, 1), (1300, None, 1)])
+        query = connection.query_api.queries[0]
+        # The conditions on dateTime become the range...
+        self.assertIn('range(start: 701, stop: 1301)', query)
+        # ... and only the needed fields get fetched, and pivoted
+        self.assertIn('r._field == "outTemp" or r._field == "usUnits"', query)
+        self.assertIn('pivot(rowKey: ["_time"]', query)
+        self.assertIn('sort(columns: ["_time"], desc: false)', query)
+
+    def test_conditions(self):
+        connection = connect([make_row(1000, windSpeed=5.0, windDir=270.0, usUnits=1)])
+        cursor = connection.cursor()
+        row = cursor.execute("SELECT windSpeed, windDir, usUnits FROM archive "
+                             "WHERE dateTime >= 600 AND dateTime < 1200 "
+                             "AND windSpeed IS NOT NULL AND windDir <> ? "
+                             "ORDER BY windSpeed DESC LIMIT 1;", (0,)).fetchone()
+        self.assertEqual(row, (5.0, 270.0, 1))
+        query = connection.query_api.queries[0]
+        self.assertIn('range(start: 600, stop: 1200)', query)
+        self.assertIn('filter(fn: (r) => exists r.windSpeed and r.windDir != 0)', query)
+        self.assertIn('sort(columns: ["windSpeed"], desc: true)', query)
+        self.assertIn('limit(n: 1)', query)
+
+    def test_aggregate(self):
+        connection = connect([make_row(None, result='0', rain=0.25),
+                              make_row(1300, result='1', usUnits=1),
+                              make_row(1300, result='2', usUnits=1)])
+        row = connection.cursor().execute("SELECT SUM(rain), MIN(usUnits), MAX(usUnits) "
+                                          "FROM archive WHERE dateTime>? AND dateTime<=?",
+                                          (700, 1300)).fetchone()
+        self.assertEqual(row, (0.25, 1, 1))
+        query = connection.query_api.queries[0]
+        self.assertIn('data |> sum(column: "rain")', query)
+        self.assertIn('yield(name: "2")', query)
+
+    def test_aggregate_no_data(self):
+        connection = connect()
+        row = connection.cursor().execute("SELECT COUNT(dateTime), MAX(outTemp) "
+                                          "FROM archive").fetchone()
+        self.assertEqual(row, (0, None))
+
+    def test_empty_range(self):
+        connection = connect()
+        cursor = connection.cursor()
+        self.assertIsNone(cursor.execute("SELECT * FROM archive WHERE dateTime > ? "
+                                         "AND dateTime <= ?", (1000, 1000)).fetchone())
+        self.assertEqual(cursor.execute("SELECT MAX(dateTime) FROM archive "
+                                        "WHERE dateTime > ? AND dateTime <= ?",
+                                        (1000, 1000)).fetchone(), (None,))
+        # There is no need to ask the server
+        self.assertEqual(connection.query_api.queries, [])
+
+    def test_nearest(self):
+        connection = connect([make_row(1200, outTemp=20.5, _delta=10.0)], fields=['outTemp'])
+        row = connection.cursor().execute("SELECT * FROM archive WHERE dateTime>=? "
+                                          "AND dateTime<=? ORDER BY ABS(dateTime-?) ASC "
+                                          "LIMIT 1", (900, 1500, 1210)).fetchone()
+        self.assertEqual(row, (1200, 20.5))
+        self.assertIn('sort(columns: ["_delta"], desc: false)', connection.query_api.queries[-1])
+
+    def test_select_all(self):
+        fields = ['barometer', 'interval', 'outTemp', 'usUnits']
+        connection = connect([make_row(1000, interval=5.0, outTemp=20.5, usUnits=1.0),
+                              make_row(1300, barometer=30.1, interval=5.0, usUnits=1.0)],
+                             fields=fields)
+        self.assertEqual(connection.columnsOf('archive'), ['dateTime'] + fields)
+        rows = connection.cursor().execute("SELECT * FROM archive WHERE dateTime > ? "
+                                           "AND dateTime <= ?", (700, 1300)).fetchall()
+        # One row per timestamp, laid out like the schema. Integer columns are integers.
+        self.assertEqual(rows, [(1000, None, 5, 20.5, 1), (1300, 30.1, 5, None, 1)])
+        self.assertIsInstance(rows[0][2], int)
+
+    def test_plan_cache(self):
+        connection = connect()
+        cursor = connection.cursor()
+        sql = "SELECT MIN(outTemp) FROM archive WHERE dateTime > %d AND dateTime <= %d"
+        cursor.execute(sql % (1000, 2000))
+        hits = weedb.influx._compile.cache_info().hits
+        # A statement that differs only in its values should not get compiled again
+        cursor.execute(sql % (2000, 3000)).fetchone()
+        self.assertEqual(weedb.influx._compile.cache_info().hits, hits + 1)
+        self.assertIn('range(start: 2001, stop: 3001)', connection.query_api.queries[-1])
+
+    def test_unsupported(self):
+        cursor = connect().cursor()
+        with self.assertRaises(weedb.OperationalError):
+            cursor.execute("SELECT a.outTemp FROM archive a, archive b")
+        with self.assertRaises(weedb.OperationalError):
+            cursor.execute("DELETE FROM archive")
+
+
+@unittest.skipIf(not have_influx, "InfluxDB client not installed")
+class TestSharedClient(unittest.TestCase):
+    """Test the sharing of clients between connections"""
+
+    def open(self, bucket='test_bucket', **kwargs):
+        with mock.patch('weedb.influx.InfluxDBClient', FakeClient):
+            return weedb.influx.connect(org='test_org', token='test_token', bucket=bucket,
+                                        **kwargs)
+
+    def test_shared(self):
+        connection1 = connect()
+        nfinds = FakeBucketsApi.nfinds
+        connection2 = self.open()
+        # The second connection uses the same client, and does not check the bucket again
+        self.assertIs(connection2.client, connection1.client)
+        self.assertIs(connection2.query_api, connection1.query_api)
+        self.assertEqual(FakeBucketsApi.nfinds, nfinds)
+        # Different client arguments get a different client
+        connection3 = self.open(connection_pool_maxsize='4')
+        self.assertIsNot(connection3.client, connection1.client)
+        for connection in (connection1, connection2, connection3):
+            connection.close()
+
+    def test_release(self):
+        connection1 = connect()
+        connection2 = self.open()
+        with mock.patch.object(FakeClient, 'close') as close:
+            connection1.close()
+            # Still in use by the second connection
+            close.assert_not_called()
+            connection2.close()
+            close.assert_called_once()
+        self.assertEqual(weedb.influx._clients, {})
+        # Closing twice does no harm
+        connection2.close()
+
+    def test_no_bucket(self):
+        connect().close()
+        with self.assertRaises(weedb.NoDatabaseError):
+            self.open(bucket='no_such_bucket')
+        self.assertEqual(weedb.influx._clients, {})
+
+
+@unittest.skipIf(not have_influx, "InfluxDB client not installed")
+class TestCache(unittest.TestCase):
+    """Test the caching of the unit system, schemas, and first and last timestamps"""
+
+    insert = "INSERT INTO archive (`dateTime`, `usUnits`, `interval`, `outTemp`) " \
+             "VALUES (?, ?, ?, ?)"
+
+    def test_unit_system(self):
+        connection = connect(unit_system=16)
+        self.assertEqual(connection.std_unit_system, 16)
+        self.assertEqual(connection.std_unit_system, 16)
+        self.assertEqual(len(connection.query_api.queries), 1)
+        # Writing the unit system updates the cache
+        connection.cursor().execute(self.insert, (1000, 1, 5, 20.0))
+        self.assertEqual(connection.std_unit_system, 1)
+        self.assertEqual(len(connection.query_api.queries), 1)
+        connection.invalidate_cache()
+        self.assertEqual(connection.std_unit_system, 16)
+        self.assertEqual(len(connection.query_api.queries), 2)
+
+    def test_unit_system_error(self):
+        connection = connect(unit_system=16)
+        with mock.patch.object(connection.query_api, 'query', side_effect=OSError("down")):
+            self.assertEqual(connection.std_unit_system, 1)
+        # The fallback is not cached
+        self.assertEqual(connection.std_unit_system, 16)
+
+    def test_batched_unit_system(self):
+        connection = connect(write_mode='batch')
+        cursor = connection.cursor()
+        cursor.execute(self.insert, (1000, 16, 5, 20.0))
+        connection.invalidate_cache()
+        # The unit system waiting to be written out is the one that counts
+        self.assertEqual(connection.std_unit_system, 16)
+        self.assertEqual(connection.query_api.queries, [])
+        connection.commit()
+        # Points are waiting to be written out, but the unit system is not among them
+        cursor.execute(self.insert, (1300, 16, 5, 20.0))
+        connection.invalidate_cache()
+        self.assertIsNone(connection.std_unit_system)
+        self.assertIsNone(connection.std_unit_system)
+        self.assertEqual(len(connection.query_api.queries), 2)
+        # Nothing is waiting, so the answer can be cached
+        connection.commit()
+        self.assertIsNone(connection.std_unit_system)
+        self.assertIsNone(connection.std_unit_system)
+        self.assertEqual(len(connection.query_api.queries), 3)
+
+    def test_unit_system_rollback(self):
+        connection = connect(write_mode='batch', unit_system=1)
+        connection.cursor().execute(self.insert, (1000, 16, 5, 20.0))
+        connection.rollback()
+        # The unit system was never written
+        self.assertEqual(connection.std_unit_system, 1)
+
+    def test_no_unit_system(self):
+        connection = connect()
+        self.assertIsNone(connection.std_unit_system)
+
+    def test_unit_system_written_once(self):
+        connection = connect()
+        cursor = connection.cursor()
+        for i in range(3):
+            cursor.execute(self.insert, (1000 + 300 * i, 1, 5, 20.0))
+        # One point for the unit system, three for the archive
+        self.assertEqual(len(connection.write_api.writes), 4)
+
+    def test_schema(self):
+        connection = connect(fields=['interval', 'outTemp', 'usUnits'])
+        self.assertEqual(connection.columnsOf('archive'),
+                         ['dateTime', 'interval', 'outTemp', 'usUnits'])
+        connection.columnsOf('archive')
+        self.assertEqual(len(connection.query_api.queries), 2)
+        # Inserting known fields leaves the schema alone...
+        connection.cursor().execute(self.insert, (1000, 1, 5, 20.0))
+        connection.columnsOf('archive')
+        self.assertEqual(len(connection.query_api.queries), 2)
+        # ... but a new one means it must be discovered again
+        connection.cursor().execute("INSERT INTO archive (`dateTime`, `usUnits`, `rain`) "
+                                    "VALUES (?, ?, ?)", (1300, 1, 0.1))
+        connection.columnsOf('archive')
+        self.assertEqual(len(connection.query_api.queries), 4)
+
+    def test_first_last(self):
+        connection = connect([make_row(1000, result='0'), make_row(2000, result='1')])
+        self.assertEqual(connection.first_last('archive'), (1000, 2000))
+        self.assertEqual(connection.first_last('archive'), (1000, 2000))
+        self.assertEqual(len(connection.query_api.queries), 1)
+        # Inserts keep it up to date
+        connection.cursor().execute(self.insert, (2300, 1, 5, 20.0))
+        self.assertEqual(connection.first_last('archive'), (1000, 2300))
+        self.assertEqual(len(connection.query_api.queries), 1)
+
+    def test_shared(self):
+        connection1 = connect(unit_system=1)
+        with mock.patch('weedb.influx.InfluxDBClient', FakeClient):
+            connection2 = weedb.influx.connect(org='test_org', token='test_token',
+                                               bucket='test_bucket')
+        self.assertEqual(connection1.std_unit_system, 1)
+        self.assertEqual(connection2.std_unit_system, 1)
+        self.assertEqual(len(connection1.query_api.queries), 1)
+
+
+@unittest.skipIf(not have_influx, "InfluxDB client not installed")
+class TestWrite(unittest.TestCase):
+
+    insert = "INSERT INTO archive (`dateTime`, `usUnits`, `interval`, `outTemp`) " \
+             "VALUES (?, ?, ?, ?)"
+
+    def test_sync(self):
+        connection = connect()
+        with weedb.Transaction(connection) as cursor:
+            cursor.execute(self.insert, (1000, 1, 5, 20.0))
+            # The point should have been written immediately
+            self.assertTrue(connection.write_api.writes)
+
+    def test_batch(self):
+        connection = connect(write_mode='batch', batch_size='1000')
+        with weedb.Transaction(connection) as cursor:
+            for i in range(10):
+                cursor.execute(self.insert, (1000 + 300 * i, 1, 5, 20.0 + i))
+            # Nothing should have been written yet
+            self.assertEqual(connection.write_api.writes, [])
+        # Committing the transaction should have written everything in one batch
+        self.assertEqual(len(connection.write_api.writes), 1)
+        batch = connection.write_api.writes[0]
+        self.assertTrue(all(isinstance(line, str) for line in batch))
+        self.assertIn('outTemp=29', batch[-1])
+
+    def test_batch_size(self):
+        connection = connect(write_mode='batch', batch_size='8')
+        with weedb.Transaction(connection) as cursor:
+            for i in range(10):
+                cursor.execute(self.insert, (1000 + 300 * i, 1, 5, 20.0 + i))
+            # The unit system gets written once, along with the first archive point. So, one
+            # full batch should be out.
+            self.assertEqual([len(batch) for batch in connection.write_api.writes], [8])
+        self.assertEqual([len(batch) for batch in connection.write_api.writes], [8, 3])
+
+    def test_pending(self):
+        connection = connect(write_mode='batch')
+        point = connection.Point('archive_day__metadata').tag('name', 'lastUpdate') \
+            .field('value', '1000')
+        self.assertFalse(connection.is_pending(point))
+        connection.write_point(point)
+        self.assertTrue(connection.is_pending(point))
+        connection.flush()
+        self.assertFalse(connection.is_pending(point))
+
+    def test_flush_interval(self):
+        connection = connect(write_mode='batch', flush_interval='0')
+        connection.cursor().execute(self.insert, (1000, 1, 5, 20.0))
+        self.assertTrue(connection.write_api.writes)
+
+    def test_trace(self):
+        connection = connect()
+        cursor = connection.cursor()
+        # Off by default, even if debugging...
+        with mock.patch.object(weedb.influx.trace_insert, 'debug') as debug, \
+                mock.patch.object(logging.getLogger(), 'level', logging.DEBUG):
+            cursor.execute(self.insert, (1000, 1, 5, 20.0))
+        debug.assert_not_called()
+        # ... but it can be turned on
+        with self.assertLogs('weedb.influx.trace.insert', 'DEBUG') as logs:
+            cursor.execute(self.insert, (1300, 1, 5, 21.0))
+        self.assertIn('outTemp=21', logs.output[-1])
+
+    def test_rollback(self):
+        connection = connect(write_mode='batch')
+        with self.assertRaises(ZeroDivisionError):
+            with weedb.Transaction(connection) as cursor:
+                cursor.execute(self.insert, (1000, 1, 5, 20.0))
+                1 / 0
+        connection.close()
+        self.assertEqual(connection.write_api.writes, [])
+
+    def test_close(self):
+        connection = connect(write_mode='batch')
+        connection.cursor().execute(self.insert, (1000, 1, 5, 20.0))
+        connection.close()
+        self.assertEqual(len(connection.write_api.writes), 1)
+
+    def test_bad_mode(self):
+        with self.assertRaises(weedb.OperationalError):
+            connect(write_mode='foo')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -133,6 +133,22 @@ class Common(unittest.TestCase):
                 self.assertIsNotNone(_row)
                 self.assertIsNone(_row[0])
 
+    def test_executemany(self):
+        self.populate_db()
+        with weedb.connect(self.db_dict) as _connect:
+            with weedb.Transaction(_connect) as _cursor:
+                _cursor.executemany("REPLACE INTO test2 (dateTime, max, maxtime) VALUES (?, ?, ?)",
+                                    [(irec, 2 * irec, irec) for irec in range(5)])
+                _cursor.executemany("UPDATE test1 SET sum=? WHERE dateTime = ?",
+                                    [(irec + 0.5, irec) for irec in range(0, 20, 2)])
+            with _connect.cursor() as _cursor:
+                _cursor.execute("SELECT dateTime, max FROM test2")
+                self.assertEqual([tuple(_row) for _row in _cursor],
+                                 [(irec, 2 * irec) for irec in range(5)])
+                _cursor.execute("SELECT dateTime, sum FROM test1")
+                for i, _row in enumerate(_cursor):
+                    self.assertEqual(_row[1], i + 0.5 if i % 2 == 0 else None)
+
     def test_bad_select(self):
         self.populate_db()
         with weedb.connect(self.db_dict) as _connect:
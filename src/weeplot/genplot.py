@@ -390,7 +390,8 @@ class GeneralPlot:
                            maxdx = maxdx)
             elif this_line.plot_type == 'bar' :
                 for x, y, bar_width in zip(this_line.x, this_line.y, this_line.bar_width):
-                    if y is None:
+                    # A null is None, or NaN in an array
+                    if y is None or y != y:
                         continue
                     sdraw.rectangle(((x - bar_width, self.yscale[0]), (x, y)), fill=fill_color, outline=color)
             elif this_line.plot_type == 'vector' :
@@ -554,8 +555,7 @@ class GeneralPlot:
                     yline_max = None
                 yline_min = - yline_max if yline_max is not None else None
             else:
-                yline_min = min_with_none(line.y)
-                yline_max = max_with_none(line.y)
+                yline_min, yline_max = weeplot.utilities.min_max(line.y)
             ymin = min_with_none([ymin, yline_min])
             ymax = max_with_none([ymax, yline_max])
 
@@ -584,8 +584,7 @@ class GeneralPlot:
     def _calcXMinMax(self):
         xmin = xmax = None
         for line in self.line_list:
-            xline_min = min_with_none(line.x)
-            xline_max = max_with_none(line.x)
+            xline_min, xline_max = weeplot.utilities.min_max(line.x)
             # If the line represents a bar chart, then the actual minimum has to
             # be adjusted for the bar width of the first point
             if line.plot_type == 'bar':
@@ -6,8 +6,11 @@
 """Test functions in weeplot.utilities"""
 
 import os
+import random
 import unittest
 
+from PIL import Image, ImageDraw
+
 from weeplot.utilities import *
 from weeplot.utilities import _rel_approx_equal
 from weeutil.weeutil import timestamp_to_string as to_string
@@ -170,6 +173,53 @@ class WeePlotUtilTest(unittest.TestCase):
                                                      [(5.1, 50), (6, 60), (7, 70),
                                                       (8, 80), (9, 90)]])
 
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_array_seq_line(self):
+        """Test function array_seq_line() against xy_seq_line()"""
+        cases = [
+            ([1, 2, 3], [10, 20, 30], None),
+            ([0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [0, 10, None, 30, None, None, 60, 70, 80, None], None),
+            ([0], [None], None),
+            ([0, 1, 2], [None, None, None], None),
+            ([0, 1, 2, 3, 5.1, 6, 7, 8, 9], [0, 10, 20, 30, 50, 60, 70, 80, 90], 2),
+            ([0, 1, 4, 8, 9, 12], [0, None, 20, 30, 40, None], 2),
+            ([], [], 2),
+        ]
+        for x, y, maxdx in cases:
+            null = numpy.isnan(numpy.array(y, dtype=float))
+            self.assertEqual([[(x[i], y[i]) for i in range(start, stop)]
+                              for start, stop in array_seq_line(numpy.array(x, dtype=float),
+                                                                null, maxdx)],
+                             list(xy_seq_line(x, y, maxdx)))
+
+    def test_column_reduce(self):
+        """Test that a line drawn through the points left by column_reduce() covers the same
+        pixels as a line through all of them."""
+        rng = random.Random(2024)
+        xy_seq = sorted(((rng.randrange(200), rng.randrange(100)) for _ in range(2000)),
+                        key=lambda xy: xy[0])
+        reduced = column_reduce(xy_seq)
+        self.assertLessEqual(len(reduced), 4 * 200)
+        for width in (1, 3):
+            images = []
+            for seq in (xy_seq, reduced):
+                image = Image.new('RGB', (200, 100))
+                ImageDraw.Draw(image).line(seq, fill='white', width=width)
+                images.append(image.tobytes())
+            self.assertEqual(images[0], images[1])
+        if numpy is not None:
+            xs, ys = array_column_reduce(numpy.array([xy[0] for xy in xy_seq]),
+                                         numpy.array([xy[1] for xy in xy_seq]))
+            self.assertEqual(list(zip(xs.tolist(), ys.tolist())), reduced)
+
+    def test_min_max(self):
+        """Test function min_max()"""
+        self.assertEqual(min_max([3, None, 1, 2]), (1, 3))
+        self.assertEqual(min_max([None, None]), (None, None))
+        if numpy is not None:
+            self.assertEqual(min_max(numpy.array([3, None, 1, 2], dtype=float)), (1.0, 3.0))
+            self.assertEqual(min_max(numpy.array([None], dtype=float)), (None, None))
+
     def test_pickLabelFormat(self):
         """Test function pickLabelFormat"""
 
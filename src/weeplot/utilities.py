@@ -12,6 +12,13 @@ import time
 from PIL import ImageFont, ImageColor
 
 import weeplot
+import weeutil.weeutil
+
+# NumPy is optional. If it is installed, lines held in NumPy arrays are scaled all at once.
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 def scale(data_min, data_max, prescale=(None, None, None), nsteps=10):
@@ -388,19 +395,43 @@ class ScaledDraw:
 
         For a scatter plot, set line_type to None and marker_type to something other than None.
         """
-        # Break the line around any nulls or gaps between samples
-        for xy_seq in xy_seq_line(x, y, maxdx):
-            # Create a list with the scaled coordinates...
-            xy_seq_scaled = [(self.xtranslate(xc), self.ytranslate(yc)) for (xc, yc) in xy_seq]
+        # Markers go on every point, but a line only needs the points that can change the pixels
+        # it covers. Lines of an even width are drawn to one side of a vertical segment,
+        # depending on its direction, so they are left alone.
+        has_markers = bool(marker_type) and marker_type.lower().strip() not in ['none', '']
+        reduce = not has_markers and options.get('width', 1) % 2 == 1
+        if numpy is not None and isinstance(y, numpy.ndarray):
+            xy_seqs = self._xy_seqs_scaled(x, y, maxdx, reduce=reduce)
+        else:
+            # Break the line around any nulls or gaps between samples
+            xy_seqs = ([(self.xtranslate(xc), self.ytranslate(yc)) for (xc, yc) in xy_seq]
+                       for xy_seq in xy_seq_line(x, y, maxdx))
+            if reduce:
+                xy_seqs = (column_reduce(xy_seq_scaled) for xy_seq_scaled in xy_seqs)
+        for xy_seq_scaled in xy_seqs:
             if line_type == 'solid':
                 # Now pick the appropriate drawing function, depending on the length of the line:
-                if len(xy_seq) == 1:
+                if len(xy_seq_scaled) == 1:
                     self.draw.point(xy_seq_scaled, fill=options['fill'])
                 else:
                     self.draw.line(xy_seq_scaled, **options)
-            if marker_type and marker_type.lower().strip() not in ['none', '']:
+            if has_markers:
                 self.marker(xy_seq_scaled, marker_type, marker_size=marker_size, **options)
 
+    def _xy_seqs_scaled(self, x, y, maxdx, reduce=False):
+        """Same as scaling the segments from xy_seq_line(), but for NumPy arrays, where NaN
+        marks a null. If reduce is True, each segment is put through column_reduce()."""
+        x = numpy.asarray(x, dtype=float)
+        null = numpy.isnan(y)
+        xs = (x * self.xscale + self.xoffset + 0.5).astype(int)
+        ys = (numpy.where(null, 0.0, y) * self.yscale + self.yoffset + 0.5).astype(int)
+        for start, stop in array_seq_line(x, null, maxdx):
+            if reduce:
+                xs_seg, ys_seg = array_column_reduce(xs[start:stop], ys[start:stop])
+            else:
+                xs_seg, ys_seg = xs[start:stop], ys[start:stop]
+            yield list(zip(xs_seg.tolist(), ys_seg.tolist()))
+
     def marker(self, xy_seq, marker_type, marker_size=10, **options):
         half_size = marker_size / 2
         marker = marker_type.lower()
@@ -534,6 +565,121 @@ def xy_seq_line(x, y, maxdx=None):
         yield line
 
 
+def array_seq_line(x, null, maxdx=None):
+    """Like xy_seq_line(), but for NumPy arrays, and yielding the start and stop indexes of each
+    segment. Only the points where a line breaks are looked at one by one.
+
+    x: NumPy array of x coordinates.
+
+    null: NumPy array of booleans, True where the y coordinate is null.
+
+    yields: 2-way tuples (start, stop) of the indexes of each segment
+
+    Example
+    >>> x = numpy.array([0, 1, 2, 3, 5.1, 6, 7, 8, 9])
+    >>> y = numpy.array([0, 10, None, 30, 50, None, 70, 80, 90], dtype=float)
+    >>> for start, stop in array_seq_line(x, numpy.isnan(y), 2):
+    ...     print(start, stop)
+    0 2
+    3 4
+    4 5
+    6 9
+    """
+    breaks = null.copy()
+    if maxdx is not None and len(x) > 1:
+        breaks[1:] |= numpy.diff(x) > maxdx
+    line_start = None
+    start = 0
+    for i in numpy.flatnonzero(breaks).tolist():
+        if line_start is None and start < i:
+            line_start = start
+        if line_start is not None:
+            yield line_start, i
+            # A gap starts a new line with the point. A null does not.
+            line_start = None if null[i] else i
+        start = i + 1
+    if line_start is None and start < len(x):
+        line_start = start
+    if line_start is not None:
+        yield line_start, len(x)
+
+
+def column_reduce(xy_seq):
+    """Reduce a segment of scaled points to the first, lowest, highest and last point in each
+    pixel column. Within a column, the line through all the points covers the pixels between the
+    lowest and the highest, and so does the line through the reduced points. Between columns,
+    the line still runs from the last point of one to the first point of the next. So the line
+    covers the same pixels, however many points there were.
+
+    xy_seq: List of (x, y) coordinates in pixels.
+
+    returns: List of (x, y) coordinates in pixels.
+
+    Example
+    >>> print(column_reduce([(0, 5), (0, 9), (0, 2), (0, 4), (1, 3), (1, 3), (2, 8)]))
+    [(0, 5), (0, 2), (0, 9), (0, 4), (1, 3), (2, 8)]
+    """
+    reduced = []
+    i = 0
+    while i < len(xy_seq):
+        j = i + 1
+        while j < len(xy_seq) and xy_seq[j][0] == xy_seq[i][0]:
+            j += 1
+        column = xy_seq[i:j]
+        for xy in (column[0], min(column, key=lambda p: p[1]),
+                   max(column, key=lambda p: p[1]), column[-1]):
+            # Drop repeated points, which cannot add anything to the line.
+            if not reduced or xy != reduced[-1]:
+                reduced.append(xy)
+        i = j
+    return reduced
+
+
+def array_column_reduce(xs, ys):
+    """Like column_reduce(), but for NumPy arrays of the x and y coordinates in pixels.
+
+    Example
+    >>> xs, ys = array_column_reduce(numpy.array([0, 0, 0, 0, 1, 1, 2]),
+    ...                              numpy.array([5, 9, 2, 4, 3, 3, 8]))
+    >>> print(xs.tolist(), ys.tolist())
+    [0, 0, 0, 0, 1, 2] [5, 2, 9, 4, 3, 8]
+    """
+    if len(xs) < 2:
+        return xs, ys
+    firsts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(xs)) + 1))
+    lasts = numpy.append(firsts[1:], len(xs)) - 1
+    # Four points for each column: first, lowest, highest and last.
+    xs_red = numpy.repeat(xs[firsts], 4)
+    ys_red = numpy.column_stack((ys[firsts],
+                                 numpy.minimum.reduceat(ys, firsts),
+                                 numpy.maximum.reduceat(ys, firsts),
+                                 ys[lasts])).ravel()
+    # Drop repeated points, which cannot add anything to the line.
+    keep = numpy.ones(len(xs_red), dtype=bool)
+    keep[1:] = (numpy.diff(xs_red) != 0) | (numpy.diff(ys_red) != 0)
+    return xs_red[keep], ys_red[keep]
+
+
+def min_max(values):
+    """Return the minimum and maximum of a sequence, ignoring nulls, or None if there are none.
+    The sequence can be a NumPy array, where NaN marks a null.
+
+    Example:
+    >>> print(min_max([3, None, 1, 2]))
+    (1, 3)
+    >>> print(min_max(numpy.array([3, None, 1, 2], dtype=float)))
+    (1.0, 3.0)
+    >>> print(min_max([None]))
+    (None, None)
+    """
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        values = values[~numpy.isnan(values)]
+        if not len(values):
+            return None, None
+        return values.min().item(), values.max().item()
+    return weeutil.weeutil.min_with_none(values), weeutil.weeutil.max_with_none(values)
+
+
 def pickLabelFormat(increment):
     """Pick an appropriate label format for the given increment.
     
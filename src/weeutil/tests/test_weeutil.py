@@ -1073,6 +1073,16 @@ class WeeutilTest(unittest.TestCase):
         self.assertEqual(version_compare('1.3', '1.2.2'), 1)
         self.assertEqual(version_compare('1.3.0a1', '1.3.0a2'), -1)
 
+    def test_can_fork(self):
+        import threading
+        from weeutil.weeutil import can_fork
+        self.assertEqual(can_fork(), hasattr(os, 'fork'))
+        result = []
+        thread = threading.Thread(target=lambda: result.append(can_fork()))
+        thread.start()
+        thread.join()
+        self.assertEqual(result, [False])
+
 
 if __name__ == '__main__':
     unittest.main()
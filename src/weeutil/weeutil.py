@@ -18,6 +18,7 @@ import math
 import os
 import re
 import shutil
+import threading
 import time
 from collections import ChainMap
 
@@ -171,6 +172,10 @@ class TimeSpan(tuple):
             raise ValueError("start time (%d) is greater than stop time (%d)" % (args[0], args[1]))
         return tuple.__new__(cls, args)
 
+    def __getnewargs__(self):
+        # The arguments of __new__(), so a TimeSpan can be pickled, and handed to another process
+        return tuple(self)
+
     @property
     def start(self):
         return self[0]
@@ -1410,6 +1415,16 @@ def get_object(module_class):
 _get_object = get_object
 
 
+def can_fork():
+    """True if worker processes can be forked safely from the calling thread.
+
+    A forked child has only the thread that forked it. A lock held by any other thread at the
+    time stays locked in the child, so forking from a secondary thread, such as the report
+    thread of weewxd, can leave the child waiting forever. Only the main thread forks.
+    """
+    return hasattr(os, 'fork') and threading.current_thread() is threading.main_thread()
+
+
 class GenWithPeek:
     """Generator object which allows a peek at the next object to be returned.
     
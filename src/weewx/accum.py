@@ -26,6 +26,11 @@ of a sequence of records."""
 import logging
 import math
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import weewx
 from weeutil.weeutil import ListOfDicts, to_float, timestamp_to_string
 import weeutil.config
@@ -114,6 +119,10 @@ class FirstLastAccum:
     It can only return the first and last value it has seen, along with their timestamps.
     """
 
+    # There are many of these, and their attributes are used all the time, so they have slots
+    # rather than a dictionary
+    __slots__ = ('first', 'firsttime', 'last', 'lasttime')
+
     default_init = (None, None, None, None, 0.0, 0, 0.0, 0)
 
     def __init__(self, stats_tuple=None):
@@ -170,6 +179,8 @@ class FirstLastAccum:
 class ScalarStats(FirstLastAccum):
     """Accumulates statistics (min, max, average, etc.) for a scalar value."""
 
+    __slots__ = ('min', 'mintime', 'max', 'maxtime', 'sum', 'count', 'wsum', 'sumtime')
+
     def __init__(self, stats_tuple=None):
         # Call my superclass's version
         FirstLastAccum.__init__(self, stats_tuple)
@@ -218,10 +229,11 @@ class ScalarStats(FirstLastAccum):
         FirstLastAccum.addHiLo(self, val, ts)
 
         # If necessary, convert to float. Be prepared to catch an exception if not possible.
-        try:
-            val = to_float(val)
-        except ValueError:
-            val = None
+        if val.__class__ is not float:
+            try:
+                val = to_float(val)
+            except ValueError:
+                val = None
 
         # Check for None and NaN:
         if val is not None and val == val:
@@ -236,10 +248,11 @@ class ScalarStats(FirstLastAccum):
         """Add a scalar value to my running sum and count."""
 
         # If necessary, convert to float. Be prepared to catch an exception if not possible.
-        try:
-            val = to_float(val)
-        except ValueError:
-            val = None
+        if val.__class__ is not float:
+            try:
+                val = to_float(val)
+            except ValueError:
+                val = None
 
         # Check for None and NaN:
         if val is not None and val == val:
@@ -263,6 +276,10 @@ class VecStats:
     Property 'last' is the last non-None value seen. It is a two-way tuple (mag, dir).
     Property 'lasttime' is the time it was seen. """
 
+    __slots__ = ('min', 'mintime', 'max', 'maxtime', 'sum', 'count', 'wsum', 'sumtime',
+                 'max_dir', 'xsum', 'ysum', 'dirsumtime', 'squaresum', 'wsquaresum',
+                 'last', 'lasttime')
+
     default_init = (None, None, None, None,
                     0.0, 0, 0.0, 0, None, 0.0, 0.0, 0, 0.0, 0.0)
 
@@ -431,12 +448,58 @@ class Accum(dict):
             raise OutOfSpan("Attempt to add out-of-interval record (%s) to timespan (%s)"
                             % (timestamp_to_string(record['dateTime']), self.timespan))
 
-        for obs_type in record:
-            # Get the proper function ...
-            func = get_add_function(obs_type)
-            # ... then call it.
+        # The add function of each type has been resolved once for records of this shape.
+        for obs_type, func in get_add_plan(tuple(record)):
             func(self, record, obs_type, add_hilo, weight)
 
+    def addColumns(self, columns, add_hilo=True, weights=1):
+        """Add a block of records to my running statistics. The records are given as columns,
+        so that, if NumPy is installed, the statistics of a type are calculated all at once.
+        The results are the same as adding the records one at a time with addRecord(), except
+        that no record is added if any of them is out of my timespan.
+
+        columns: A dictionary with a sequence of values for each type, one for each record.
+        It must have keys 'dateTime' and 'usUnits'.
+        weights: A sequence with the weight of each record, or a single weight for all of them.
+        """
+        timestamps = columns['dateTime']
+        if not len(timestamps):
+            return
+        for ts in (min(timestamps), max(timestamps)):
+            if not self.timespan.includesArchiveTime(ts):
+                raise OutOfSpan("Attempt to add out-of-interval record (%s) to timespan (%s)"
+                                % (timestamp_to_string(ts), self.timespan))
+        if not hasattr(weights, '__len__'):
+            weights = [weights] * len(timestamps)
+        if numpy is not None:
+            times = _Times(timestamps, weights)
+
+        # The records, for the adders that need them
+        records = None
+        for obs_type, func in get_add_plan(tuple(columns)):
+            if func is Accum.noop:
+                continue
+            if func is Accum.check_units:
+                for unit_system in dict.fromkeys(columns[obs_type]):
+                    self._check_units(unit_system)
+                continue
+            if numpy is not None:
+                if func is Accum.add_value:
+                    self._init_type(obs_type)
+                    if _add_scalar_column(self[obs_type], columns[obs_type], times, add_hilo):
+                        continue
+                elif func is Accum.add_wind_value and obs_type == 'windSpeed':
+                    self._init_type('windSpeed')
+                    self._init_type('wind')
+                    if _add_wind_columns(self['windSpeed'], self['wind'], columns, times,
+                                         add_hilo):
+                        continue
+            # Otherwise, add the values of this type one record at a time
+            if records is None:
+                records = [dict(zip(columns, row)) for row in zip(*columns.values())]
+            for record, weight in zip(records, weights):
+                func(self, record, obs_type, add_hilo, weight)
+
     def updateHiLo(self, accumulator):
         """Merge the high/low stats of another accumulator into me."""
         if accumulator.timespan.start < self.timespan.start \
@@ -492,10 +555,14 @@ class Accum(dict):
 
         # If the type has not been seen before, initialize it
         self._init_type(obs_type)
+        # A null value does not change the statistics
+        if val is None:
+            return
+        stats = self[obs_type]
         # Then add to highs/lows, and to the running sum:
         if add_hilo:
-            self[obs_type].addHiLo(val, record['dateTime'])
-        self[obs_type].addSum(val, weight=weight)
+            stats.addHiLo(val, record['dateTime'])
+        stats.addSum(val, weight=weight)
 
     def add_wind_value(self, record, obs_type, add_hilo, weight):
         """Add a single observation of type wind to myself."""
@@ -625,6 +692,181 @@ class Accum(dict):
         return self.unit_system is None
 
 
+# ===============================================================================
+#                            Adding columns of values
+# ===============================================================================
+
+#
+# These do what the adder functions do, for a column of values at a time. The sums are
+# accumulated in order, rather than pairwise, so they come out exactly the same. They return
+# False, without changing anything, if they cannot handle the values.
+#
+
+def _as_floats(values):
+    """Convert a sequence of values to an array of floats, with NaN for None. Return None if
+    that is not possible."""
+    try:
+        return numpy.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return None
+
+
+def _running_sum(start, values):
+    """Add the values of an array to a start value, one at a time."""
+    if not len(values):
+        return start
+    if values.dtype.kind in 'iu':
+        return start + int(values.sum())
+    return float(numpy.cumsum(numpy.concatenate(([start], values)))[-1])
+
+
+class _Times:
+    """The timestamps and the weights of a block of records, which all the columns share."""
+
+    def __init__(self, timestamps, weights):
+        self.timestamps = timestamps
+        self.ts = numpy.asarray(timestamps)
+        self.weights = numpy.asarray(weights)
+        # Usually, the records are in order of time
+        self.ordered = bool(numpy.all(self.ts[1:] > self.ts[:-1]))
+
+    def first_last(self, include, ts=None):
+        """The indexes of the earliest and of the latest of the included values. Of those with
+        the same timestamp, they are the first and the last one, respectively."""
+        idx = numpy.flatnonzero(include)
+        if not len(idx):
+            return None, None
+        if self.ordered and ts is None:
+            return idx[0], idx[-1]
+        ts = (self.ts if ts is None else ts)[idx]
+        return idx[numpy.argmin(ts)], idx[len(idx) - 1 - numpy.argmax(ts[::-1])]
+
+
+def _add_scalar_column(stats, values, times, add_hilo, x=None):
+    """Add a column of values to a ScalarStats. See ScalarStats.addHiLo() and addSum()."""
+    if type(stats) is not ScalarStats:
+        return False
+    if x is None:
+        x = _as_floats(values)
+        if x is None:
+            return False
+    valid = ~numpy.isnan(x)
+    all_valid = valid.all()
+    timestamps = times.timestamps
+
+    if add_hilo:
+        # The first and last are of the values as they are, which may be NaN
+        i_first, i_last = times.first_last(valid if all_valid
+                                           else [v is not None for v in values])
+        if i_first is not None:
+            if stats.firsttime is None or timestamps[i_first] < stats.firsttime:
+                stats.first = values[i_first]
+                stats.firsttime = timestamps[i_first]
+            if stats.lasttime is None or timestamps[i_last] >= stats.lasttime:
+                stats.last = values[i_last]
+                stats.lasttime = timestamps[i_last]
+        if all_valid or valid.any():
+            idx = numpy.flatnonzero(valid)
+            i_min = idx[numpy.argmin(x[idx])]
+            i_max = idx[numpy.argmax(x[idx])]
+            if stats.min is None or x[i_min] < stats.min:
+                stats.min = float(x[i_min])
+                stats.mintime = timestamps[i_min]
+            if stats.max is None or x[i_max] > stats.max:
+                stats.max = float(x[i_max])
+                stats.maxtime = timestamps[i_max]
+
+    w = times.weights
+    if not all_valid:
+        x = x[valid]
+        w = w[valid]
+    stats.sum = _running_sum(stats.sum, x)
+    stats.count += len(x)
+    stats.wsum = _running_sum(stats.wsum, x * w)
+    stats.sumtime = _running_sum(stats.sumtime, w)
+    return True
+
+
+def _add_wind_columns(speed_stats, wind_stats, columns, times, add_hilo):
+    """Add the columns of wind to the ScalarStats of windSpeed, and to the VecStats of wind. See
+    Accum.add_wind_value()."""
+    if type(speed_stats) is not ScalarStats or type(wind_stats) is not VecStats:
+        return False
+    timestamps = times.timestamps
+    nulls = [None] * len(timestamps)
+    speeds = _as_floats(columns['windSpeed'])
+    dirs = _as_floats(columns.get('windDir', nulls))
+    # If the station does not provide windGustDir, then substitute windDir.
+    gust_dir_column = columns['windGustDir'] if 'windGustDir' in columns \
+        else columns.get('windDir', nulls)
+    gusts = _as_floats(columns.get('windGust', nulls))
+    gust_dirs = _as_floats(gust_dir_column)
+    if speeds is None or dirs is None or gusts is None or gust_dirs is None:
+        return False
+
+    _add_scalar_column(speed_stats, columns['windSpeed'], times, add_hilo, speeds)
+
+    if add_hilo:
+        # The gust of a record goes first, then its speed
+        x = numpy.empty(2 * len(timestamps))
+        x[0::2] = gusts
+        x[1::2] = speeds
+        x_dirs = numpy.empty(2 * len(timestamps))
+        x_dirs[0::2] = gust_dirs
+        x_dirs[1::2] = dirs
+        x_ts = numpy.repeat(times.ts, 2)
+        valid = ~numpy.isnan(x)
+        if valid.any():
+            idx = numpy.flatnonzero(valid)
+            i_min = idx[numpy.argmin(x[idx])]
+            i_max = idx[numpy.argmax(x[idx])]
+            if wind_stats.min is None or x[i_min] < wind_stats.min:
+                wind_stats.min = float(x[i_min])
+                wind_stats.mintime = timestamps[i_min // 2]
+            if wind_stats.max is None or x[i_max] > wind_stats.max:
+                wind_stats.max = float(x[i_max])
+                wind_stats.maxtime = timestamps[i_max // 2]
+                wind_stats.max_dir = _dir_at(x_dirs, i_max, gust_dir_column, columns)
+            _, i_last = times.first_last(valid, x_ts)
+            if wind_stats.lasttime is None or x_ts[i_last] >= wind_stats.lasttime:
+                wind_stats.last = (float(x[i_last]), _dir_at(x_dirs, i_last, gust_dir_column,
+                                                             columns))
+                wind_stats.lasttime = timestamps[i_last // 2]
+
+    valid = ~numpy.isnan(speeds)
+    x = speeds[valid]
+    w = times.weights[valid]
+    d = dirs[valid]
+    has_dir = numpy.array([v is not None for v in columns.get('windDir', nulls)],
+                          dtype=bool)[valid]
+    wind_stats.sum = _running_sum(wind_stats.sum, x)
+    wind_stats.count += len(x)
+    wind_stats.wsum = _running_sum(wind_stats.wsum, w * x)
+    wind_stats.sumtime = _running_sum(wind_stats.sumtime, w)
+    # Python's power operator does not always round a square the same way as a product does
+    squares = numpy.array([speed ** 2 for speed in x.tolist()])
+    wind_stats.squaresum = _running_sum(wind_stats.squaresum, squares)
+    wind_stats.wsquaresum = _running_sum(wind_stats.wsquaresum, w * squares)
+    # The trigonometry is done by the math library, so it gives the same results
+    radians = [math.radians(90.0 - dir_n) for dir_n in d[has_dir].tolist()]
+    wx = (w * x)[has_dir]
+    wind_stats.xsum = _running_sum(wind_stats.xsum,
+                                   wx * numpy.array([math.cos(r) for r in radians]))
+    wind_stats.ysum = _running_sum(wind_stats.ysum,
+                                   wx * numpy.array([math.sin(r) for r in radians]))
+    # It's OK for direction to be None, provided speed is zero:
+    wind_stats.dirsumtime = _running_sum(wind_stats.dirsumtime, w[has_dir | (x == 0)])
+    return True
+
+
+def _dir_at(x_dirs, i, gust_dir_column, columns):
+    """The direction of the i'th of the interleaved gusts and speeds, None if it is null."""
+    column = gust_dir_column if i % 2 == 0 else columns.get('windDir')
+    if column is None or column[i // 2] is None:
+        return None
+    return float(x_dirs[i])
+
+
 # ===============================================================================
 #                            Configuration dictionaries
 # ===============================================================================
@@ -673,11 +915,18 @@ OBS_DEFAULTS = {
 }
 
 
+# The add functions for each shape of record, that is, its sequence of types. They are resolved
+# again if the adders set in accum_dict change.
+_add_plans = {}
+_add_plans_adders = ()
+
+
 def initialize(config_dict):
     # Add the configuration dictionary to the beginning of the list of maps.
     # This will cause it to override the defaults
     global accum_dict
     accum_dict.maps.insert(0, config_dict.get('Accumulator', {}))
+    _add_plans.clear()
 
 
 def new_accumulator(obs_type):
@@ -703,6 +952,30 @@ def get_add_function(obs_type):
     return ADD_FUNCTIONS[add_nickname]
 
 
+def get_add_plan(obs_types):
+    """Get the adder function of each of a sequence of types.
+
+    Returns:
+        tuple[tuple[str, function]]: Pairs of a type and its adder function.
+    """
+    global _add_plans_adders
+    # The adders set in accum_dict, in order of precedence. This is much quicker than resolving
+    # the adder of every type, and catches changes made in place.
+    adders = tuple((obs_type, options['adder'])
+                   for m in accum_dict.maps for obs_type, options in m.items()
+                   if 'adder' in options)
+    # Records come in a few shapes, but don't let the cache grow without bound
+    if adders != _add_plans_adders or len(_add_plans) > 100:
+        _add_plans.clear()
+        _add_plans_adders = adders
+    try:
+        return _add_plans[obs_types]
+    except KeyError:
+        plan = _add_plans[obs_types] = tuple((obs_type, get_add_function(obs_type))
+                                             for obs_type in obs_types)
+        return plan
+
+
 def get_merge_function(obs_type):
     """Get a merge function appropriate for type 'obs_type'."""
     global accum_dict
@@ -58,14 +58,20 @@ Example:
 """
 
 import datetime
+import hashlib
 import json
 import logging
 import os.path
+import re
+import sys
+import threading
 import time
+import types
 import unicodedata
 
 import Cheetah.Filters
 import Cheetah.Template
+from Cheetah.Version import Version as cheetah_version
 
 import weedb
 import weeutil.logger
@@ -97,6 +103,158 @@ default_search_list = [
 ]
 
 
+# Where compiled templates are kept between runs, relative to WEEWX_ROOT, unless the option
+# 'template_cache_dir' says otherwise.
+default_template_cache_dir = 'cache/cheetah'
+
+# Classes compiled from templates, keyed by the path of the template. Each entry holds the
+# modification time and size of the template when it was compiled, then the class.
+_template_classes = {}
+_template_lock = threading.Lock()
+
+
+def get_template_class(template, cache_dir=None):
+    """Return the class compiled from a Cheetah template.
+
+    The compiled class depends only on the template file, not on the search list, so it can be
+    used for any number of evaluations. It is held in memory until the template changes. If a
+    cache directory is given, the generated Python code is also kept there, so it survives a
+    restart.
+
+    Args:
+        template (str): Path to the template file.
+        cache_dir (str|None): Directory where generated code is kept, or None to keep it in
+            memory only.
+
+    Returns:
+        type: A subclass of Cheetah.Template.Template
+    """
+    st = os.stat(template)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _template_lock:
+        entry = _template_classes.get(template)
+        if entry and entry[0] == stamp:
+            return entry[1]
+
+    # The name is unique for the template, its version, and the version of Cheetah
+    key = hashlib.sha1(('%s|%d|%d|%s' % (template, stamp[0], stamp[1], cheetah_version))
+                       .encode('utf-8')).hexdigest()
+    module_name = 'cheetah_%s' % key
+    code_path = os.path.join(cache_dir, module_name + '.py') if cache_dir else None
+
+    klass = None
+    if code_path and os.path.exists(code_path):
+        try:
+            with open(code_path, 'rb') as fd:
+                klass = _load_template_class(fd.read(), module_name, code_path)
+        except Exception as e:
+            log.debug("Unable to load compiled template %s: %s", code_path, e)
+
+    if klass is None:
+        code = Cheetah.Template.Template.compile(file=template, returnAClass=False,
+                                                 moduleName=module_name,
+                                                 className='CheetahTemplate')
+        klass = _load_template_class(code, module_name, code_path or template)
+        if code_path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmpname = code_path + '.tmp'
+                with open(tmpname, 'wb') as fd:
+                    fd.write(code)
+                os.replace(tmpname, code_path)
+            except OSError as e:
+                log.debug("Unable to save compiled template %s: %s", code_path, e)
+
+    with _template_lock:
+        old_entry = _template_classes.get(template)
+        _template_classes[template] = (stamp, klass)
+        # The class of the old version of the template is not needed anymore
+        if old_entry and old_entry[1].__module__ != klass.__module__:
+            sys.modules.pop(old_entry[1].__module__, None)
+    return klass
+
+
+def is_stale(path, timespan, dirty_ranges):
+    """Whether a summary file may be missing data of its timespan.
+
+    It is, if it was generated before the timespan was over, or if records in the timespan have
+    been added since it was generated.
+
+    Args:
+        path (str): Path to the summary file.
+        timespan (TimeSpan): The timespan it summarizes.
+        dirty_ranges (list[tuple[int, int, int]]): The ranges of records that were added to
+            history, and when, as returned by weewx.manager.Manager.dirty_ranges().
+
+    Returns:
+        bool: True if the file should be generated again.
+    """
+    try:
+        generated = os.path.getmtime(path)
+    except OSError:
+        return True
+    if generated < timespan.stop:
+        return True
+    # The times of the ranges are in whole seconds
+    generated = int(generated)
+    return any(start <= timespan.stop and stop > timespan.start and marked >= generated
+               for start, stop, marked in dirty_ranges)
+
+
+# Tags such as $day.outTemp.max, or ${week.rain.sum}. Only timespans that take no arguments are
+# recognized, so the timespan is the same as the one the template will get.
+_aggregate_tag_re = re.compile(r'\$\{?(hour|day|yesterday|week|month|year|rainyear|alltime)'
+                               r'(?:\(\))?\.([A-Za-z_]\w*)\.([A-Za-z_]\w*)')
+# Directives that make one of those names a variable of the template
+_template_var_re = re.compile(r'#(?:for|set)\s+(?:global\s+)?\$?([A-Za-z_]\w*)')
+
+# Aggregate tags found in templates, keyed by the path of the template. Each entry holds the
+# modification time and size of the template when it was scanned, then the tags.
+_template_tags = {}
+
+
+def get_template_tags(template):
+    """Find the aggregate tags in a Cheetah template, such as $day.outTemp.max.
+
+    Tags in included files, or that are built at run time, are not found. Neither are tags of
+    timespans that the template uses as a variable, such as $day in '#for $day in $month.days'.
+
+    Args:
+        template (str): Path to the template file.
+
+    Returns:
+        dict[str, dict[str, set[str]]]: The aggregation types, keyed by timespan, then by
+            observation type.
+    """
+    st = os.stat(template)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _template_lock:
+        entry = _template_tags.get(template)
+        if entry and entry[0] == stamp:
+            return entry[1]
+
+    with open(template, 'r', encoding='utf-8', errors='replace') as fd:
+        source = fd.read()
+    variables = set(_template_var_re.findall(source))
+    tags = {}
+    for span, obs_type, aggregate_type in _aggregate_tag_re.findall(source):
+        if span not in variables:
+            tags.setdefault(span, {}).setdefault(obs_type, set()).add(aggregate_type)
+
+    with _template_lock:
+        _template_tags[template] = (stamp, tags)
+    return tags
+
+
+def _load_template_class(code, module_name, file_name):
+    """Execute the Python code Cheetah generated for a template, and return its class."""
+    module = types.ModuleType(module_name)
+    module.__file__ = file_name
+    exec(compile(code, file_name, 'exec'), module.__dict__)
+    sys.modules[module_name] = module
+    return module.CheetahTemplate
+
+
 # =============================================================================
 # CheetahGenerator
 # =============================================================================
@@ -239,6 +397,12 @@ class CheetahGenerator(weewx.reportengine.ReportGenerator):
 
         (template, dest_dir, encoding, default_binding) = self._prepGen(report_dict)
 
+        cache_dir = report_dict.get('template_cache_dir', default_template_cache_dir)
+        if cache_dir and cache_dir.lower() != 'none':
+            cache_dir = os.path.join(self.config_dict['WEEWX_ROOT'], cache_dir)
+        else:
+            cache_dir = None
+
         # Get start and stop times        
         default_archive = self.db_binder.get_manager(default_binding)
         start_ts = default_archive.firstGoodStamp()
@@ -260,6 +424,10 @@ class CheetahGenerator(weewx.reportengine.ReportGenerator):
 
         # Get an appropriate generator function
         summarize_by = report_dict['summarize_by']
+        if summarize_by in CheetahGenerator.generator_dict:
+            dirty_ranges = default_archive.dirty_ranges()
+        else:
+            dirty_ranges = []
         if summarize_by in CheetahGenerator.generator_dict:
             _spangen = CheetahGenerator.generator_dict[summarize_by]
         else:
@@ -287,10 +455,12 @@ class CheetahGenerator(weewx.reportengine.ReportGenerator):
             # Get the absolute path for the target of this template
             _fullname = os.path.join(dest_dir, _filename)
 
-            # Skip summary files outside the timespan
+            # Skip summary files outside the timespan, unless their data have changed since
+            # they were generated
             if report_dict['summarize_by'] in CheetahGenerator.generator_dict \
                     and os.path.exists(_fullname) \
-                    and not timespan.includesArchiveTime(stop_ts):
+                    and not timespan.includesArchiveTime(stop_ts) \
+                    and not is_stale(_fullname, timespan, dirty_ranges):
                 continue
 
             # skip files that are fresh, but only if staleness is defined
@@ -312,11 +482,11 @@ class CheetahGenerator(weewx.reportengine.ReportGenerator):
                                                os.path.dirname(report_dict['template']),
                                                _filename))
 
-            # First, compile the template
+            # First, compile the template. This gets done only once, then the compiled class is
+            # used for every timespan.
             try:
-                # TODO: Look into caching the compiled template.
-                compiled_template = Cheetah.Template.Template(
-                    file=template,
+                template_class = get_template_class(template, cache_dir)
+                compiled_template = template_class(
                     searchList=searchList,
                     filter='AssureUnicode',
                     filtersLib=weewx.cheetahgenerator)
@@ -327,6 +497,9 @@ class CheetahGenerator(weewx.reportengine.ReportGenerator):
                 weeutil.logger.log_traceback(log.error, "****  ")
                 continue
 
+            # Calculate, all at once, the aggregates the template is going to ask for
+            self._prefetch(template, searchList)
+
             # Second, evaluate the compiled template
             try:
                 # We have a compiled template in hand. Evaluate it. The result will be a long
@@ -402,6 +575,35 @@ class CheetahGenerator(weewx.reportengine.ReportGenerator):
 
         return search_list
 
+    @staticmethod
+    def _prefetch(template, search_list):
+        """Calculate ahead of time the aggregates asked for by tags such as $day.outTemp.max and
+        $day.outTemp.min, so those of a type over a timespan cost one query, instead of one each.
+        The results go in the aggregate cache, where the tags will find them.
+
+        This is only an optimization. Whatever goes wrong is left to the tags themselves, which
+        will report it, or cope with it, when the template gets evaluated."""
+        try:
+            tags = get_template_tags(template)
+        except Exception as e:
+            log.debug("Unable to find the tags of template %s: %s", template, e)
+            return
+        time_binder = None
+        for obj in search_list:
+            if isinstance(obj, weewx.tags.TimeBinder):
+                time_binder = obj
+                break
+        if time_binder is None:
+            return
+        for span in sorted(tags):
+            for obs_type in sorted(tags[span]):
+                try:
+                    getattr(time_binder, span)().prefetch(obs_type, tags[span][obs_type])
+                except Exception as e:
+                    log.debug("Unable to prefetch %s.%s for template %s: %s",
+                              span, obs_type, template, e)
+                    weeutil.logger.log_traceback(log.debug, "****  ")
+
     def _getFileName(self, template, ref_tt):
         """Calculate a destination filename given a template filename.
 
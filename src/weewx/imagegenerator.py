@@ -7,7 +7,10 @@
 Should probably be refactored into smaller functions."""
 
 import datetime
+import hashlib
+import json
 import logging
+import multiprocessing
 import os.path
 import time
 
@@ -22,8 +25,18 @@ from weeutil.config import search_up, accumulateLeaves
 from weeutil.weeutil import to_bool, to_int, to_float, TimeSpan
 from weewx.units import ValueTuple
 
+# NumPy is optional. If it is installed, the data of lines and bars are held in NumPy arrays.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 log = logging.getLogger(__name__)
 
+# How long to wait, in seconds, for a process of the pool to render an image. After that, the pool
+# is given up, and the images left are rendered by the generator itself.
+render_timeout = 120
+
 
 # =============================================================================
 #                    Class ImageGenerator
@@ -65,11 +78,48 @@ class ImageGenerator(weewx.reportengine.ReportGenerator):
                 record in the database.]
         """
         t1 = time.time()
-        ngen = 0
 
         # determine how much logging is desired
         log_success = to_bool(search_up(self.image_dict, 'log_success', True))
 
+        # The data are fetched here, but the images can be rendered and saved by a pool of
+        # processes.
+        workers = to_int(self.image_dict.get('render_workers', 1))
+        pool = None
+        if workers > 1 and weeutil.weeutil.can_fork():
+            pool = multiprocessing.get_context('fork').Pool(workers)
+        # The images being rendered by the pool, and where their fingerprints go
+        rendering = []
+        try:
+            ngen = self._gen_plots(gen_ts, pool, rendering)
+            ngen += _finish_rendering(pool, rendering)
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+
+        t2 = time.time()
+
+        if log_success:
+            log.info("Generated %d images for report %s in %.2f seconds",
+                     ngen,
+                     self.skin_dict['REPORT_NAME'], t2 - t1)
+
+    def _gen_plots(self, gen_ts, pool, rendering):
+        """Generate the plots that need it, and return how many images were saved. If there is a
+        pool of processes, the plots are handed to it, and the results added to rendering."""
+        ngen = 0
+
+        # Where the fingerprints of the images are kept, relative to WEEWX_ROOT. By default, they
+        # are not kept, and images are generated every time.
+        cache_dir = self.image_dict.get('image_cache_dir')
+        if cache_dir and cache_dir.lower() != 'none':
+            cache_dir = os.path.join(self.config_dict['WEEWX_ROOT'], cache_dir)
+        else:
+            cache_dir = None
+        # What the data of each binding looked like, as used by the fingerprints
+        watermarks = {}
+
         # Loop over each time span class (day, week, month, etc.):
         for timespan in self.image_dict.sections:
 
@@ -96,36 +146,35 @@ class ImageGenerator(weewx.reportengine.ReportGenerator):
                 if _skip_this_plot(plotgen_ts, plot_options, img_file):
                     continue
 
+                # Nor does it, if nothing that goes into it has changed since it was saved.
+                fingerprint = fingerprint_path = None
+                if cache_dir:
+                    fingerprint = self.get_fingerprint(plotgen_ts, plot_options,
+                                                       self.image_dict[timespan][plotname],
+                                                       watermarks)
+                    fingerprint_path = os.path.join(
+                        cache_dir, hashlib.sha1(img_file.encode('utf-8')).hexdigest())
+                    if _is_unchanged(img_file, fingerprint_path, fingerprint):
+                        log.debug("Skip '%s': unchanged", img_file)
+                        continue
+
                 # Generate the plot.
                 plot = self.gen_plot(plotgen_ts,
                                      plot_options,
                                      self.image_dict[timespan][plotname])
 
                 # 'plot' will be None if skip_if_empty was truthy, and the plot contains no data
-                if plot:
-                    # We have a valid plot. Render it onto an image
-                    image = plot.render()
-
-                    # Create the subdirectory that the image is to be put in. Wrap in a try block
-                    # in case it already exists.
-                    try:
-                        os.makedirs(os.path.dirname(img_file))
-                    except OSError:
-                        pass
-
-                    try:
-                        # Now save the image
-                        image.save(img_file)
-                        ngen += 1
-                    except IOError as e:
-                        log.error("Unable to save to file '%s' %s:", img_file, e)
-
-        t2 = time.time()
+                if not plot:
+                    continue
+                if pool:
+                    rendering.append((pool.apply_async(_render_plot, (plot, img_file)),
+                                      plot, img_file, fingerprint_path, fingerprint))
+                elif _render_plot(plot, img_file):
+                    ngen += 1
+                    if fingerprint_path:
+                        _save_fingerprint(img_file, fingerprint_path, fingerprint)
 
-        if log_success:
-            log.info("Generated %d images for report %s in %.2f seconds",
-                     ngen,
-                     self.skin_dict['REPORT_NAME'], t2 - t1)
+        return ngen
 
     def gen_plot(self, plotgen_ts, plot_options, plot_dict):
         """Generate a single plot image.
@@ -147,16 +196,7 @@ class ImageGenerator(weewx.reportengine.ReportGenerator):
         # Create a new instance of a time plot and start adding to it
         plot = weeplot.genplot.TimePlot(plot_options)
 
-        time_length = weeutil.weeutil.nominal_spans(plot_options.get('time_length', 86400))
-        # Calculate a suitable min, max time for the requested time.
-        minstamp, maxstamp, timeinc = weeplot.utilities.scaletime(plotgen_ts - time_length,
-                                                                  plotgen_ts)
-        x_domain = weeutil.weeutil.TimeSpan(minstamp, maxstamp)
-
-        # Override the x interval if the user has given an explicit interval:
-        timeinc_user = to_int(plot_options.get('x_interval'))
-        if timeinc_user is not None:
-            timeinc = timeinc_user
+        x_domain, timeinc = _get_x_domain(plotgen_ts, plot_options)
         plot.setXScaling((x_domain.start, x_domain.stop, timeinc))
 
         # Set the y-scaling, using any user-supplied hints:
@@ -164,9 +204,7 @@ class ImageGenerator(weewx.reportengine.ReportGenerator):
         plot.setYScaling(weeutil.weeutil.convertToFloat(yscale))
 
         # Get a suitable bottom label:
-        bottom_label_format = plot_options.get('bottom_label_format', '%m/%d/%y %H:%M')
-        bottom_label = time.strftime(bottom_label_format, time.localtime(plotgen_ts))
-        plot.setBottomLabel(bottom_label)
+        plot.setBottomLabel(_get_bottom_label(plotgen_ts, plot_options))
 
         # Set day/night display
         plot.setLocation(self.stn_info.latitude_f, self.stn_info.longitude_f)
@@ -212,6 +250,11 @@ class ImageGenerator(weewx.reportengine.ReportGenerator):
             if aggregate_type in (None, '', 'None', 'none'):
                 # No aggregation specified.
                 aggregate_type = aggregate_interval = None
+                if _downsample_line(line_options) and var_type in db_manager.sqlkeys:
+                    # There is no point in fetching more than a minimum and a maximum for each
+                    # pixel column. Where the database can do it, let it.
+                    aggregate_type = 'minmax'
+                    aggregate_interval = max(1, x_domain.length // plot.image_width)
             else:
                 try:
                     # Aggregation specified. Get the interval.
@@ -233,13 +276,24 @@ class ImageGenerator(weewx.reportengine.ReportGenerator):
             # ...then add plotgen_ts.
             option_dict['plotgen_ts'] = plotgen_ts
             # Now we're ready to fetch the data
-            start_vec_t, stop_vec_t, data_vec_t = weewx.xtypes.get_series(
-                var_type,
-                x_domain,
-                db_manager,
-                aggregate_type=aggregate_type,
-                aggregate_interval=aggregate_interval,
-                **option_dict)
+            try:
+                start_vec_t, stop_vec_t, data_vec_t = weewx.xtypes.get_series(
+                    var_type,
+                    x_domain,
+                    db_manager,
+                    aggregate_type=aggregate_type,
+                    aggregate_interval=aggregate_interval,
+                    **option_dict)
+            except (weewx.UnknownType, weewx.UnknownAggregation):
+                if aggregate_type != 'minmax':
+                    raise
+                # The type cannot be downsampled in the database. Fetch all of it.
+                aggregate_type = aggregate_interval = None
+                start_vec_t, stop_vec_t, data_vec_t = weewx.xtypes.get_series(
+                    var_type,
+                    x_domain,
+                    db_manager,
+                    **option_dict)
 
             # Get the type of plot ('bar', 'line', or 'vector')
             plot_type = line_options.get('plot_type', 'line').lower()
@@ -247,7 +301,17 @@ class ImageGenerator(weewx.reportengine.ReportGenerator):
                 log.error("Unknown plot type '%s'. Ignored", plot_type)
                 continue
 
-            if aggregate_type and plot_type != 'bar':
+            if numpy is not None and plot_type in ('line', 'bar'):
+                start_vec_t, stop_vec_t, data_vec_t = _as_arrays(start_vec_t, stop_vec_t,
+                                                                 data_vec_t)
+
+            if aggregate_type and plot_type != 'bar' and _is_array(start_vec_t[0]):
+                # If aggregating, put the point in the middle of the interval
+                start_vec_t = ValueTuple(start_vec_t[0] - aggregate_interval / 2.0,
+                                         start_vec_t[1], start_vec_t[2])
+                stop_vec_t = ValueTuple(stop_vec_t[0] - aggregate_interval / 2.0,
+                                        stop_vec_t[1], stop_vec_t[2])
+            elif aggregate_type and plot_type != 'bar':
                 # If aggregating, put the point in the middle of the interval
                 start_vec_t = ValueTuple(
                     [x - aggregate_interval / 2.0 for x in start_vec_t[0]],  # Value
@@ -302,6 +366,8 @@ class ImageGenerator(weewx.reportengine.ReportGenerator):
                 vector_rotate_str = line_options.get('vector_rotate')
                 vector_rotate = -float(vector_rotate_str) \
                     if vector_rotate_str is not None else None
+            elif plot_type == 'bar' and _is_array(start_vec_t.value):
+                interval_vec = stop_vec_t.value - start_vec_t.value
             elif plot_type == 'bar':
                 interval_vec = [x[1] - x[0] for x in
                                 zip(start_vec_t.value, stop_vec_t.value)]
@@ -339,6 +405,193 @@ class ImageGenerator(weewx.reportengine.ReportGenerator):
         return plot if have_data else None
 
 
+    def get_fingerprint(self, plotgen_ts, plot_options, plot_dict, watermarks):
+        """Return a digest of everything that goes into a plot: its options and those of its
+        lines, its time domain, the units and labels of the skin, and for each line, the last
+        timestamp of the data it includes and when records in its time domain were last added to
+        history.
+
+        For an aggregated line, the data it includes end with its last complete interval, so
+        records that go into an interval still in progress do not change the digest. Nor does the
+        time of generation: a bottom label that shows a time is left out, so an image that is
+        reused keeps the time it was generated.
+
+        Args:
+            plotgen_ts (float): The timestamp for which the plot will be valid.
+            plot_options (dict): The accumulated options of the plot.
+            plot_dict (dict): The section of the plot, holding its lines.
+            watermarks (dict): The last timestamp and the dirty ranges of each binding, which
+                are filled in as they are needed.
+
+        Returns:
+            str: The digest, in hexadecimal.
+        """
+        x_domain = _get_x_domain(plotgen_ts, plot_options)[0]
+        bottom_label_format = plot_options.get('bottom_label_format', '%m/%d/%y %H:%M')
+        if '%' in bottom_label_format.replace('%%', ''):
+            bottom_label = None
+        else:
+            bottom_label = _get_bottom_label(plotgen_ts, plot_options)
+        inputs = {
+            'plot': plot_options,
+            'x_domain': x_domain,
+            'bottom_label': bottom_label,
+            'location': (self.stn_info.latitude_f, self.stn_info.longitude_f),
+            'skin': [self.skin_dict.get(key) for key in ('Units', 'Labels', 'Texts')],
+            'lines': [],
+        }
+        for line_name in plot_dict.sections:
+            line_options = accumulateLeaves(plot_dict[line_name])
+            binding = line_options['data_binding']
+            if binding not in watermarks:
+                db_manager = self.db_binder.get_manager(binding)
+                watermarks[binding] = (db_manager.last_timestamp, db_manager.dirty_ranges())
+            last_ts, dirty_ranges = watermarks[binding]
+            if last_ts is None:
+                included_ts = None
+            elif line_options.get('aggregate_type') not in (None, '', 'None', 'none') \
+                    and 'aggregate_interval' in line_options:
+                included_ts = _last_interval_stop(
+                    x_domain, weeutil.weeutil.nominal_spans(line_options['aggregate_interval']),
+                    last_ts)
+            else:
+                included_ts = min(last_ts, x_domain.stop)
+            # When records last went into history within the time domain
+            marked = max((r[2] for r in dirty_ranges
+                          if r[0] <= x_domain.stop and r[1] > x_domain.start), default=None)
+            inputs['lines'].append((line_name, line_options, included_ts, marked))
+        return hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str)
+                            .encode('utf-8')).hexdigest()
+
+
+def _render_plot(plot, img_file):
+    """Render a plot onto an image, and save it. Return True if it was saved."""
+    image = plot.render()
+
+    # Create the subdirectory that the image is to be put in. Wrap in a try block in case it
+    # already exists.
+    try:
+        os.makedirs(os.path.dirname(img_file))
+    except OSError:
+        pass
+
+    try:
+        # Now save the image
+        image.save(img_file)
+    except IOError as e:
+        log.error("Unable to save to file '%s' %s:", img_file, e)
+        return False
+    return True
+
+
+def _finish_rendering(pool, rendering, timeout=None):
+    """Wait for the images being rendered by a pool of processes, and save their fingerprints.
+    Return how many images were saved.
+
+    If an image takes longer than the timeout, the pool is stopped, and that image and the rest
+    are rendered here instead.
+    """
+    if timeout is None:
+        timeout = render_timeout
+    ngen = 0
+    for result, plot, img_file, fingerprint_path, fingerprint in rendering:
+        if pool:
+            try:
+                saved = result.get(timeout)
+            except multiprocessing.TimeoutError:
+                log.error("Image '%s' took more than %d seconds to render. "
+                          "Rendering the rest one at a time.", img_file, timeout)
+                pool.terminate()
+                pool = None
+        if not pool:
+            saved = _render_plot(plot, img_file)
+        if saved:
+            ngen += 1
+            if fingerprint_path:
+                _save_fingerprint(img_file, fingerprint_path, fingerprint)
+    return ngen
+
+
+def _get_x_domain(plotgen_ts, plot_options):
+    """Return the time domain of a plot, and the interval between its x-axis ticks."""
+    time_length = weeutil.weeutil.nominal_spans(plot_options.get('time_length', 86400))
+    # Calculate a suitable min, max time for the requested time.
+    minstamp, maxstamp, timeinc = weeplot.utilities.scaletime(plotgen_ts - time_length,
+                                                              plotgen_ts)
+    # Override the x interval if the user has given an explicit interval:
+    timeinc_user = to_int(plot_options.get('x_interval'))
+    if timeinc_user is not None:
+        timeinc = timeinc_user
+    return weeutil.weeutil.TimeSpan(minstamp, maxstamp), timeinc
+
+
+def _get_bottom_label(plotgen_ts, plot_options):
+    bottom_label_format = plot_options.get('bottom_label_format', '%m/%d/%y %H:%M')
+    return time.strftime(bottom_label_format, time.localtime(plotgen_ts))
+
+
+def _last_interval_stop(x_domain, aggregate_interval, last_ts):
+    """Return the end of the last aggregation interval of a time domain that is complete by
+    last_ts, or the start of the domain if none is."""
+    stop_ts = x_domain.start
+    for span in weeutil.weeutil.intervalgen(x_domain.start, x_domain.stop, aggregate_interval):
+        if span.stop > last_ts:
+            break
+        stop_ts = span.stop
+    return stop_ts
+
+
+def _is_unchanged(img_file, fingerprint_path, fingerprint):
+    """True if the image was saved with the given fingerprint, and has not been touched
+    since."""
+    try:
+        with open(fingerprint_path) as fd:
+            saved = fd.read().split()
+        st = os.stat(img_file)
+    except OSError:
+        return False
+    return saved == [fingerprint, str(st.st_mtime_ns), str(st.st_size)]
+
+
+def _save_fingerprint(img_file, fingerprint_path, fingerprint):
+    """Remember the fingerprint of a freshly saved image, along with the modification time and
+    size of the file, so a changed or replaced image is not mistaken for it."""
+    try:
+        st = os.stat(img_file)
+        os.makedirs(os.path.dirname(fingerprint_path), exist_ok=True)
+        tmpname = fingerprint_path + '.tmp'
+        with open(tmpname, 'w') as fd:
+            fd.write('%s %d %d\n' % (fingerprint, st.st_mtime_ns, st.st_size))
+        os.replace(tmpname, fingerprint_path)
+    except OSError as e:
+        log.debug("Unable to save fingerprint of %s: %s", img_file, e)
+
+
+def _downsample_line(line_options):
+    """True if a line asks to be downsampled, and can be. Markers go on every point, so a line
+    with markers is never downsampled."""
+    marker_type = line_options.get('marker_type')
+    return to_bool(line_options.get('downsample', False)) \
+        and line_options.get('plot_type', 'line').lower() == 'line' \
+        and (not marker_type or marker_type.strip().lower() == 'none')
+
+
+def _is_array(values):
+    return numpy is not None and isinstance(values, numpy.ndarray)
+
+
+def _as_arrays(start_vec_t, stop_vec_t, data_vec_t):
+    """Put the vectors of a series in NumPy arrays of floats, with NaN for missing data. If the
+    data are not numbers, return them as they are."""
+    try:
+        data = numpy.array(data_vec_t[0], dtype=float)
+    except (TypeError, ValueError):
+        return start_vec_t, stop_vec_t, data_vec_t
+    return (ValueTuple(numpy.array(start_vec_t[0], dtype=float), start_vec_t[1], start_vec_t[2]),
+            ValueTuple(numpy.array(stop_vec_t[0], dtype=float), stop_vec_t[1], stop_vec_t[2]),
+            ValueTuple(data, data_vec_t[1], data_vec_t[2]))
+
+
 def _skip_this_plot(time_ts, plot_options, img_file):
     """A plot can be skipped if it was generated recently and has not changed. This happens if the
     time since the plot was generated is less than the aggregation interval.
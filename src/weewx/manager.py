@@ -55,8 +55,12 @@ Example:
         print(row)
 
 """
+import collections
+import copy
 import datetime
 import logging
+import multiprocessing
+import multiprocessing.util
 import os.path
 import sys
 import time
@@ -67,10 +71,17 @@ import weeutil.weeutil
 import weewx.accum
 import weewx.units
 import weewx.xtypes
-from weeutil.weeutil import timestamp_to_string, to_int, TimeSpan
+from weeutil.weeutil import timestamp_to_string, to_int
 
 log = logging.getLogger(__name__)
 
+# Tracing of individual records. It is off, even when debugging, unless it gets turned on for
+# logger 'weewx.manager.trace' in the [Logging] section of weewx.conf.
+trace = logging.getLogger(__name__ + '.trace')
+# Leave alone a level that has already been configured
+if trace.level == logging.NOTSET:
+    trace.setLevel(logging.INFO)
+
 
 class IntervalError(ValueError):
     """Raised when a bad value of 'interval' is encountered."""
@@ -97,6 +108,8 @@ class Manager:
         last_timestamp (int): The timestamp of the last record in the table.
         std_unit_system (int): The unit system used by the database table.
         sqlkeys (list[str]): A list of the SQL keys that the database table supports.
+        database_dict (dict|None): The database dictionary the manager was opened with, or None
+            if it was given a connection.
     """
 
     def __init__(self, connection, table_name='archive', schema=None):
@@ -117,6 +130,7 @@ class Manager:
 
         self.connection = connection
         self.table_name = table_name
+        self.database_dict = None
         self.first_timestamp = None
         self.last_timestamp = None
         self.std_unit_system = None
@@ -185,6 +199,7 @@ class Manager:
 
         # Create an instance of the right class and return it:
         dbmanager = cls(connection, table_name)
+        dbmanager.database_dict = database_dict
         return dbmanager
 
     @classmethod
@@ -242,6 +257,7 @@ class Manager:
 
         # Create an instance of the right class and return it:
         dbmanager = cls(connection, table_name=table_name, schema=schema)
+        dbmanager.database_dict = database_dict
         return dbmanager
 
     @property
@@ -300,17 +316,22 @@ class Manager:
 
         # Fetch the first row in the database to determine the unit system in use. If the database
         # has never been used, then the unit system is still indeterminate --- set it to 'None'.
-        print(f"DEBUG: _create_sync: self.table_name: {self.table_name}", file=sys.stderr)
-        _row = self.getSql("SELECT usUnits FROM %s LIMIT 1;" % self.table_name)
-        print(f"DEBUG: _create_sync: _row: {_row}", file=sys.stderr)
-        self.std_unit_system = _row[0] if _row is not None else None
-        print(f"DEBUG: _create_sync: std_unit_system: {self.std_unit_system}", file=sys.stderr)
+        if self.connection.dbtype == 'influxdb':
+            # The connection keeps the unit system, and the first and last timestamps, cached
+            self.std_unit_system = self.connection.std_unit_system
+        else:
+            _row = self.getSql("SELECT usUnits FROM %s LIMIT 1;" % self.table_name)
+            self.std_unit_system = _row[0] if _row is not None else None
+        log.debug("Unit system of table '%s' is %s", self.table_name, self.std_unit_system)
 
         # Cache the first and last timestamps
         self.first_timestamp = self.firstGoodStamp()
         self.last_timestamp = self.lastGoodStamp()
 
     def _sync(self):
+        if self.connection.dbtype == 'influxdb':
+            # Whatever the connection has cached may be out of date
+            self.connection.invalidate_cache()
         Manager._create_sync(self)
 
     def lastGoodStamp(self):
@@ -320,6 +341,8 @@ class Manager:
             int|None: Time of the last good archive record as an epoch time,
                 or None if there are no records.
         """
+        if self.connection.dbtype == 'influxdb':
+            return self.connection.first_last(self.table_name)[1]
         _row = self.getSql("SELECT MAX(dateTime) FROM %s" % self.table_name)
         return _row[0] if _row else None
 
@@ -330,9 +353,27 @@ class Manager:
             int|None: Time of the first good archive record as an epoch time,
                 or None if there are no records.
         """
+        if self.connection.dbtype == 'influxdb':
+            return self.connection.first_last(self.table_name)[0]
         _row = self.getSql("SELECT MIN(dateTime) FROM %s" % self.table_name)
         return _row[0] if _row else None
 
+    def dirty_ranges(self):
+        """Time ranges of records that were added to, or replaced in, history that reports may
+        have already covered.
+
+        Returns:
+            list[tuple[int, int, int]]: For each range, the first and last timestamps of the
+                records, and the time they were added. This version keeps no track of them, so
+                the list is empty.
+        """
+        return []
+
+    def _note_added_range(self, min_ts, max_ts, cursor):
+        """Called within the transaction of addRecord(), with the range of timestamps of the
+        records that were added."""
+        pass
+
     def exists(self, obs_type):
         """Checks whether the observation type exists in the database.
 
@@ -418,6 +459,9 @@ class Manager:
                                   timestamp_to_string(record['dateTime']),
                                   self.database_name, e)
 
+            if N:
+                self._note_added_range(min_ts, max_ts, cursor)
+
         # Update the cached timestamps. This has to sit outside the transaction context,
         # in case an exception occurs.
         self.first_timestamp = min_ts if self.first_timestamp is None else min(min_ts, self.first_timestamp)
@@ -433,7 +477,7 @@ class Manager:
                 log.error("Archive record with null time encountered")
             raise weewx.ViolatedPrecondition("Manager record with null time encountered.")
 
-        print(f"DEBUG: Adding record with unit system: {record['usUnits']}", file=sys.stderr)
+        trace.debug("Adding record %s with unit system %s", record['dateTime'], record['usUnits'])
         # Check to make sure the incoming record is in the same unit system as the records already
         # in the database:
         self._check_unit_system(record['usUnits'])
@@ -681,13 +725,13 @@ class Manager:
         """Check to make sure a unit system is the same as what's already in use in the database.
         """
 
-        print(f"DEBUG: Checking unit system: {unit_system} | std unit system: {self.std_unit_system}", file=sys.stderr)
+        trace.debug("Checking unit system %s against %s", unit_system, self.std_unit_system)
         # FIXME: this is hacky, but it works for now
         # Special handling for InfluxDB
-        if 'influx' in str(self.connection.__class__):
+        if self.connection.dbtype == 'influxdb':
             # For InfluxDB, just use the incoming unit system if we don't have one yet
             if self.std_unit_system is None or not isinstance(self.std_unit_system, int) or self.std_unit_system > 255:
-                print(f"DEBUG: Setting std_unit_system to incoming value for InfluxDB: {unit_system}", file=sys.stderr)
+                log.debug("Setting unit system of table '%s' to %s", self.table_name, unit_system)
                 self.std_unit_system = unit_system
             return
             
@@ -749,6 +793,10 @@ class DBBinder:
         self.config_dict = config_dict
         self.default_binding_dict = {}
         self.manager_cache = {}
+        # An optional weewx.tags.AggregateCache, which the tags use to remember aggregates
+        self.aggregate_cache = None
+        # An optional weewx.tags.RecordCache, which the tags use to remember records
+        self.record_cache = None
 
     def close(self):
         for data_binding in list(self.manager_cache.keys()):
@@ -800,6 +848,9 @@ class DBBinder:
                 data_binding = default_binding
             return self.get_manager(data_binding)
 
+        # Let the tags find any aggregate and record caches
+        db_lookup.aggregate_cache = self.aggregate_cache
+        db_lookup.record_cache = self.record_cache
         return db_lookup
 
 
@@ -967,6 +1018,85 @@ def drop_database_with_config(config_dict, data_binding,
     drop_database(manager_dict)
 
 
+def _tranche_spans(first_d, last_d, tranche_days):
+    """Yield the spans of time of the tranches from date first_d, up to but not including date
+    last_d."""
+    mark_d = first_d
+    while mark_d < last_d:
+        stop_d = min(mark_d + tranche_days, last_d)
+        yield time.mktime(mark_d.timetuple()), time.mktime(stop_d.timetuple())
+        mark_d = stop_d
+
+
+# The manager of a process accumulating day summaries for DaySummaryManager._accumulate_tranches()
+_worker_manager = None
+
+
+def _set_worker_manager(manager):
+    """Give a worker process a copy of the manager, with a connection of its own. The connection
+    of the parent is left alone, so the two never talk over the same socket or file handle."""
+    global _worker_manager
+    _worker_manager = copy.copy(manager)
+    _worker_manager.connection = weedb.connect(manager.database_dict)
+    _worker_manager._resident_day = None
+    multiprocessing.util.Finalize(_worker_manager, _worker_manager.connection.close,
+                                  exitpriority=10)
+
+
+def _accumulate_worker_rows(rows, weight_fn):
+    return _accumulate_rows(_worker_manager, rows, weight_fn)
+
+
+def _accumulate_rows(manager, rows, weight_fn):
+    """Accumulate a run of archive rows into day summaries. The rows of a day are added to its
+    summary as columns, all at once.
+
+    Args:
+        manager (DaySummaryManager): The manager of the archive.
+        rows (list[list]): The rows, in order. See Manager.genBatchRows().
+        weight_fn (function): A function used to calculate the weights for a record.
+
+    Returns:
+        tuple[list[weewx.accum.Accum], int, int|None]: The day summaries, the number of records
+            accumulated, and the timestamp of the last one.
+    """
+    day_accums = []
+    nrecs = 0
+    last_ts = None
+    # The rows and weights of the last day
+    day_rows = []
+    weights = []
+    last_time = 0
+    for row in rows:
+        rec = dict(zip(manager.sqlkeys, row))
+        # The following is to get around a bug in sqlite when all the
+        # tables are in one file:
+        if rec['dateTime'] <= last_time:
+            continue
+        last_time = rec['dateTime']
+        try:
+            weight = weight_fn(manager, rec)
+        except IntervalError as e:
+            # Ignore records with bad values for 'interval'
+            log.info("%s: %s", timestamp_to_string(rec['dateTime']), e)
+            log.info('***  ignored.')
+            continue
+        if not day_accums or not day_accums[-1].timespan.includesArchiveTime(rec['dateTime']):
+            if day_rows:
+                day_accums[-1].addColumns(dict(zip(manager.sqlkeys, zip(*day_rows))),
+                                          weights=weights)
+            day_rows = []
+            weights = []
+            day_accums.append(weewx.accum.Accum(weeutil.weeutil.archiveDaySpan(rec['dateTime'])))
+        day_rows.append(row)
+        weights.append(weight)
+        nrecs += 1
+        last_ts = rec['dateTime']
+    if day_rows:
+        day_accums[-1].addColumns(dict(zip(manager.sqlkeys, zip(*day_rows))), weights=weights)
+    return day_accums, nrecs, last_ts
+
+
 def show_progress(last_time, nrec=None):
     """Utility function to show our progress"""
     if nrec:
@@ -1019,6 +1149,12 @@ class DaySummaryManager(Manager):
     In addition to all the tables for each type, there is one additional table called
     'archive_day__metadata', which currently holds the version number and the time of the last
     update.
+
+    In InfluxDB, each table becomes a measurement of the same name. A daily summary is a point
+    with the start of the day as its timestamp, and a field for each column. Writing a point with
+    the same timestamp replaces the old one. The metadata are points at time zero, tagged with
+    their name. Because a measurement does not exist until something has been written to it,
+    the set of types with daily summaries is kept in the metadata, under 'daykeys'.
     """
 
     version = "4.0"
@@ -1055,12 +1191,31 @@ class DaySummaryManager(Manager):
         ]
     }
 
+    # The columns of a stats tuple, and their types. The stats tuple of a scalar type uses the
+    # first few.
+    day_columns = [(column, sql_type.split()[0]) for column, sql_type in day_schemas['vector'][1:]]
+
     # SQL statements used by the metadata in the daily summaries.
     meta_create_str = "CREATE TABLE %s_day__metadata (name CHAR(20) NOT NULL " \
                       "UNIQUE PRIMARY KEY, value TEXT);"
     meta_replace_str = "REPLACE INTO %s_day__metadata VALUES(?, ?)"
     meta_select_str = "SELECT value FROM %s_day__metadata WHERE name=?"
 
+    # Flux queries used by the daily summaries in InfluxDB. Each row is (obs_type, column, value),
+    # where obs_type is the name of the measurement.
+    flux_day_select = 'from(bucket: "%(bucket)s") ' \
+                      '|> range(start: %(start)d, stop: %(stop)d) ' \
+                      '|> filter(fn: (r) => r._measurement =~ /^%(table_name)s_day_[^_]/) ' \
+                      '|> map(fn: (r) => ({obs_type: r._measurement, stat: r._field, ' \
+                      'value: r._value}))'
+    flux_meta_select = 'from(bucket: "%(bucket)s") |> range(start: 0) ' \
+                       '|> filter(fn: (r) => r._measurement == "%(table_name)s_day__metadata" ' \
+                       'and r.name == "%(name)s") |> last() |> keep(columns: ["_value"])'
+    flux_first_last = 'from(bucket: "%(bucket)s") |> range(start: 1) ' \
+                      '|> filter(fn: (r) => r._measurement =~ /^%(table_name)s_day_[^_]/) ' \
+                      '|> keep(columns: ["_time"]) |> group() |> %(fn)s() ' \
+                      '|> map(fn: (r) => ({_value: int(v: r._time) / 1000000000}))'
+
     def __init__(self, connection, table_name='archive', schema=None):
         """Initialize an instance of DaySummaryManager
 
@@ -1085,6 +1240,8 @@ class DaySummaryManager(Manager):
 
         self.version = None
         self.daykeys = None
+        # The day summary of the last record is kept in memory. See _get_resident_day_summary()
+        self._resident_day = None
         DaySummaryManager._create_sync(self)
         self.patch_sums()
 
@@ -1097,24 +1254,24 @@ class DaySummaryManager(Manager):
     def close(self):
         self.version = None
         self.daykeys = None
+        self._resident_day = None
         super().close()
 
     def _create_sync(self):
-        # Skip for InfluxDB - set default values
-        if 'influx' in str(self.connection.__class__):
-            print(f"DEBUG: Skipping daily summary sync for InfluxDB", file=sys.stderr)
-            self.daykeys = set()
-            self.version = '4.0'
-            return
-            
-        # Get a list of all the observation types which have daily summaries
-        all_tables = self.connection.tables()
-        prefix = "%s_day_" % self.table_name
-        n_prefix = len(prefix)
-        meta_name = '%s_day__metadata' % self.table_name
-        # Create a set of types that are in the daily summaries:
-        self.daykeys = {x[n_prefix:] for x in all_tables
-                        if (x.startswith(prefix) and x != meta_name)}
+        if self.connection.dbtype == 'influxdb':
+            # Measurements only show up once they have been written to, so the set of types
+            # is kept in the metadata
+            daykeys = self._read_metadata('daykeys')
+            self.daykeys = set(daykeys.split(',')) if daykeys else set()
+        else:
+            # Get a list of all the observation types which have daily summaries
+            all_tables = self.connection.tables()
+            prefix = "%s_day_" % self.table_name
+            n_prefix = len(prefix)
+            meta_name = '%s_day__metadata' % self.table_name
+            # Create a set of types that are in the daily summaries:
+            self.daykeys = {x[n_prefix:] for x in all_tables
+                            if (x.startswith(prefix) and x != meta_name)}
 
         self.version = self._read_metadata('Version')
         if self.version is None:
@@ -1124,14 +1281,11 @@ class DaySummaryManager(Manager):
     def _sync(self):
         super()._sync()
         self._create_sync()
+        # The types may have changed
+        self._resident_day = None
 
     def _initialize_day_tables(self, schema):
         """Initialize the tables needed for the daily summary."""
-        
-        # Skip for InfluxDB
-        if 'influx' in str(self.connection.__class__):
-            print(f"DEBUG: Skipping day tables initialization for InfluxDB", file=sys.stderr)
-            return
 
         if schema is None:
             # Uninitialized, but no schema was supplied. Raise an exception
@@ -1157,8 +1311,13 @@ class DaySummaryManager(Manager):
             for obs in day_summaries_schemas:
                 self._initialize_day_table(obs[0], obs[1].lower(), cursor)
 
-            # Now create the meta table...
-            cursor.execute(DaySummaryManager.meta_create_str % self.table_name)
+            if self.connection.dbtype == 'influxdb':
+                # There are no tables to create. Just remember the types.
+                self._write_metadata('daykeys', ','.join(obs[0] for obs in day_summaries_schemas),
+                                     cursor)
+            else:
+                # Now create the meta table...
+                cursor.execute(DaySummaryManager.meta_create_str % self.table_name)
             # ... then put the version number in it:
             self._write_metadata('Version', DaySummaryManager.version, cursor)
 
@@ -1173,6 +1332,10 @@ class DaySummaryManager(Manager):
             day_schema_type (str): The schema to be used. Either 'scalar', or 'vector'
             cursor (weedb.Cursor): An open cursor
         """
+        if self.connection.dbtype == 'influxdb':
+            # The measurement will be created when the first daily summary is written
+            return
+
         s = ', '.join(
             ["%s %s" % column_type
              for column_type in DaySummaryManager.day_schemas[day_schema_type]])
@@ -1208,12 +1371,6 @@ class DaySummaryManager(Manager):
         # First let my superclass handle adding the record to the main archive table:
         super()._addSingleRecord(record, cursor, log_success, log_failure, update)
 
-        # Skip daily summary operations for InfluxDB
-        if 'influx' in str(self.connection.__class__):
-            if log_success:
-                print(f"DEBUG: Skipping daily summary for InfluxDB", file=sys.stderr)
-            return
-            
         # Get the start of day for the record:
         _sod_ts = weeutil.weeutil.startOfArchiveDay(record['dateTime'])
 
@@ -1228,9 +1385,10 @@ class DaySummaryManager(Manager):
             return
 
         # Now add to the daily summary for the appropriate day:
-        _day_summary = self._get_day_summary(_sod_ts, cursor)
+        _day_summary, _saved = self._get_resident_day_summary(_sod_ts, cursor)
         _day_summary.addRecord(record, weight=_weight)
-        self._set_day_summary(_day_summary, record['dateTime'], cursor)
+        if self._set_day_summary(_day_summary, record['dateTime'], cursor, _saved):
+            self._resident_day = (str(int(record['dateTime'])), _day_summary, _saved)
         if log_success:
             log.info("Added record %s to daily summary in '%s'",
                      timestamp_to_string(record['dateTime']),
@@ -1238,24 +1396,54 @@ class DaySummaryManager(Manager):
 
     def _updateHiLo(self, accumulator, cursor):
         """Use the contents of an accumulator to update the daily hi/lows."""
-        
-        # Skip for InfluxDB
-        if 'influx' in str(self.connection.__class__):
-            print(f"DEBUG: Skipping updateHiLo for InfluxDB", file=sys.stderr)
-            return
 
         # Get the start-of-day for the timespan in the accumulator
         _sod_ts = weeutil.weeutil.startOfArchiveDay(accumulator.timespan.stop)
 
         # Retrieve the daily summaries seen so far:
-        _stats_dict = self._get_day_summary(_sod_ts, cursor)
+        _stats_dict, _saved = self._get_resident_day_summary(_sod_ts, cursor)
         # Update them with the contents of the accumulator:
         _stats_dict.updateHiLo(accumulator)
         # Then save the results:
-        self._set_day_summary(_stats_dict, accumulator.timespan.stop, cursor)
+        if self._set_day_summary(_stats_dict, accumulator.timespan.stop, cursor, _saved):
+            self._resident_day = (str(int(accumulator.timespan.stop)), _stats_dict, _saved)
+
+    def _get_resident_day_summary(self, sod_ts, cursor):
+        """Return the accumulator of a day, and the stats tuples of its types that are in the
+        database. If it is the day that was last written to, it is kept in memory, and need
+        not be read again.
+
+        The accumulator in memory is only used if the time of the last update in the database
+        is still the one it was written with. Otherwise, somebody else has written to the daily
+        summaries since, or the transaction was rolled back. It is not used again until it has
+        been written successfully, so it can be changed by the caller.
+
+        Args:
+            sod_ts (float|int): The timestamp of the start-of-day of the desired day.
+            cursor (Cursor): An open cursor.
+
+        Returns:
+            tuple[weewx.accum.Accum, dict]: The accumulator, and the stats tuples.
+        """
+        _resident_day, self._resident_day = self._resident_day, None
+        if _resident_day is not None:
+            _last_update, _day_accum, _saved = _resident_day
+            if _day_accum.timespan.start == sod_ts \
+                    and self._is_last_update(_last_update, cursor):
+                return _day_accum, _saved
+        _saved = {}
+        return self._get_day_summary(sod_ts, cursor, _saved), _saved
+
+    def _is_last_update(self, last_update, cursor):
+        """True if the time of the last update of the daily summaries is the given one."""
+        if self.connection.dbtype == 'influxdb' \
+                and self.connection.is_pending(self._metadata_point('lastUpdate', last_update)):
+            # In 'batch' write mode, it has not been written out yet, so a query would not see it
+            return True
+        return self._read_metadata('lastUpdate', cursor) == last_update
 
     def backfill_day_summary(self, start_d=None, stop_d=None,
-                             progress_fn=show_progress, trans_days=5):
+                             progress_fn=show_progress, trans_days=5, workers=1):
 
         """Fill the daily summaries from an archive database.
 
@@ -1274,26 +1462,24 @@ class DaySummaryManager(Manager):
                 in the archive.]
             stop_d (datetime.date|None): The last day to be included, specified as a datetime.date
                 object [Optional. Default is to include the date of the last archive record.]
-            progress_fn (function): This function will be called after processing
-                every 1000 records.
+            progress_fn (function): This function will be called after every transaction.
             trans_days (int): Number of days of archive data to be used for each daily summaries
                 database transaction. [Optional. Default is 5.]
+            workers (int): Number of processes that accumulate the statistics, while this one
+                reads the records and writes the summaries. [Optional. Default is 1.]
 
         Returns:
              tuple[int,int]: A 2-way tuple (nrecs, ndays) where
                   nrecs is the number of records backfilled;
                   ndays is the number of days
         """
-        # Skip for InfluxDB
-        if 'influx' in str(self.connection.__class__):
-            print(f"DEBUG: Skipping backfill_day_summary for InfluxDB", file=sys.stderr)
-            return 0, 0
         # Definition:
         #   last_daily_ts: Timestamp of the last record that was incorporated into the
         #                  daily summary. Usually it is equal to last_record, but it can be less
         #                  if a backfill was aborted.
 
         log.info("Starting backfill of daily summaries")
+        self._resident_day = None
 
         if self.first_timestamp is None:
             # Nothing in the archive database, so there's nothing to do.
@@ -1352,66 +1538,18 @@ class DaySummaryManager(Manager):
         nrecs = 0
         ndays = 0
 
-        mark_d = first_d
-
-        while mark_d < last_d:
-            # Calculate the last date included in this transaction
-            stop_transaction = min(mark_d + tranche_days, last_d)
-            day_accum = None
-
+        spans = _tranche_spans(first_d, last_d, tranche_days)
+        for day_accums, tranche_nrecs, tranche_last_ts \
+                in self._accumulate_tranches(spans, DaySummaryManager._calc_weight, workers):
             with weedb.Transaction(self.connection) as cursor:
-                # Go through all the archive records in the time span, adding them to the
-                # daily summaries
-                start_batch_ts = time.mktime(mark_d.timetuple())
-                stop_batch_ts = time.mktime(stop_transaction.timetuple())
-                for rec in self.genBatchRecords(start_batch_ts, stop_batch_ts):
-                    # If this is the very first record, fetch a new accumulator
-                    if not day_accum:
-                        # Get a TimeSpan that includes the record's timestamp:
-                        timespan = weeutil.weeutil.archiveDaySpan(rec['dateTime'])
-                        # Get an empty day accumulator:
-                        day_accum = weewx.accum.Accum(timespan)
-                    try:
-                        weight = self._calc_weight(rec)
-                    except IntervalError as e:
-                        # Ignore records with bad values for 'interval'
-                        log.info(e)
-                        log.info('***  ignored.')
-                        continue
-                    # Try updating. If the time is out of the accumulator's time span, an
-                    # exception will get raised.
-                    try:
-                        day_accum.addRecord(rec, weight=weight)
-                    except weewx.accum.OutOfSpan:
-                        # The record is out of the time span.
-                        # Save the old accumulator:
-                        self._set_day_summary(day_accum, None, cursor)
-                        ndays += 1
-                        # Get a new accumulator:
-                        timespan = weeutil.weeutil.archiveDaySpan(rec['dateTime'])
-                        day_accum = weewx.accum.Accum(timespan)
-                        # try again
-                        day_accum.addRecord(rec, weight=weight)
-
-                    if last_daily_ts is None:
-                        last_daily_ts = rec['dateTime']
-                    else:
-                        last_daily_ts = max(last_daily_ts, rec['dateTime'])
-                    nrecs += 1
-                    if progress_fn and nrecs % 1000 == 0:
-                        progress_fn(rec['dateTime'], nrecs)
-
-                # We're done with this transaction. Unless it is empty, save the daily summary for
-                # the last day
-                if day_accum and not day_accum.isEmpty:
-                    self._set_day_summary(day_accum, None, cursor)
-                    ndays += 1
-                # Patch lastUpdate:
-                if last_daily_ts:
+                self._set_day_summaries(day_accums, cursor)
+                ndays += len(day_accums)
+                if tranche_last_ts:
+                    last_daily_ts = max(last_daily_ts or 0, tranche_last_ts)
                     self._write_metadata('lastUpdate', str(int(last_daily_ts)), cursor)
-
-            # Advance to the next tranche
-            mark_d += tranche_days
+            nrecs += tranche_nrecs
+            if progress_fn and tranche_last_ts:
+                progress_fn(tranche_last_ts, nrecs)
 
         tdiff = time.time() - t1
         log.info("Processed %d records to backfill %d day summaries in %.2f seconds",
@@ -1423,6 +1561,7 @@ class DaySummaryManager(Manager):
         """Drop the daily summaries."""
 
         log.info("Dropping daily summary tables from '%s' ...", self.connection.database_name)
+        self._resident_day = None
         try:
             _all_tables = self.connection.tables()
             with weedb.Transaction(self.connection) as _cursor:
@@ -1440,7 +1579,8 @@ class DaySummaryManager(Manager):
                      self.connection.database_name)
 
     def recalculate_weights(self, start_d=None, stop_d=None,
-                            tranche_size=100, weight_fn=None, progress_fn=show_progress):
+                            tranche_size=100, weight_fn=None, progress_fn=show_progress,
+                            workers=1):
         """Recalculate just the daily summary weights.
 
         Rather than backfill all the daily summaries, this function simply recalculates the
@@ -1456,9 +1596,12 @@ class DaySummaryManager(Manager):
                 is _calc_weight().
             progress_fn (function): This function will be called after every tranche with the timestamp of the
                 last record processed.
+            workers (int): Number of processes that accumulate the statistics, while this one
+                reads the records and writes the sums. [Optional. Default is 1.]
         """
 
         log.info("recalculate_weights: Using database '%s'" % self.database_name)
+        self._resident_day = None
         log.debug("recalculate_weights: Tranche size %d" % tranche_size)
 
         # Convert tranch size to a timedelta object, so we can perform arithmetic with it.
@@ -1483,87 +1626,123 @@ class DaySummaryManager(Manager):
         # For what follows, last_date needs to point to the day *after* the last desired day.
         last_d += datetime.timedelta(days=1)
 
-        mark_d = first_d
-
-        # March forward, tranche by tranche
-        while mark_d < last_d:
-            end_of_tranche_d = min(mark_d + tranche_days, last_d)
-            self._do_tranche(mark_d, end_of_tranche_d, weight_fn, progress_fn)
-            mark_d = end_of_tranche_d
+        spans = list(_tranche_spans(first_d, last_d, tranche_days))
+        for (start_ts, stop_ts), (day_accums, _, _) in zip(spans, self._accumulate_tranches(
+                spans, weight_fn or DaySummaryManager._calc_weight, workers)):
+            # A day without records gets zero sums, as the records it had are gone.
+            day_accums = self._with_empty_days(day_accums, start_ts, stop_ts)
+            with weedb.Transaction(self.connection) as cursor:
+                self._set_day_sums(day_accums, cursor)
+            if progress_fn:
+                for day_accum in day_accums:
+                    progress_fn(day_accum.timespan.stop)
 
-    def _do_tranche(self, start_d, last_d, weight_fn=None, progress_fn=None):
-        """Reweight a tranche of daily summaries.
+    def _accumulate_tranches(self, spans, weight_fn, workers=1):
+        """Accumulate the records of spans of time into day summaries. With more than one
+        worker, this is done by a pool of processes. The records are read here, so the workers
+        never touch the database.
 
         Args:
-            start_d (datetime.date): First date in the tranche to be reweighted.
-            last_d (datetime.date): Last date in the tranche to be reweighted.
-            weight_fn (function): A function used to calculate the weights for a record. Default is
-               _calc_weight().
-            progress_fn (function): A function to call to show progress. It will be called after every
-                update.
+            spans (Iterable[tuple[float, float]]): The spans of time, each including its stop, but
+                not its start.
+            weight_fn (function): A function used to calculate the weights for a record.
+            workers (int): The number of processes in the pool.
+
+        Yields:
+            tuple[list[weewx.accum.Accum], int, int|None]: For each span, in order, the result of
+                _accumulate_rows().
         """
+        if workers > 1 and not self._can_open_workers():
+            workers = 1
+        if workers <= 1:
+            for start_ts, stop_ts in spans:
+                rows = list(self.genBatchRows(start_ts, stop_ts))
+                yield _accumulate_rows(self, rows, weight_fn)
+            return
 
-        if weight_fn is None:
-            weight_fn = DaySummaryManager._calc_weight
+        # The pool is forked, so the workers get this manager without it being pickled. Each
+        # opens its own connection.
+        with multiprocessing.get_context('fork').Pool(workers, _set_worker_manager,
+                                                      (self,)) as pool:
+            pending = collections.deque()
+            for start_ts, stop_ts in spans:
+                rows = list(self.genBatchRows(start_ts, stop_ts))
+                pending.append(pool.apply_async(_accumulate_worker_rows, (rows, weight_fn)))
+                # Keep the workers busy, without holding much of the archive in memory.
+                if len(pending) > 2 * workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    def _can_open_workers(self):
+        """True if worker processes can be forked, and open connections of their own to my
+        database."""
+        if not weeutil.weeutil.can_fork():
+            log.debug("Worker processes cannot be forked from this thread")
+            return False
+        if not self.database_dict or self.database_dict.get('database_name') == ':memory:':
+            log.debug("Worker processes cannot open database '%s'", self.database_name)
+            return False
+        return True
+
+    def _with_empty_days(self, day_accums, start_ts, stop_ts):
+        """Return accumulators for all the days of a span of time, in order. The days that have
+        no accumulator in day_accums get one with zero sums for every type."""
+        by_start = {day_accum.timespan.start: day_accum for day_accum in day_accums}
+        all_accums = []
+        for day_span in weeutil.weeutil.genDaySpans(start_ts, stop_ts - 1):
+            day_accum = by_start.get(day_span.start)
+            if day_accum is None:
+                day_accum = weewx.accum.Accum(day_span)
+                for obs_type in self.daykeys:
+                    day_accum._init_type(obs_type)
+            all_accums.append(day_accum)
+        return all_accums
 
-        # Do all the dates in the tranche as a single transaction
-        with weedb.Transaction(self.connection) as cursor:
+    def _set_day_sums(self, day_accums, cursor):
+        """Replace the weighted sums for all types for some days. Don't touch the mins and maxes.
 
-            # March down the tranche, day by day
-            mark_d = start_d
-            while mark_d < last_d:
-                next_d = mark_d + datetime.timedelta(days=1)
-                day_span = TimeSpan(time.mktime(mark_d.timetuple()),
-                                    time.mktime(next_d.timetuple()))
-                # Get an accumulator for the day
-                day_accum = weewx.accum.Accum(day_span)
-                # Now populate it with a day's worth of records
-                for rec in self.genBatchRecords(day_span.start, day_span.stop):
-                    try:
-                        weight = weight_fn(self, rec)
-                    except IntervalError as e:
-                        log.info("%s: %s", timestamp_to_string(rec['dateTime']), e)
-                        log.info('***  ignored.')
-                    else:
-                        day_accum.addRecord(rec, weight=weight)
-                # Write out the results of the accumulator
-                self._set_day_sums(day_accum, cursor)
-                if progress_fn:
-                    # Update our progress
-                    progress_fn(day_accum.timespan.stop)
-                # On to the next day
-                mark_d += datetime.timedelta(days=1)
-
-    def _set_day_sums(self, day_accum, cursor):
-        """Replace the weighted sums for all types for a day. Don't touch the mins and maxes."""
-        for obs_type in day_accum:
-            # Skip any types that are not in the daily summary schema
-            if obs_type not in self.daykeys:
-                continue
-            # This will be list that looks like ['sum=2345.65', 'count=123', ... etc.]
-            # It will only include attributes that are in the accumulator for this type.
-            set_list = ['%s=%s' % (k, getattr(day_accum[obs_type], k))
-                        for k in ['sum', 'count', 'wsum', 'sumtime',
-                                  'xsum', 'ysum', 'dirsumtime',
-                                  'squaresum', 'wsquaresum']
-                        if hasattr(day_accum[obs_type], k)]
+        Args:
+            day_accums (list[weewx.accum.Accum]): The accumulators of the days.
+            cursor (Cursor): An open cursor.
+        """
+        # For each type, the columns of the sums, and a row of their values for each day
+        updates = {}
+        for day_accum in day_accums:
+            for obs_type in day_accum:
+                # Skip any types that are not in the daily summary schema
+                if obs_type not in self.daykeys:
+                    continue
+                # Only include attributes that are in the accumulator for this type.
+                columns = tuple(k for k in ['sum', 'count', 'wsum', 'sumtime',
+                                            'xsum', 'ysum', 'dirsumtime',
+                                            'squaresum', 'wsquaresum']
+                                if hasattr(day_accum[obs_type], k))
+                if not columns:
+                    continue
+                row = tuple(getattr(day_accum[obs_type], k) for k in columns)
+                if self.connection.dbtype == 'influxdb':
+                    # A point with just the sums replaces those fields, and leaves the others
+                    # alone.
+                    self._write_day_point(obs_type, day_accum.timespan.start, zip(columns, row))
+                    continue
+                updates.setdefault((obs_type, columns), []).append(
+                    row + (day_accum.timespan.start,))
+
+        for (obs_type, columns), rows in updates.items():
             update_sql = "UPDATE {archive_table}_day_{obs_type} SET {set_stmt} " \
                          "WHERE dateTime = ?;".format(archive_table=self.table_name,
                                                       obs_type=obs_type,
-                                                      set_stmt=', '.join(set_list))
-            # Update this observation type's weighted sums:
-            cursor.execute(update_sql, (day_accum.timespan.start,))
+                                                      set_stmt=', '.join('%s=?' % k
+                                                                         for k in columns))
+            # Update this observation type's weighted sums for all the days at once:
+            cursor.executemany(update_sql, rows)
 
     def patch_sums(self):
         """Version 4.2.0 accidentally interpreted V2.0 daily sums as V1.0, so the weighted sums
         were all given a weight of 1.0, instead of the interval length. Version 4.3.0 attempted
         to fix this bug but introduced its own bug by failing to weight 'dirsumtime'. This fixes
         both bugs."""
-        # Skip for InfluxDB
-        if 'influx' in str(self.connection.__class__):
-            print(f"DEBUG: Skipping patch_sums for InfluxDB", file=sys.stderr)
-            return
-            
         if '1.0' < self.version < '4.0':
             msg = "Daily summaries at V%s. Patching to V%s" \
                   % (self.version, DaySummaryManager.version)
@@ -1587,11 +1766,6 @@ class DaySummaryManager(Manager):
         - V3.0 daily sums need to be upgraded due to a bug in the V4.2.0 and V4.3.0 releases
           but only those after 1 June 2020
         """
-        # Skip for InfluxDB
-        if 'influx' in str(self.connection.__class__):
-            print(f"DEBUG: Skipping update for InfluxDB", file=sys.stderr)
-            return
-            
         if self.version == '1.0':
             self.recalculate_weights(weight_fn=DaySummaryManager._get_weight)
             self._write_metadata('Version', DaySummaryManager.version)
@@ -1609,6 +1783,14 @@ class DaySummaryManager(Manager):
                 the last timestamp. Returns None if there is nothing in the daily summaries.
         """
 
+        if self.connection.dbtype == 'influxdb':
+            interp_dict = {'bucket': self.database_name, 'table_name': self.table_name}
+            first_ts = self.getSql(DaySummaryManager.flux_first_last
+                                   % dict(interp_dict, fn='min'))
+            last_ts = self.getSql(DaySummaryManager.flux_first_last
+                                  % dict(interp_dict, fn='max'))
+            return (first_ts[0] if first_ts else None), (last_ts[0] if last_ts else None)
+
         big_select = ["SELECT MIN(dateTime) AS mtime FROM %s_day_%s"
                       % (self.table_name, key) for key in self.daykeys]
         big_sql = " UNION ".join(big_select) + " ORDER BY mtime ASC LIMIT 1"
@@ -1621,13 +1803,15 @@ class DaySummaryManager(Manager):
 
         return first_ts[0], last_ts[0]
 
-    def _get_day_summary(self, sod_ts, cursor=None):
+    def _get_day_summary(self, sod_ts, cursor=None, saved=None):
         """Return an instance of an appropriate accumulator, initialized to a given day's
         statistics.
         Args:
             sod_ts(float|int): The timestamp of the start-of-day of the desired day.
             cursor(Cursor|None): Optional cursor. If one is not supplied, one will be
                 opened.
+            saved(dict|None): If given, the stats tuple of each type that has a row for the
+                day is put in it, so unchanged types need not be written again.
         Returns:
             weewx.accum.Accum
         """
@@ -1638,6 +1822,33 @@ class DaySummaryManager(Manager):
         # Get an empty day accumulator:
         _day_accum = weewx.accum.Accum(_timespan, self.std_unit_system)
 
+        if self.connection.dbtype == 'influxdb':
+            # One query fetches the statistics of all types
+            _stats = {_day_key: {} for _day_key in self.daykeys}
+            prefix = "%s_day_" % self.table_name
+            _day_select = DaySummaryManager.flux_day_select % {
+                'bucket': self.database_name,
+                'table_name': self.table_name,
+                'start': _day_accum.timespan.start,
+                'stop': _day_accum.timespan.start + 1,
+            }
+            for _obs, _stat, _value in self.genSql(_day_select):
+                _day_key = _obs[len(prefix):]
+                if _day_key in _stats:
+                    _stats[_day_key][_stat] = _value
+            for _day_key, _day_stats in _stats.items():
+                if _day_stats:
+                    # The stats tuple has the columns of the schema for this kind of type
+                    n = len(weewx.accum.new_accumulator(_day_key).getStatsTuple())
+                    _stats_tuple = tuple(_day_stats.get(column)
+                                         for column, _ in DaySummaryManager.day_columns[:n])
+                else:
+                    _stats_tuple = None
+                _day_accum.set_stats(_day_key, _stats_tuple)
+                if saved is not None and _stats_tuple is not None:
+                    saved[_day_key] = _day_accum[_day_key].getStatsTuple()
+            return _day_accum
+
         _cursor = cursor or self.connection.cursor()
 
         try:
@@ -1651,13 +1862,15 @@ class DaySummaryManager(Manager):
                 # If the date does not exist in the database yet then _row will be None.
                 _stats_tuple = _row[1:] if _row is not None else None
                 _day_accum.set_stats(_day_key, _stats_tuple)
+                if saved is not None and _stats_tuple is not None:
+                    saved[_day_key] = _day_accum[_day_key].getStatsTuple()
 
             return _day_accum
         finally:
             if not cursor:
                 _cursor.close()
 
-    def _set_day_summary(self, day_accum, lastUpdate, cursor):
+    def _set_day_summary(self, day_accum, lastUpdate, cursor, saved=None):
         """Write all statistics for a day to the database in a single transaction.
 
         Args:
@@ -1666,7 +1879,40 @@ class DaySummaryManager(Manager):
                 None. Normally, this is the timestamp of the last archive record added to the
                 instance day_accum.
             cursor (Cursor): An open cursor.
+            saved (dict|None): The stats tuples of the types, as they are in the database. Types
+                whose statistics are still the same are not written again. The ones that are
+                written are updated.
+
+        Returns:
+            bool: True if all the statistics were written.
             """
+        _rows = list(self._gen_day_rows(day_accum, saved))
+        _success = self._write_day_rows(_rows, cursor)
+        if saved is not None:
+            saved.update((_summary_type, _write_tuple[1:])
+                         for _summary_type, _write_tuple in _rows)
+
+        # If requested, update the time of the last daily summary update:
+        if lastUpdate is not None:
+            self._write_metadata('lastUpdate', str(int(lastUpdate)), cursor)
+        return _success
+
+    def _set_day_summaries(self, day_accums, cursor):
+        """Write all statistics for some days to the database, a table at a time.
+
+        Args:
+            day_accums (list[weewx.accum.Accum]): The accumulators of the days.
+            cursor (Cursor): An open cursor.
+        """
+        self._write_day_rows((row for day_accum in day_accums
+                              for row in self._gen_day_rows(day_accum)), cursor)
+
+    def _gen_day_rows(self, day_accum, saved=None):
+        """Generate the rows of the daily summaries of a day, which are to be written.
+
+        Yields:
+            tuple[str, tuple]: The type, and the row for its table.
+        """
 
         # Make sure the new data uses the same unit system as the database.
         self._check_unit_system(day_accum.unit_system)
@@ -1679,21 +1925,74 @@ class DaySummaryManager(Manager):
             if _summary_type not in self.daykeys:
                 continue
             # ... get the stats tuple to be written to the database...
-            _write_tuple = (_sod,) + day_accum[_summary_type].getStatsTuple()
-            # ... and an appropriate SQL command with the correct number of question marks ...
-            _qmarks = ','.join(len(_write_tuple) * '?')
+            _stats_tuple = day_accum[_summary_type].getStatsTuple()
+            # ... unless it is already there
+            if saved is not None and saved.get(_summary_type) == _stats_tuple:
+                continue
+            yield _summary_type, (_sod,) + _stats_tuple
+
+    def _write_day_rows(self, rows, cursor):
+        """Write rows of the daily summaries, with a single statement for each table.
+
+        Args:
+            rows (Iterable[tuple[str, tuple]]): The type, and the row for its table, for each
+                row. The row starts with the timestamp of the start of the day.
+            cursor (Cursor): An open cursor.
+
+        Returns:
+            bool: True if all the rows were written.
+        """
+        _success = True
+        _rows_by_type = {}
+        for _summary_type, _write_tuple in rows:
+            if self.connection.dbtype == 'influxdb':
+                _success &= self._write_day_point(
+                    _summary_type, _write_tuple[0],
+                    zip((column for column, _ in DaySummaryManager.day_columns),
+                        _write_tuple[1:]))
+                continue
+            _rows_by_type.setdefault(_summary_type, []).append(_write_tuple)
+
+        for _summary_type, _write_tuples in _rows_by_type.items():
+            # An appropriate SQL command with the correct number of question marks ...
+            _qmarks = ','.join(len(_write_tuples[0]) * '?')
             _sql_replace_str = "REPLACE INTO %s_day_%s VALUES(%s)" % (
                 self.table_name, _summary_type, _qmarks)
             # ... and write to the database. In case the type doesn't appear in the database,
             # be prepared to catch an exception:
             try:
-                cursor.execute(_sql_replace_str, _write_tuple)
+                cursor.executemany(_sql_replace_str, _write_tuples)
             except weedb.OperationalError as e:
                 log.error("Replace failed for database %s: %s", self.database_name, e)
+                _success = False
+        return _success
 
-        # If requested, update the time of the last daily summary update:
-        if lastUpdate is not None:
-            self._write_metadata('lastUpdate', str(int(lastUpdate)), cursor)
+    def _write_day_point(self, obs_type, sod, stats):
+        """Write some, or all, of the statistics of a day to an InfluxDB daily summary.
+
+        Args:
+            obs_type (str): The observation type, such as 'outTemp'.
+            sod (int): The timestamp of the start of the day.
+            stats (dict|Iterable[tuple]): The statistics, as (column, value) pairs. Null values
+                are not written.
+
+        Returns:
+            bool: True if the point was written.
+        """
+        column_types = dict(DaySummaryManager.day_columns)
+        point = self.connection.Point("%s_day_%s" % (self.table_name, obs_type))
+        for column, value in dict(stats).items():
+            if value is not None:
+                # InfluxDB insists that a field always has the same type
+                point = point.field(column, int(value) if column_types[column] == 'INTEGER'
+                                    else float(value))
+        point = point.time(datetime.datetime.fromtimestamp(sod, datetime.timezone.utc))
+        try:
+            self.connection.write_point(point)
+        except weedb.OperationalError as e:
+            log.error("Replace failed for database %s: %s", self.database_name, e)
+            return False
+        return True
 
     def _calc_weight(self, record):
         """Returns the weighting to be used, depending on the version of the daily summaries."""
@@ -1714,13 +2013,64 @@ class DaySummaryManager(Manager):
                 "Non-positive value for record field 'interval': %s" % (record['interval'],))
         return 60.0 * record['interval']
 
+    # How many dirty ranges are kept. Beyond that, the closest ones are merged.
+    max_dirty_ranges = 100
+
+    def dirty_ranges(self, cursor=None):
+        """Time ranges of records that were added to, or replaced in, history that reports may
+        have already covered. Records added after the last one are not included, unless the
+        database was empty.
+
+        Returns:
+            list[tuple[int, int, int]]: For each range, in time order, the first and last
+                timestamps of the records, and the time they were added.
+        """
+        ranges = []
+        for entry in (self._read_metadata('dirtyRanges', cursor) or '').split(','):
+            try:
+                start, stop, marked = (int(v) for v in entry.split(':'))
+            except ValueError:
+                continue
+            ranges.append((start, stop, marked))
+        return sorted(ranges)
+
+    def _note_added_range(self, min_ts, max_ts, cursor):
+        """Remember the range of a batch of records that went into history, rather than after
+        the last record, so reports can regenerate the summaries that cover it."""
+        if self.last_timestamp is not None and min_ts > self.last_timestamp:
+            return
+
+        # Merge the new range with those it overlaps
+        ranges = []
+        new_range = (int(min_ts), int(max_ts), int(time.time()))
+        for r in self.dirty_ranges(cursor):
+            if r[0] <= new_range[1] and new_range[0] <= r[1]:
+                new_range = (min(r[0], new_range[0]), max(r[1], new_range[1]),
+                             max(r[2], new_range[2]))
+            else:
+                ranges.append(r)
+        ranges = sorted(ranges + [new_range])
+
+        # Bound the list by merging the ranges that are closest together
+        while len(ranges) > DaySummaryManager.max_dirty_ranges:
+            i = min(range(len(ranges) - 1), key=lambda i: ranges[i + 1][0] - ranges[i][1])
+            ranges[i:i + 2] = [(ranges[i][0], ranges[i + 1][1],
+                                max(ranges[i][2], ranges[i + 1][2]))]
+
+        self._write_metadata('dirtyRanges', ','.join('%d:%d:%d' % r for r in ranges), cursor)
+
     def _read_metadata(self, key, cursor=None):
         """Obtain a value from the daily summary metadata table.
 
         Returns:
             str|None: Value of the metadata field. Returns None if no value was found.
         """
-        _row = self.getSql(DaySummaryManager.meta_select_str % self.table_name, (key,), cursor)
+        if self.connection.dbtype == 'influxdb':
+            _row = self.getSql(DaySummaryManager.flux_meta_select % {
+                'bucket': self.database_name, 'table_name': self.table_name, 'name': key})
+        else:
+            _row = self.getSql(DaySummaryManager.meta_select_str % self.table_name, (key,),
+                               cursor)
         return _row[0] if _row else None
 
     def _write_metadata(self, key, value, cursor=None):
@@ -1731,6 +2081,10 @@ class DaySummaryManager(Manager):
             value (str):  The value to be written to the metadata field.
             cursor (Cursor|None): An optional cursor to use. If None, a cursor will be opened up.
         """
+        if self.connection.dbtype == 'influxdb':
+            self.connection.write_point(self._metadata_point(key, value))
+            return
+
         _cursor = cursor or self.connection.cursor()
 
         try:
@@ -1740,6 +2094,13 @@ class DaySummaryManager(Manager):
             if cursor is None:
                 _cursor.close()
 
+    def _metadata_point(self, key, value):
+        """The InfluxDB point that holds a value of the daily summary metadata."""
+        return self.connection.Point("%s_day__metadata" % self.table_name) \
+            .tag('name', key) \
+            .field('value', value) \
+            .time(datetime.datetime.fromtimestamp(0, datetime.timezone.utc))
+
 
 if __name__ == '__main__':
     import doctest
@@ -11,6 +11,8 @@ import ftplib
 import glob
 import locale
 import logging
+import multiprocessing
+import multiprocessing.connection
 import os.path
 import threading
 import time
@@ -26,6 +28,7 @@ import weeutil.logger
 import weeutil.weeutil
 import weewx.defaults
 import weewx.manager
+import weewx.tags
 import weewx.units
 from weeutil.weeutil import to_bool, to_int
 
@@ -158,111 +161,246 @@ class StdReportEngine(threading.Thread):
         # all of them may be enabled).
         run_reports = reports or self.config_dict['StdReport'].sections
 
-        # Iterate over each requested report
+        # Find the reports that are due, and their skin dictionaries
+        jobs = []
         for report in run_reports:
+            skin_dict = self._get_skin_dict(report, reports is None)
+            if skin_dict is not None:
+                jobs.append((report, skin_dict))
+
+        workers = to_int(self.config_dict['StdReport'].get('report_workers', 1))
+        if workers > 1 and len(jobs) > 1 and not weeutil.weeutil.can_fork():
+            log.debug("Reports cannot run in processes of their own from this thread. "
+                      "Running them one after the other.")
+            workers = 1
+        if workers > 1 and len(jobs) > 1:
+            self.run_parallel(jobs, workers)
+        else:
+            # All the reports in this run share aggregates and records, so each gets fetched
+            # only once.
+            aggregate_cache = weewx.tags.AggregateCache()
+            record_cache = weewx.tags.RecordCache()
+            for report, skin_dict in jobs:
+                self.run_report(report, skin_dict, aggregate_cache, record_cache)
+            log.debug("Aggregate cache: %d hits, %d misses; record cache: %d hits, %d misses",
+                      aggregate_cache.hits, aggregate_cache.misses,
+                      record_cache.hits, record_cache.misses)
+
+    def _get_skin_dict(self, report, check_enabled):
+        """Return the skin dictionary of a report, or None if the report should not be run."""
+
+        # Ignore the [[Defaults]] section
+        if report == 'Defaults':
+            return None
+
+        # If reports is None, then we need to check whether this particular report has
+        # been enabled.
+        if check_enabled:
+            enabled = to_bool(self.config_dict['StdReport'][report].get('enable', True))
+            if not enabled:
+                log.debug("Report '%s' not enabled. Skipping.", report)
+                return None
+
+        # Fetch and build the skin_dict:
+        try:
+            skin_dict = build_skin_dict(self.config_dict, report)
+        except SyntaxError as e:
+            log.error("Syntax error: %s", e)
+            log.error("   ****       Report ignored")
+            return None
+
+        # Default action is to run the report. Only reason to not run it is
+        # if we have a valid report report_timing, and it did not trigger.
+        if self.record:
+            # StdReport called us not "weectl report run" so look for a report_timing
+            # entry if we have one.
+            timing_line = skin_dict.get('report_timing')
+            if timing_line:
+                # Get a ReportTiming object.
+                timing = ReportTiming(timing_line)
+                if timing.is_valid:
+                    # Get timestamp and interval, so we can check if the
+                    # report timing is triggered.
+                    _ts = self.record['dateTime']
+                    _interval = self.record['interval'] * 60
+                    # Is our report timing triggered? timing.is_triggered
+                    # returns True if triggered, False if not triggered
+                    # and None if an invalid report timing line.
+                    if timing.is_triggered(_ts, _ts - _interval) is False:
+                        # report timing was valid but not triggered so do
+                        # not run the report.
+                        log.debug("Report '%s' skipped due to report_timing setting", report)
+                        return None
+                else:
+                    log.debug("Invalid report_timing setting for report '%s', "
+                              "running report anyway", report)
+                    log.debug("       ****  %s", timing.validation_error)
 
-            # Ignore the [[Defaults]] section
-            if report == 'Defaults':
-                continue
+        return skin_dict
 
-            # If reports is None, then we need to check whether this particular report has
-            # been enabled.
-            if reports is None:
-                enabled = to_bool(self.config_dict['StdReport'][report].get('enable', True))
-                if not enabled:
-                    log.debug("Report '%s' not enabled. Skipping.", report)
-                    continue
+    def run_report(self, report, skin_dict, aggregate_cache=None, record_cache=None):
+        """Run the generators of a report.
 
-            log.debug("Running report '%s'", report)
+        Args:
+            report(str): The name of the report.
+            skin_dict(dict): Its skin dictionary.
+            aggregate_cache(weewx.tags.AggregateCache|None): A cache of aggregates, to be shared
+                with other reports. [Optional. If not given, the report does not use one.]
+            record_cache(weewx.tags.RecordCache|None): A cache of records, to be shared with
+                other reports. [Optional. If not given, the report does not use one.]
+        """
+        log.debug("Running report '%s'", report)
+
+        # We are using two "with" statements below:
+        # 1. Set the current working directory to the skin's location. This allows #include
+        # statements to work.
+        # 2. Set the locale to 'lang'. If 'lang' was not specified, set it to the user's
+        # default locale.
+        with set_cwd(os.path.join(self.config_dict['WEEWX_ROOT'],
+                                  skin_dict['SKIN_ROOT'],
+                                  skin_dict['skin'])) as cwd, \
+                set_locale(skin_dict.get('lang', '')) as loc:
+            log.debug("Running generators for report '%s' in directory '%s' with locale '%s'",
+                      report, cwd, loc)
+
+            if 'Generators' in skin_dict and 'generator_list' in skin_dict['Generators']:
+                for generator in weeutil.weeutil.option_as_list(
+                        skin_dict['Generators']['generator_list']):
+
+                    try:
+                        # Instantiate an instance of the class.
+                        obj = weeutil.weeutil.get_object(generator)(
+                            self.config_dict,
+                            skin_dict,
+                            self.gen_ts,
+                            self.first_run,
+                            self.stn_info,
+                            self.record)
+                    except Exception as e:
+                        log.error("Unable to instantiate generator '%s'", generator)
+                        log.error("        ****  %s", e)
+                        weeutil.logger.log_traceback(log.error, "        ****  ")
+                        log.error("        ****  Generator ignored")
+                        traceback.print_exc()
+                        continue
 
-            # Fetch and build the skin_dict:
-            try:
-                skin_dict = build_skin_dict(self.config_dict, report)
-            except SyntaxError as e:
-                log.error("Syntax error: %s", e)
-                log.error("   ****       Report ignored")
-                continue
+                    if getattr(obj, 'db_binder', None) is not None:
+                        obj.db_binder.aggregate_cache = aggregate_cache
+                        obj.db_binder.record_cache = record_cache
+
+                    try:
+                        # Call its start() method
+                        obj.start()
+
+                    except Exception as e:
+                        # Caught unrecoverable error. Log it, continue on to the
+                        # next generator.
+                        log.error("Caught unrecoverable exception in generator '%s'",
+                                  generator)
+                        log.error("        ****  %s", e)
+                        weeutil.logger.log_traceback(log.error, "        ****  ")
+                        log.error("        ****  Generator terminated")
+                        traceback.print_exc()
+                        continue
 
-            # Default action is to run the report. Only reason to not run it is
-            # if we have a valid report report_timing, and it did not trigger.
-            if self.record:
-                # StdReport called us not "weectl report run" so look for a report_timing
-                # entry if we have one.
-                timing_line = skin_dict.get('report_timing')
-                if timing_line:
-                    # Get a ReportTiming object.
-                    timing = ReportTiming(timing_line)
-                    if timing.is_valid:
-                        # Get timestamp and interval, so we can check if the
-                        # report timing is triggered.
-                        _ts = self.record['dateTime']
-                        _interval = self.record['interval'] * 60
-                        # Is our report timing triggered? timing.is_triggered
-                        # returns True if triggered, False if not triggered
-                        # and None if an invalid report timing line.
-                        if timing.is_triggered(_ts, _ts - _interval) is False:
-                            # report timing was valid but not triggered so do
-                            # not run the report.
-                            log.debug("Report '%s' skipped due to report_timing setting", report)
-                            continue
-                    else:
-                        log.debug("Invalid report_timing setting for report '%s', "
-                                  "running report anyway", report)
-                        log.debug("       ****  %s", timing.validation_error)
-
-            # We are using two "with" statements below:
-            # 1. Set the current working directory to the skin's location. This allows #include
-            # statements to work.
-            # 2. Set the locale to 'lang'. If 'lang' was not specified, set it to the user's
-            # default locale.
-            with set_cwd(os.path.join(self.config_dict['WEEWX_ROOT'],
-                                      skin_dict['SKIN_ROOT'],
-                                      skin_dict['skin'])) as cwd, \
-                    set_locale(skin_dict.get('lang', '')) as loc:
-                log.debug("Running generators for report '%s' in directory '%s' with locale '%s'",
-                          report, cwd, loc)
-
-                if 'Generators' in skin_dict and 'generator_list' in skin_dict['Generators']:
-                    for generator in weeutil.weeutil.option_as_list(
-                            skin_dict['Generators']['generator_list']):
-
-                        try:
-                            # Instantiate an instance of the class.
-                            obj = weeutil.weeutil.get_object(generator)(
-                                self.config_dict,
-                                skin_dict,
-                                self.gen_ts,
-                                self.first_run,
-                                self.stn_info,
-                                self.record)
-                        except Exception as e:
-                            log.error("Unable to instantiate generator '%s'", generator)
-                            log.error("        ****  %s", e)
-                            weeutil.logger.log_traceback(log.error, "        ****  ")
-                            log.error("        ****  Generator ignored")
-                            traceback.print_exc()
-                            continue
-
-                        try:
-                            # Call its start() method
-                            obj.start()
-
-                        except Exception as e:
-                            # Caught unrecoverable error. Log it, continue on to the
-                            # next generator.
-                            log.error("Caught unrecoverable exception in generator '%s'",
-                                      generator)
-                            log.error("        ****  %s", e)
-                            weeutil.logger.log_traceback(log.error, "        ****  ")
-                            log.error("        ****  Generator terminated")
-                            traceback.print_exc()
-                            continue
-
-                        finally:
-                            obj.finalize()
+                    finally:
+                        obj.finalize()
 
-                else:
-                    log.debug("No generators specified for report '%s'", report)
+            else:
+                log.debug("No generators specified for report '%s'", report)
+
+    def run_parallel(self, jobs, workers):
+        """Run reports concurrently, each in its own process.
+
+        A process has its own working directory and locale, so reports cannot get in each
+        other's way. Each generator opens its own database connections. A report that must wait
+        for others names them in option 'run_after'. A report that uploads files waits, unless
+        it says otherwise, for all the reports before it. A report still running after max_wait
+        seconds is stopped, so it cannot hold up the others.
+
+        The processes are forked, so they have the type extensions registered by the services.
+        This is only safe from the main thread. See weeutil.weeutil.can_fork().
+
+        Args:
+            jobs(list[tuple[str, dict]]): The reports to run, in order, and their skin
+                dictionaries.
+            workers(int): How many reports can run at the same time.
+        """
+        context = multiprocessing.get_context('fork')
+        names = [report for report, _ in jobs]
+        waits_for = {}
+        for i, (report, skin_dict) in enumerate(jobs):
+            if 'run_after' in skin_dict:
+                after = weeutil.weeutil.option_as_list(skin_dict['run_after']) or []
+            elif is_uploader(skin_dict):
+                after = names[:i]
+            else:
+                after = []
+            waits_for[report] = {name for name in after if name in names and name != report}
+
+        max_wait = to_int(self.config_dict['StdReport'].get('max_wait', 600))
+        log.debug("Running %d reports with %d workers", len(jobs), workers)
+        pending = list(jobs)
+        running = {}
+        finished = set()
+        while pending or running:
+            # Start the reports whose turn it is, in order
+            for job in list(pending):
+                if len(running) >= workers:
+                    break
+                if waits_for[job[0]] <= finished:
+                    pending.remove(job)
+                    process = self._start_process(context, *job)
+                    running[process.sentinel] = process
+            if not running:
+                # Everything left waits for something that will not finish before it.
+                report = pending[0][0]
+                log.error("Report '%s' waits for %s, which cannot run first. Running it anyway.",
+                          report, ', '.join(sorted(waits_for[report] - finished)))
+                waits_for[report] = set()
+                continue
+            # Wait for a report to finish, or for the oldest one to run out of time
+            timeout = max(0, min(process.start_time for process in running.values())
+                          + max_wait - time.time())
+            ready = multiprocessing.connection.wait(list(running), timeout)
+            for sentinel, process in list(running.items()):
+                if sentinel not in ready:
+                    if time.time() - process.start_time < max_wait:
+                        continue
+                    log.error("Report '%s' still running after %d seconds. Stopping it.",
+                              process.name, max_wait)
+                    process.terminate()
+                del running[sentinel]
+                process.join()
+                if process.exitcode:
+                    log.error("Report '%s' exited with code %s", process.name, process.exitcode)
+                finished.add(process.name)
+
+    def _start_process(self, context, report, skin_dict):
+        """Start the process that runs a report, and return it."""
+        process = context.Process(target=self._run_child, args=(report, skin_dict), name=report)
+        process.start()
+        process.start_time = time.time()
+        return process
+
+    def _run_child(self, report, skin_dict):
+        """Run a report in a child process. Its aggregates and records are shared by its own
+        generators."""
+        aggregate_cache = weewx.tags.AggregateCache()
+        record_cache = weewx.tags.RecordCache()
+        self.run_report(report, skin_dict, aggregate_cache, record_cache)
+        log.debug("Report '%s' aggregate cache: %d hits, %d misses; "
+                  "record cache: %d hits, %d misses", report,
+                  aggregate_cache.hits, aggregate_cache.misses,
+                  record_cache.hits, record_cache.misses)
+
+
+def is_uploader(skin_dict):
+    """True if a report uploads files that other reports generate."""
+    generators = skin_dict.get('Generators', {}).get('generator_list')
+    return any(generator in ('weewx.reportengine.FtpGenerator',
+                             'weewx.reportengine.RsyncGenerator')
+               for generator in weeutil.weeutil.option_as_list(generators) or [])
 
 
 def build_skin_dict(config_dict, report):
@@ -5,6 +5,11 @@
 #
 """Classes for implementing the weewx tag 'code' codes."""
 
+import collections
+import threading
+
+import configobj
+
 import weeutil.weeutil
 import weewx.units
 import weewx.xtypes
@@ -15,6 +20,143 @@ from weewx.units import ValueTuple
 IGNORE_ATTR = {'mro', 'im_func', 'func_code', '__func__', '__code__', '__init__', '__self__'}
 
 
+# ===============================================================================
+#                    Class AggregateCache
+# ===============================================================================
+
+class AggregateCache:
+    """Remembers the results of aggregate queries.
+
+    A report engine run uses one instance for all of its reports and generators. So, a tag such
+    as $day.outTemp.max costs one database query per run, no matter how many times, or in how
+    many templates, it appears. Its size is bounded: when full, the least recently used result
+    is forgotten.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._results = collections.OrderedDict()
+        # Options that are identified by their id(), kept alive so the id cannot be reused
+        self._pinned = {}
+        self._lock = threading.Lock()
+
+    def get_aggregate(self, obs_type, timespan, aggregate_type, db_manager, **option_dict):
+        """Same as weewx.xtypes.get_aggregate(), except that results are remembered."""
+        key = (db_manager.database_name, db_manager.table_name, obs_type, aggregate_type,
+               tuple(timespan), self._freeze(option_dict))
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+            self.misses += 1
+        result = weewx.xtypes.get_aggregate(obs_type, timespan, aggregate_type, db_manager,
+                                            **option_dict)
+        with self._lock:
+            self._results[key] = result
+            if len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+        return result
+
+    def prefetch(self, obs_type, timespan, aggregate_types, db_manager, **option_dict):
+        """Calculate several aggregates of a type at once, using weewx.xtypes.get_aggregates(),
+        and remember them for get_aggregate(). Aggregates already known are not calculated again.
+
+        Returns:
+            int: The number of aggregates calculated.
+        """
+        keys = {}
+        frozen = self._freeze(option_dict)
+        with self._lock:
+            for aggregate_type in aggregate_types:
+                key = (db_manager.database_name, db_manager.table_name, obs_type, aggregate_type,
+                       tuple(timespan), frozen)
+                if key not in self._results:
+                    keys[aggregate_type] = key
+        if not keys:
+            return 0
+        results = weewx.xtypes.get_aggregates(obs_type, timespan, list(keys), db_manager,
+                                              **option_dict)
+        with self._lock:
+            for aggregate_type, result in results.items():
+                self._results[keys[aggregate_type]] = result
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+        return len(results)
+
+    def _freeze(self, value):
+        """Return a hashable equivalent of a value."""
+        if isinstance(value, configobj.Section):
+            # Such as the skin dictionary. It can be big, and it does not change during a run,
+            # so go by identity.
+            self._pinned[id(value)] = value
+            return id(value)
+        if isinstance(value, dict):
+            return tuple(sorted((k, self._freeze(v)) for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(self._freeze(v) for v in value)
+        return value
+
+    def __len__(self):
+        return len(self._results)
+
+
+def get_aggregate(obs_type, timespan, aggregate_type, db_lookup, db_manager, **option_dict):
+    """Calculate an aggregate for a tag, using the aggregate cache of db_lookup, if it has one.
+    """
+    aggregate_cache = getattr(db_lookup, 'aggregate_cache', None)
+    if aggregate_cache is None:
+        return weewx.xtypes.get_aggregate(obs_type, timespan, aggregate_type, db_manager,
+                                          **option_dict)
+    return aggregate_cache.get_aggregate(obs_type, timespan, aggregate_type, db_manager,
+                                         **option_dict)
+
+
+class RecordCache:
+    """Remembers the records fetched by $current and $trend tags.
+
+    Like AggregateCache, a report engine run uses one instance for all of its reports, so a
+    record is fetched from the database once per run, no matter how many tags use it.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._records = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_record(self, db_manager, timestamp, max_delta=None):
+        """Same as db_manager.getRecord(), except that records are remembered. Records must not
+        be modified."""
+        key = (db_manager.database_name, db_manager.table_name, timestamp, max_delta)
+        with self._lock:
+            if key in self._records:
+                self.hits += 1
+                self._records.move_to_end(key)
+                return self._records[key]
+            self.misses += 1
+        record = db_manager.getRecord(timestamp, max_delta=max_delta)
+        with self._lock:
+            self._records[key] = record
+            if len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+        return record
+
+    def __len__(self):
+        return len(self._records)
+
+
+def get_record(db_lookup, db_manager, timestamp, max_delta=None):
+    """Fetch a record for a tag, using the record cache of db_lookup, if it has one."""
+    record_cache = getattr(db_lookup, 'record_cache', None)
+    if record_cache is None:
+        return db_manager.getRecord(timestamp, max_delta=max_delta)
+    return record_cache.get_record(db_manager, timestamp, max_delta)
+
+
 # ===============================================================================
 #                    Class TimeBinder
 # ===============================================================================
@@ -196,6 +338,21 @@ class TimespanBinder:
         self.converter = converter or weewx.units.Converter()
         self.option_dict = option_dict
 
+    def prefetch(self, obs_type, aggregate_types):
+        """Calculate ahead of time, and all at once, aggregates of a type that are going to be
+        asked for, such as $day.outTemp.min and $day.outTemp.max. They are kept in the aggregate
+        cache, so nothing is done if there is none.
+
+        Returns:
+            int: The number of aggregates calculated.
+        """
+        aggregate_cache = getattr(self.db_lookup, 'aggregate_cache', None)
+        if aggregate_cache is None:
+            return 0
+        db_manager = self.db_lookup(self.data_binding)
+        return aggregate_cache.prefetch(obs_type, self.timespan, aggregate_types, db_manager,
+                                        **self.option_dict)
+
     # Iterate over all records in the time period:
     def records(self):
         manager = self.db_lookup(self.data_binding)
@@ -269,7 +426,7 @@ class TimespanBinder:
         """Check whether the given sql expression returns any data"""
         db_manager = self.db_lookup(self.data_binding)
         try:
-            val = weewx.xtypes.get_aggregate(sql_expr, self.timespan, 'not_null', db_manager)
+            val = get_aggregate(sql_expr, self.timespan, 'not_null', self.db_lookup, db_manager)
             return bool(val[0])
         except weewx.UnknownAggregation:
             return False
@@ -491,9 +648,8 @@ class AggTypeBinder:
         try:
             # If we cannot perform the aggregation, we will get an UnknownType or
             # UnknownAggregation error. Be prepared to catch it.
-            result = weewx.xtypes.get_aggregate(self.obs_type, self.timespan,
-                                                self.aggregate_type,
-                                                db_manager, **self.option_dict)
+            result = get_aggregate(self.obs_type, self.timespan, self.aggregate_type,
+                                   self.db_lookup, db_manager, **self.option_dict)
         except (weewx.UnknownType, weewx.UnknownAggregation):
             # Signal Cheetah that we don't know how to do this by raising an AttributeError.
             raise AttributeError(self.obs_type)
@@ -586,7 +742,7 @@ class CurrentObj:
                 raise AttributeError(self.data_binding)
 
             # Get the record for this timestamp from the database
-            record = db_manager.getRecord(self.current_time, max_delta=self.max_delta)
+            record = get_record(self.db_lookup, db_manager, self.current_time, self.max_delta)
             # If there was no record at that timestamp, it will be None. If there was a record,
             # check to see if the type is in it.
             if not record or obs_type in record:
@@ -650,8 +806,9 @@ class TrendObj:
 
         db_manager = self.db_lookup(self.data_binding)
         # Get the current record, and one "time_delta" ago:        
-        now_record = db_manager.getRecord(self.nowtime, self.time_grace_val)
-        then_record = db_manager.getRecord(self.nowtime - self.time_delta_val, self.time_grace_val)
+        now_record = get_record(self.db_lookup, db_manager, self.nowtime, self.time_grace_val)
+        then_record = get_record(self.db_lookup, db_manager, self.nowtime - self.time_delta_val,
+                                 self.time_grace_val)
 
         # Extract the ValueTuples from the records.
         try:
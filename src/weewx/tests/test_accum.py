@@ -191,6 +191,70 @@ class AccumTest(unittest.TestCase):
         rec = accum.getRecord()
         self.assertEqual(rec['stringType'], "AString%d" % (len(self.dataset) - 1))
 
+    def test_Accum_addColumns(self):
+        """Adding the records as columns must give exactly the same results"""
+        # Throw in some nulls and strings
+        for i, record in enumerate(self.dataset):
+            if i % 7 == 0:
+                record['outTemp'] = None
+            if i % 11 == 0:
+                record['windDir'] = None
+            if i % 13 == 0:
+                record['barometer'] = str(record['barometer'])
+        weights = [5 + i % 3 for i in range(len(self.dataset))]
+
+        accum1 = weewx.accum.Accum(TimeSpan(start_ts, stop_ts))
+        for record, weight in zip(self.dataset, weights):
+            accum1.addRecord(record, weight=weight)
+
+        accum2 = weewx.accum.Accum(TimeSpan(start_ts, stop_ts))
+        accum2.addColumns({obs_type: [record[obs_type] for record in self.dataset]
+                           for obs_type in self.dataset[0]}, weights=weights)
+
+        self.assertEqual(list(accum1), list(accum2))
+        for obs_type in accum1:
+            self.assertEqual(accum1[obs_type].getStatsTuple(),
+                             accum2[obs_type].getStatsTuple())
+            self.assertEqual((accum1[obs_type].last, accum1[obs_type].lasttime),
+                             (accum2[obs_type].last, accum2[obs_type].lasttime))
+        self.assertEqual(accum1.getRecord(), accum2.getRecord())
+
+        with self.assertRaises(weewx.accum.OutOfSpan):
+            accum2.addColumns({'dateTime': [stop_ts + 5], 'usUnits': [weewx.US]})
+
+    def test_Accum_add_plan(self):
+        """The adder functions must follow changes to the configuration"""
+        accum = weewx.accum.Accum(TimeSpan(start_ts, stop_ts))
+        accum.addRecord(self.dataset[0])
+        self.assertEqual(accum['outTemp'].count, 1)
+
+        noop_dict = {'outTemp': {'adder': 'noop'}}
+        weewx.accum.accum_dict.prepend(noop_dict)
+        try:
+            accum = weewx.accum.Accum(TimeSpan(start_ts, stop_ts))
+            accum.addRecord(self.dataset[0])
+            self.assertNotIn('outTemp', accum)
+        finally:
+            weewx.accum.accum_dict.maps.remove(noop_dict)
+
+        accum = weewx.accum.Accum(TimeSpan(start_ts, stop_ts))
+        accum.addRecord(self.dataset[0])
+        self.assertEqual(accum['outTemp'].count, 1)
+
+        # Changes made in place
+        noop_dict = {}
+        weewx.accum.accum_dict.prepend(noop_dict)
+        try:
+            accum = weewx.accum.Accum(TimeSpan(start_ts, stop_ts))
+            accum.addRecord(self.dataset[0])
+            self.assertEqual(accum['outTemp'].count, 1)
+            noop_dict['outTemp'] = {'adder': 'noop'}
+            accum = weewx.accum.Accum(TimeSpan(start_ts, stop_ts))
+            accum.addRecord(self.dataset[0])
+            self.assertNotIn('outTemp', accum)
+        finally:
+            weewx.accum.accum_dict.maps.remove(noop_dict)
+
     def test_Accum_unit_change(self):
 
         # Change the units used by a record mid-stream
@@ -7,12 +7,20 @@
 """Test functions in cheetahgenerator"""
 
 import logging
+import os.path
+import shutil
+import sys
+import tempfile
 import unittest
+from unittest import mock
+
+import Cheetah.Template
 
 import weeutil.logger
 import weeutil.weeutil
 import weewx
 import weewx.cheetahgenerator
+import weewx.tags
 from weewx.units import ValueTuple, ValueHelper
 
 weewx.debug = 1
@@ -99,5 +107,107 @@ class TestHelpers(unittest.TestCase):
         self.assertIsNone(weewx.cheetahgenerator.JSONHelpers.to_int(None))
 
 
+class TestTemplateCache(unittest.TestCase):
+    """Test the cache of compiled templates"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.template = os.path.join(self.tmpdir, 'test.txt.tmpl')
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.write("Hello, $name!")
+
+    def tearDown(self):
+        weewx.cheetahgenerator._template_classes.clear()
+        weewx.cheetahgenerator._template_tags.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, text):
+        with open(self.template, 'w') as fd:
+            fd.write(text)
+
+    def render(self, klass, **search_dict):
+        return str(klass(searchList=[search_dict], filter='AssureUnicode',
+                         filtersLib=weewx.cheetahgenerator))
+
+    def test_reuse(self):
+        klass = weewx.cheetahgenerator.get_template_class(self.template)
+        self.assertIs(weewx.cheetahgenerator.get_template_class(self.template), klass)
+        # The same class can be used with different search lists
+        self.assertEqual(self.render(klass, name='world'), 'Hello, world!')
+        self.assertEqual(self.render(klass, name='there'), 'Hello, there!')
+
+    def test_changed(self):
+        klass = weewx.cheetahgenerator.get_template_class(self.template)
+        self.write("Goodbye, $name!")
+        # Make sure the modification time changes, even on file systems with coarse timestamps
+        stat = os.stat(self.template)
+        os.utime(self.template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        klass2 = weewx.cheetahgenerator.get_template_class(self.template)
+        self.assertIsNot(klass2, klass)
+        self.assertEqual(self.render(klass2, name='world'), 'Goodbye, world!')
+        # Only the module of the latest version is kept
+        self.assertNotIn(klass.__module__, sys.modules)
+        self.assertIn(klass2.__module__, sys.modules)
+
+    def test_disk(self):
+        weewx.cheetahgenerator.get_template_class(self.template, self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        # As if after a restart
+        weewx.cheetahgenerator._template_classes.clear()
+        with mock.patch.object(Cheetah.Template.Template, 'compile') as compile_template:
+            klass = weewx.cheetahgenerator.get_template_class(self.template, self.cache_dir)
+        compile_template.assert_not_called()
+        self.assertEqual(self.render(klass, name='world'), 'Hello, world!')
+
+    def test_tags(self):
+        self.write("$day.outTemp.max $day.outTemp.min.format('%.1f') ${week.rain.sum}\n"
+                   "$month($data_binding='other').outTemp.max $current.outTemp\n"
+                   "#for $year in $alltime.years\n$year.outTemp.max\n#end for\n")
+        tags = weewx.cheetahgenerator.get_template_tags(self.template)
+        self.assertEqual(tags, {'day': {'outTemp': {'max', 'min'}},
+                                'week': {'rain': {'sum'}}})
+        self.assertIs(weewx.cheetahgenerator.get_template_tags(self.template), tags)
+
+    def test_prefetch_errors(self):
+        self.write("$day.outTemp.max $week.rain.sum $month.outTemp.max\n")
+        time_binder = mock.Mock(spec=weewx.tags.TimeBinder)
+        time_binder.day.return_value.prefetch.side_effect = weewx.CannotCalculate('outTemp')
+        time_binder.week.side_effect = AttributeError('week')
+        # An error is left to the tags, and does not stop the rest being prefetched
+        weewx.cheetahgenerator.CheetahGenerator._prefetch(self.template, [{}, time_binder])
+        time_binder.month.return_value.prefetch.assert_called_once_with('outTemp', {'max'})
+
+
+class TestStale(unittest.TestCase):
+    """Test whether summary files need to be generated again"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'NOAA-2024-01.txt')
+        with open(self.path, 'w') as fd:
+            fd.write('January')
+        # The month of January, 2024, generated at the start of February
+        self.span = weeutil.weeutil.TimeSpan(1704096000, 1706774400)
+        os.utime(self.path, (1706774500, 1706774500))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_stale(self):
+        is_stale = weewx.cheetahgenerator.is_stale
+        self.assertFalse(is_stale(self.path, self.span, []))
+        # Records of January added after the file was generated
+        self.assertTrue(is_stale(self.path, self.span, [(1704100000, 1704200000, 1706800000)]))
+        # ... but before
+        self.assertFalse(is_stale(self.path, self.span, [(1704100000, 1704200000, 1706700000)]))
+        # Records of another month
+        self.assertFalse(is_stale(self.path, self.span, [(1706774400 + 300, 1706800000,
+                                                          1706800000)]))
+        # Generated before the month was over
+        os.utime(self.path, (1706770000, 1706770000))
+        self.assertTrue(is_stale(self.path, self.span, []))
+        self.assertTrue(is_stale(os.path.join(self.tmpdir, 'missing'), self.span, []))
+
+
 if __name__ == '__main__':
     unittest.main()
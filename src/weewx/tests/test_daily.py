@@ -23,6 +23,7 @@ import weeutil.logger
 import weeutil.weeutil
 import weewx.manager
 import weewx.tags
+import weewx.xtypes
 from weewx.units import ValueHelper
 
 weewx.debug = 1
@@ -198,6 +199,26 @@ class Common:
                                                   'sum', 'count', 'wsum', 'sumtime',
                                                   'last', 'lasttime')]))
 
+    def testRebuildParallel(self):
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager:
+            start_d = datetime.date(2010, 3, 10)
+            stop_d = datetime.date(2010, 3, 20)
+            days = [time.mktime((2010, 3, day, 0, 0, 0, 0, 0, -1)) for day in range(10, 21)]
+            origStats = [manager._get_day_summary(sod_ts) for sod_ts in days]
+
+            # Rebuild the days with several workers, a few days at a time
+            nrecs, ndays = manager.backfill_day_summary(start_d=start_d, stop_d=stop_d,
+                                                        progress_fn=None, trans_days=3,
+                                                        workers=3)
+            self.assertEqual(ndays, 11)
+            self.assertEqual(manager._read_metadata('lastUpdate'),
+                             str(int(manager.last_timestamp)))
+
+            for orig, sod_ts in zip(origStats, days):
+                new = manager._get_day_summary(sod_ts)
+                for obstype in manager.daykeys:
+                    self.assertEqual(new[obstype].getStatsTuple(), orig[obstype].getStatsTuple())
+
     def testTags(self):
         """Test common tags."""
         global skin_dict
@@ -373,6 +394,105 @@ class Common:
         self.assertEqual(str(tagStats.year().heatdeg.sum), "5125.1°F-day")
         self.assertEqual(str(tagStats.year().cooldeg.sum), "1026.5°F-day")
 
+    def test_aggregate_cache(self):
+        db_binder = weewx.manager.DBBinder(self.config_dict)
+        db_binder.aggregate_cache = weewx.tags.AggregateCache()
+        db_lookup = db_binder.bind_default()
+        stop_ts = time.mktime((2010, 4, 1, 0, 0, 0, 0, 0, -1))
+
+        tagStats = weewx.tags.TimeBinder(db_lookup, stop_ts,
+                                         formatter=default_formatter,
+                                         trend={'time_delta': 10800, 'time_grace': 300},
+                                         skin_dict=skin_dict)
+        self.assertEqual(str(tagStats.day().barometer.max), "29.935 inHg")
+        self.assertEqual(str(tagStats.day().barometer.max), "29.935 inHg")
+        self.assertAlmostEqual(tagStats.day().barometer.max.raw, 29.935, places=3)
+        self.assertEqual((db_binder.aggregate_cache.hits, db_binder.aggregate_cache.misses),
+                         (2, 1))
+
+        # As if from another template. Equal options hit the cache, different ones do not.
+        tagStats = weewx.tags.TimeBinder(db_lookup, stop_ts,
+                                         formatter=default_formatter,
+                                         trend={'time_delta': 10800, 'time_grace': 300},
+                                         skin_dict=skin_dict)
+        self.assertEqual(str(tagStats.day().barometer.maxtime), "00:00:00")
+        self.assertEqual(str(tagStats.day().barometer.max), "29.935 inHg")
+        self.assertEqual(str(tagStats.day().outTemp.max_ge((30.0, 'degree_F'))), "1")
+        self.assertEqual(str(tagStats.day().outTemp.max_ge((120.0, 'degree_F'))), "0")
+        self.assertEqual((db_binder.aggregate_cache.hits, db_binder.aggregate_cache.misses),
+                         (3, 4))
+        db_binder.close()
+
+    def test_record_cache(self):
+        db_binder = weewx.manager.DBBinder(self.config_dict)
+        db_binder.record_cache = weewx.tags.RecordCache()
+        db_lookup = db_binder.bind_default()
+        stop_ts = time.mktime((2010, 4, 1, 0, 0, 0, 0, 0, -1))
+
+        tagStats = weewx.tags.TimeBinder(db_lookup, stop_ts,
+                                         formatter=default_formatter,
+                                         trend={'time_delta': 10800, 'time_grace': 300},
+                                         skin_dict=skin_dict)
+        recordBinder = weewx.tags.RecordBinder(db_lookup, stop_ts, formatter=default_formatter)
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager:
+            now_record = manager.getRecord(stop_ts, max_delta=300)
+            then_record = manager.getRecord(stop_ts - 10800, max_delta=300)
+            record = manager.getRecord(stop_ts)
+        self.assertEqual(tagStats.trend().barometer.raw,
+                         now_record['barometer'] - then_record['barometer'])
+        self.assertEqual(tagStats.trend().outTemp.raw,
+                         now_record['outTemp'] - then_record['outTemp'])
+        self.assertEqual(recordBinder.current().outTemp.raw, record['outTemp'])
+        self.assertEqual(recordBinder.current().barometer.raw, record['barometer'])
+        # Two records for the trends, and one for the current conditions
+        self.assertEqual((db_binder.record_cache.hits, db_binder.record_cache.misses), (3, 3))
+        db_binder.close()
+
+    def test_get_aggregates(self):
+        aggregate_types = ['min', 'max', 'sum', 'count', 'avg', 'rms', 'maxmin', 'minmax',
+                           'meanmin', 'meanmax', 'maxsum', 'minsum', 'maxtime', 'not_null']
+        month_span = weeutil.weeutil.TimeSpan(time.mktime((2010, 3, 1, 0, 0, 0, 0, 0, -1)),
+                                              time.mktime((2010, 4, 1, 0, 0, 0, 0, 0, -1)))
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager:
+            for obs_type in ('outTemp', 'rain'):
+                for span in (month_span, weeutil.weeutil.TimeSpan(month_span.start, month_span.start)):
+                    results = weewx.xtypes.get_aggregates(obs_type, span, aggregate_types,
+                                                          manager)
+                    # Those that need their own query are left out
+                    self.assertEqual(set(results),
+                                     set(aggregate_types) - {'rms', 'maxtime', 'not_null'})
+                    for aggregate_type in results:
+                        expected = weewx.xtypes.get_aggregate(obs_type, span, aggregate_type,
+                                                              manager)
+                        self.assertEqual(results[aggregate_type], expected)
+            # Not on a day boundary, so the daily summaries cannot be used
+            span = weeutil.weeutil.TimeSpan(month_span.start + 3600, month_span.stop)
+            self.assertEqual(weewx.xtypes.get_aggregates('outTemp', span, ['max'], manager), {})
+            # Calculated from the archive table
+            self.assertEqual(weewx.xtypes.get_aggregates('windvec', month_span, ['avg'],
+                                                         manager), {})
+
+    def test_prefetch(self):
+        db_binder = weewx.manager.DBBinder(self.config_dict)
+        db_binder.aggregate_cache = weewx.tags.AggregateCache()
+        db_lookup = db_binder.bind_default()
+        stop_ts = time.mktime((2010, 4, 1, 0, 0, 0, 0, 0, -1))
+
+        tagStats = weewx.tags.TimeBinder(db_lookup, stop_ts, formatter=default_formatter,
+                                         skin_dict=skin_dict)
+        self.assertEqual(tagStats.month().prefetch('outTemp', {'max', 'min', 'maxtime'}), 2)
+        self.assertEqual(tagStats.month().prefetch('outTemp', {'max', 'min', 'maxtime'}), 0)
+        self.assertEqual(len(db_binder.aggregate_cache), 2)
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as manager:
+            month_span = tagStats.month().timespan
+            self.assertEqual(tagStats.month().outTemp.max.value_t,
+                             weewx.xtypes.get_aggregate('outTemp', month_span, 'max', manager))
+            self.assertEqual(tagStats.month().outTemp.min.value_t,
+                             weewx.xtypes.get_aggregate('outTemp', month_span, 'min', manager))
+        self.assertEqual((db_binder.aggregate_cache.hits, db_binder.aggregate_cache.misses),
+                         (2, 0))
+        db_binder.close()
+
 
 class TestSqlite(Common, unittest.TestCase):
 
@@ -0,0 +1,225 @@
+#
+#    Copyright (c) 2024 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test functions in imagegenerator"""
+
+import multiprocessing
+import os.path
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import configobj
+
+import gen_fake_data
+import weeplot.genplot
+import weewx.imagegenerator
+import weewx.manager
+import weewx.units
+import weewx.wxxtypes
+import weewx.xtypes
+
+# A week plot of outTemp, made on 2 February 2024
+PLOTGEN_TS = 1706860800
+IMAGE_DICT = configobj.ConfigObj({
+    'data_binding': 'wx_binding',
+    'bottom_label_format': '%m/%d/%y',
+    'week_images': {
+        'time_length': 604800,
+        'weektemp': {
+            'outTemp': {},
+        },
+        'weekavg': {
+            'bottom_label_format': '%m/%d/%y %H:%M',
+            'outTemp': {
+                'aggregate_type': 'avg',
+                'aggregate_interval': 'hour',
+            },
+        },
+    },
+})
+
+
+class FakeManager:
+    def __init__(self, last_timestamp, dirty_ranges):
+        self.last_timestamp = last_timestamp
+        self._dirty_ranges = dirty_ranges
+
+    def dirty_ranges(self):
+        return self._dirty_ranges
+
+
+# Find the configuration file of the test database. It's assumed to be in the same directory as me:
+config_path = os.path.join(os.path.dirname(__file__), "testgen.conf")
+
+
+class TestFingerprint(unittest.TestCase):
+    """Test whether images need to be generated again"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def fingerprint(self, last_timestamp, dirty_ranges=(), plotgen_ts=PLOTGEN_TS,
+                    plotname='weektemp', **options):
+        generator = weewx.imagegenerator.ImageGenerator.__new__(
+            weewx.imagegenerator.ImageGenerator)
+        generator.skin_dict = {}
+        generator.stn_info = mock.Mock(latitude_f=45.0, longitude_f=-122.0)
+        generator.db_binder = mock.Mock()
+        generator.db_binder.get_manager.return_value = FakeManager(last_timestamp,
+                                                                   list(dirty_ranges))
+        plot_dict = IMAGE_DICT['week_images'][plotname]
+        plot_options = dict(weewx.imagegenerator.accumulateLeaves(plot_dict), **options)
+        return generator.get_fingerprint(plotgen_ts, plot_options, plot_dict, {})
+
+    def test_fingerprint(self):
+        fingerprint = self.fingerprint(PLOTGEN_TS)
+        self.assertEqual(self.fingerprint(PLOTGEN_TS), fingerprint)
+        # A new record within the time domain of the plot
+        self.assertNotEqual(self.fingerprint(PLOTGEN_TS - 300), fingerprint)
+        # Records added to history within the time domain...
+        self.assertNotEqual(self.fingerprint(PLOTGEN_TS, [(PLOTGEN_TS - 86400,
+                                                           PLOTGEN_TS - 80000,
+                                                           PLOTGEN_TS + 300)]),
+                            fingerprint)
+        # ... and before it
+        self.assertEqual(self.fingerprint(PLOTGEN_TS, [(PLOTGEN_TS - 30 * 86400,
+                                                        PLOTGEN_TS - 29 * 86400,
+                                                        PLOTGEN_TS + 300)]),
+                         fingerprint)
+
+    def test_aggregated(self):
+        # Two archive intervals within an hour of an aggregated line
+        fingerprint = self.fingerprint(PLOTGEN_TS + 300, plotgen_ts=PLOTGEN_TS + 300,
+                                       plotname='weekavg')
+        self.assertEqual(self.fingerprint(PLOTGEN_TS + 600, plotgen_ts=PLOTGEN_TS + 600,
+                                          plotname='weekavg'), fingerprint)
+        # The hour is complete
+        self.assertNotEqual(self.fingerprint(PLOTGEN_TS + 3600, plotgen_ts=PLOTGEN_TS + 3600,
+                                             plotname='weekavg'), fingerprint)
+
+    def test_bottom_label(self):
+        # A label that shows the time of generation does not change the fingerprint
+        self.assertEqual(self.fingerprint(PLOTGEN_TS - 600, plotgen_ts=PLOTGEN_TS - 600,
+                                          bottom_label_format='%H:%M'),
+                         self.fingerprint(PLOTGEN_TS - 600, plotgen_ts=PLOTGEN_TS - 300,
+                                          bottom_label_format='%H:%M'))
+
+    def test_unchanged(self):
+        img_file = os.path.join(self.tmpdir, 'weektemp.png')
+        fingerprint_path = os.path.join(self.tmpdir, 'cache', 'weektemp')
+        with open(img_file, 'wb') as fd:
+            fd.write(b'image')
+        self.assertFalse(weewx.imagegenerator._is_unchanged(img_file, fingerprint_path, 'abc'))
+        weewx.imagegenerator._save_fingerprint(img_file, fingerprint_path, 'abc')
+        self.assertTrue(weewx.imagegenerator._is_unchanged(img_file, fingerprint_path, 'abc'))
+        self.assertFalse(weewx.imagegenerator._is_unchanged(img_file, fingerprint_path, 'def'))
+        # The image has been replaced since
+        with open(img_file, 'wb') as fd:
+            fd.write(b'another image')
+        self.assertFalse(weewx.imagegenerator._is_unchanged(img_file, fingerprint_path, 'abc'))
+
+
+class TestDownsample(unittest.TestCase):
+    """Test downsampling the lines of a plot"""
+
+    def setUp(self):
+        self.config_dict = configobj.ConfigObj(config_path, file_error=True, encoding='utf-8')
+        gen_fake_data.configDatabases(self.config_dict, database_type='sqlite')
+        self.db_binder = weewx.manager.DBBinder(self.config_dict)
+        # A type that is not in the database, but can be calculated from it
+        self.wxxtypes = weewx.wxxtypes.WXXTypes((700, 'foot', 'group_altitude'), 45.0, -122.0)
+        weewx.xtypes.xtypes.append(self.wxxtypes)
+
+    def tearDown(self):
+        weewx.xtypes.xtypes.remove(self.wxxtypes)
+        self.db_binder.close()
+
+    def gen_line(self, obs_type):
+        generator = weewx.imagegenerator.ImageGenerator.__new__(
+            weewx.imagegenerator.ImageGenerator)
+        generator.stn_info = mock.Mock(latitude_f=45.0, longitude_f=-122.0)
+        generator.db_binder = self.db_binder
+        generator.converter = weewx.units.Converter()
+        generator.formatter = weewx.units.Formatter()
+        generator.text_dict = {}
+        generator.generic_dict = {}
+        plot_dict = configobj.ConfigObj({
+            'data_binding': 'wx_binding',
+            'time_length': 30 * 86400,
+            'image_width': 300,
+            'downsample': 'true',
+            'monthplot': {obs_type: {}},
+        })['monthplot']
+        plot_options = weewx.imagegenerator.accumulateLeaves(plot_dict)
+        plot = generator.gen_plot(gen_fake_data.stop_ts, plot_options, plot_dict)
+        return plot.line_list[0]
+
+    def raw_series(self, obs_type):
+        x_domain = weewx.imagegenerator._get_x_domain(gen_fake_data.stop_ts,
+                                                      {'time_length': 30 * 86400})[0]
+        return weewx.xtypes.get_series(obs_type, x_domain,
+                                       self.db_binder.get_manager('wx_binding'))[2][0]
+
+    def test_archive_type(self):
+        line = self.gen_line('outTemp')
+        self.assertLess(len(line.y), len(self.raw_series('outTemp')) / 2)
+        self.assertLessEqual(len(line.y), 2 * 300)
+
+    def test_derived_type(self):
+        # The database cannot downsample the type, so all of it is plotted
+        line = self.gen_line('appTemp')
+        self.assertEqual(len(line.y), len(self.raw_series('appTemp')))
+
+
+class TestRender(unittest.TestCase):
+    """Test rendering plots in a pool of processes"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Processes cannot be forked")
+    def test_pool(self):
+        plot = weeplot.genplot.TimePlot({'anti_alias': 2})
+        plot.setXScaling((PLOTGEN_TS - 86400, PLOTGEN_TS, 10800))
+        plot.setYScaling((None, None, None))
+        plot.addLine(weeplot.genplot.PlotLine(range(PLOTGEN_TS - 86400, PLOTGEN_TS, 300),
+                                              [i % 37 for i in range(288)]))
+        here = os.path.join(self.tmpdir, 'here.png')
+        there = os.path.join(self.tmpdir, 'images', 'there.png')
+        self.assertTrue(weewx.imagegenerator._render_plot(plot, here))
+        with multiprocessing.get_context('fork').Pool(2) as pool:
+            self.assertTrue(pool.apply(weewx.imagegenerator._render_plot, (plot, there)))
+        with open(here, 'rb') as fd1, open(there, 'rb') as fd2:
+            self.assertEqual(fd1.read(), fd2.read())
+
+    def test_timeout(self):
+        # A pool that never finishes its images
+        pool = mock.Mock()
+        result = mock.Mock()
+        result.get.side_effect = multiprocessing.TimeoutError
+        rendering = []
+        for name in ('a', 'b'):
+            plot = weeplot.genplot.TimePlot({})
+            plot.setXScaling((PLOTGEN_TS - 86400, PLOTGEN_TS, 10800))
+            plot.setYScaling((0, 10, 1))
+            rendering.append((result, plot, os.path.join(self.tmpdir, name + '.png'),
+                              None, None))
+        self.assertEqual(weewx.imagegenerator._finish_rendering(pool, rendering, 1), 2)
+        pool.terminate.assert_called_once_with()
+        result.get.assert_called_once_with(1)
+        for name in ('a', 'b'):
+            self.assertTrue(os.path.exists(os.path.join(self.tmpdir, name + '.png')))
+
+
+if __name__ == '__main__':
+    unittest.main()
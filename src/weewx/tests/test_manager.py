@@ -18,13 +18,17 @@ It also tests the V4.3 and v4.4 patches.
 import datetime
 import logging
 import os
+import shutil
+import tempfile
 import time
 import unittest
+from unittest import mock
 
 import gen_fake_data
 import schemas.wview_small
 import weedb
 import weeutil.logger
+import weeutil.weeutil
 import weewx.manager
 
 log = logging.getLogger(__name__)
@@ -82,6 +86,38 @@ class CommonWeightTests:
         self.db_manager.recalculate_weights()
         self.check_weights()
 
+    def test_reweight_parallel(self):
+        """Check recalculating the weighted sums with several workers"""
+        with weedb.Transaction(self.db_manager.connection) as cursor:
+            cursor.execute("UPDATE archive_day_outTemp SET wsum = 0, sumtime = 0")
+        self.db_manager.recalculate_weights(tranche_size=5, progress_fn=None, workers=2)
+        self.check_weights()
+
+    def test_reweight_gap(self):
+        """Check reweighting a day whose records are gone, with and without workers"""
+        gap_start_ts = mid_ts
+        gap_stop_ts = int(time.mktime((mid_d + datetime.timedelta(days=1)).timetuple()))
+        with weedb.Transaction(self.db_manager.connection) as cursor:
+            cursor.execute("DELETE FROM archive WHERE dateTime > ? AND dateTime <= ?",
+                           (gap_start_ts, gap_stop_ts))
+        self.db_manager.recalculate_weights(progress_fn=None)
+        expected = self.get_day_summaries()
+        # The sums agree with the records that are left
+        self.assertEqual(self.db_manager.getSql("SELECT SUM(count) FROM archive_day_outTemp"),
+                         self.db_manager.getSql("SELECT COUNT(outTemp) FROM archive"))
+        self.assertEqual(self.db_manager.getSql("SELECT count, wsum FROM archive_day_outTemp "
+                                                "WHERE dateTime = ?", (gap_start_ts,)), (0, 0))
+
+        with weedb.Transaction(self.db_manager.connection) as cursor:
+            cursor.execute("UPDATE archive_day_outTemp SET wsum = 1, sumtime = 1")
+        self.db_manager.recalculate_weights(tranche_size=5, progress_fn=None, workers=2)
+        self.assertEqual(self.get_day_summaries(), expected)
+
+    def get_day_summaries(self):
+        return {key: list(self.db_manager.genSql("SELECT * FROM archive_day_%s "
+                                                 "ORDER BY dateTime" % key))
+                for key in self.db_manager.daykeys}
+
     def check_weights(self):
         # check weights for scalar types
         for key in self.db_manager.daykeys:
@@ -112,7 +148,14 @@ class TestSqliteWeights(CommonWeightTests, unittest.TestCase):
     """Test using the SQLite database"""
 
     def setUp(self):
-        self.db_manager = setup_database(db_dict_sqlite)
+        # The workers of a reweight can only open a database that is in a file
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_manager = setup_database(dict(db_dict_sqlite, SQLITE_ROOT=self.tmpdir,
+                                              database_name='testmgr.sdb'))
+
+    def tearDown(self):
+        self.db_manager.close()
+        shutil.rmtree(self.tmpdir)
 
     # The patch test is done with sqlite only, because it is so much faster
     def test_patch(self):
@@ -135,6 +178,54 @@ class TestSqliteWeights(CommonWeightTests, unittest.TestCase):
         # Make sure the version was set to V4.0 after the patch
         self.assertEqual(self.db_manager.version, weewx.manager.DaySummaryManager.version)
 
+    def test_dirty_ranges(self):
+        # The database was empty, so all of its records count as added to history
+        ranges = self.db_manager.dirty_ranges()
+        self.assertEqual([r[:2] for r in ranges], [(start_ts, stop_ts)])
+        self.assertLessEqual(ranges[0][2], time.time())
+
+        records = list(gen_fake_data.genFakeRecords(start_ts - 10 * interval_secs,
+                                                    stop_ts + interval_secs,
+                                                    interval=interval_secs))
+        # Records after the last one are not history
+        self.db_manager.addRecord(records[-1])
+        self.assertEqual(self.db_manager.dirty_ranges(), ranges)
+        # A backfill before the first record
+        self.db_manager.addRecord(records[:2])
+        self.assertEqual([r[:2] for r in self.db_manager.dirty_ranges()],
+                         [(records[0]['dateTime'], records[1]['dateTime']), (start_ts, stop_ts)])
+        # Replacing records in a range merges with it
+        self.db_manager.addRecord(records[8:12], update=True)
+        self.assertEqual([r[:2] for r in self.db_manager.dirty_ranges()],
+                         [(records[0]['dateTime'], records[1]['dateTime']),
+                          (records[8]['dateTime'], stop_ts)])
+
+    def test_resident_day(self):
+        records = list(gen_fake_data.genFakeRecords(stop_ts + interval_secs,
+                                                    stop_ts + 4 * interval_secs,
+                                                    interval=interval_secs))
+        sod_ts = weeutil.weeutil.startOfArchiveDay(records[0]['dateTime'])
+        self.db_manager.addRecord(records[0])
+        # The day summary of the last record is not read again...
+        with mock.patch.object(self.db_manager, '_get_day_summary') as get_day_summary:
+            self.db_manager.addRecord(records[1])
+        get_day_summary.assert_not_called()
+        # ... unless somebody else has written to it since
+        with weedb.Transaction(self.db_manager.connection) as cursor:
+            cursor.execute("UPDATE archive_day_outTemp SET max=200.0 WHERE dateTime=?",
+                           (sod_ts,))
+            self.db_manager._write_metadata('lastUpdate', str(records[1]['dateTime'] + 1),
+                                            cursor)
+        self.db_manager.addRecord(records[2])
+        day_summary = self.db_manager._get_day_summary(sod_ts)
+        self.assertEqual(day_summary['outTemp'].max, 200.0)
+        # All the records of the day are in its sums
+        result = self.db_manager.getSql("SELECT COUNT(outTemp), SUM(outTemp) FROM archive "
+                                        "WHERE dateTime > ? AND dateTime <= ?",
+                                        (sod_ts, records[-1]['dateTime']))
+        self.assertEqual(day_summary['outTemp'].count, result[0])
+        self.assertAlmostEqual(day_summary['outTemp'].sum, result[1], 6)
+
 
 class TestMySQLWeights(CommonWeightTests, unittest.TestCase):
     """Test using the MySQL database"""
@@ -7,12 +7,16 @@
 
 import logging
 import os.path
+import shutil
+import tempfile
+import time
 import unittest
 
 import weeutil.config
 import weeutil.logger
 import weeutil.weeutil
 import weewx
+import weewx.reportengine
 from weewx.reportengine import build_skin_dict
 
 log = logging.getLogger(__name__)
@@ -199,5 +203,83 @@ class TestReportEngine(unittest.TestCase):
         self.assertFalse(skin_dict['log_success'])
 
 
+class RecordingEngine(weewx.reportengine.StdReportEngine):
+    """A report engine whose reports only record when they start and stop."""
+
+    def __init__(self, config_dict, log_path):
+        super().__init__(config_dict, None)
+        self.log_path = log_path
+
+    def run_report(self, report, skin_dict, aggregate_cache=None, record_cache=None):
+        self.record_event('start', report)
+        time.sleep(float(skin_dict.get('sleep', 0.2)))
+        self.record_event('stop', report)
+
+    def record_event(self, event, report):
+        with open(self.log_path, 'a') as fd:
+            fd.write('%s %s %f\n' % (event, report, time.time()))
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "Needs os.fork()")
+class TestParallel(unittest.TestCase):
+    """Test running reports concurrently"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmpdir, 'events')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_jobs(self, jobs, workers, config_dict=CONFIG_DICT):
+        engine = RecordingEngine(config_dict, self.log_path)
+        engine.run_parallel(jobs, workers)
+        events = {}
+        with open(self.log_path) as fd:
+            for line in fd:
+                event, report, ts = line.split()
+                events[(event, report)] = float(ts)
+        return events
+
+    def test_order(self):
+        ftp = {'Generators': {'generator_list': ['weewx.reportengine.FtpGenerator']}}
+        jobs = [('A', {}), ('B', {}), ('C', {'run_after': 'A'}), ('FTP', ftp)]
+        events = self.run_jobs(jobs, 3)
+        self.assertEqual(len(events), 8)
+        # Independent reports run at the same time
+        self.assertLess(events[('start', 'B')], events[('stop', 'A')])
+        # Reports wait for the ones they depend on
+        self.assertGreaterEqual(events[('start', 'C')], events[('stop', 'A')])
+        for report in ('A', 'B', 'C'):
+            self.assertGreaterEqual(events[('start', 'FTP')], events[('stop', report)])
+
+    def test_workers(self):
+        events = self.run_jobs([('A', {}), ('B', {})], 1)
+        self.assertGreaterEqual(events[('start', 'B')], events[('stop', 'A')])
+
+    def test_cycle(self):
+        jobs = [('A', {'run_after': 'B'}), ('B', {'run_after': 'A'})]
+        events = self.run_jobs(jobs, 2)
+        self.assertEqual(len(events), 4)
+
+    def test_timeout(self):
+        config_dict = weeutil.config.deep_copy(CONFIG_DICT)
+        config_dict['StdReport']['max_wait'] = 1
+        start = time.time()
+        events = self.run_jobs([('A', {'sleep': 30}), ('B', {})], 2, config_dict)
+        self.assertLess(time.time() - start, 10)
+        # The report that ran out of time never stopped by itself
+        self.assertIn(('start', 'A'), events)
+        self.assertNotIn(('stop', 'A'), events)
+        self.assertIn(('stop', 'B'), events)
+
+    def test_is_uploader(self):
+        self.assertTrue(weewx.reportengine.is_uploader(build_skin_dict(
+            weeutil.config.config_from_str(
+                CONFIG_DICT_INI.replace('skin = Seasons', 'skin = Ftp')), 'SeasonsReport')))
+        self.assertFalse(weewx.reportengine.is_uploader(build_skin_dict(CONFIG_DICT,
+                                                                        'SeasonsReport')))
+
+
 if __name__ == '__main__':
     unittest.main()
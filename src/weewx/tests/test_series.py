@@ -10,10 +10,12 @@ import os.path
 import sys
 import time
 import unittest
+from unittest import mock
 
 import configobj
 
 import gen_fake_data
+import weeutil.weeutil
 import weewx
 import weewx.units
 import weewx.wxformulas
@@ -141,6 +143,94 @@ class Common:
                          (["%.2f" % d for d in Common.expected_daily_rain_sum], 'inch',
                           'group_rain'))
 
+    def test_get_series_archive_windowed(self):
+        """Test that an aggregated series agrees with aggregating each interval separately,
+        whether or not it is calculated by a single query. The hourly intervals include the start
+        of DST. The daily intervals run to the middle of a day, so the series as a whole cannot
+        come from the daily summaries, but all the whole days in it must."""
+        cases = [(TimeSpan(time.mktime((2010, 3, 13, 0, 0, 0, 0, 0, -1)),
+                           time.mktime((2010, 3, 16, 0, 0, 0, 0, 0, -1))), 'hour'),
+                 (TimeSpan(time.mktime((2010, 3, 1, 0, 0, 0, 0, 0, -1)),
+                           time.mktime((2010, 3, 20, 12, 0, 0, 0, 0, -1))), 'day'),
+                 (TimeSpan(time.mktime((2010, 3, 1, 12, 0, 0, 0, 0, -1)),
+                           time.mktime((2010, 3, 20, 12, 0, 0, 0, 0, -1))), 'day')]
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as db_manager:
+            for timespan, aggregate_interval in cases:
+                for aggregate_type in ('avg', 'min', 'max', 'sum', 'count'):
+                    start_vec, stop_vec, data_vec \
+                        = weewx.xtypes.get_series('outTemp', timespan, db_manager,
+                                                  aggregate_type, aggregate_interval)
+                    self.assertEqual(len(start_vec[0]),
+                                     len(list(weeutil.weeutil.intervalgen(timespan.start,
+                                                                          timespan.stop,
+                                                                          aggregate_interval))))
+                    for start, stop, value in zip(start_vec[0], stop_vec[0], data_vec[0]):
+                        expected = weewx.xtypes.get_aggregate('outTemp', TimeSpan(start, stop),
+                                                              aggregate_type, db_manager)
+                        self.assertAlmostEqual(value, expected[0], 6)
+                        self.assertEqual(data_vec[1:], expected[1:])
+
+            # The whole days come from the daily summaries, which are also asked for the last
+            # half day, but turn it down
+            day_summaries = weewx.xtypes.DailySummaries.get_aggregate
+            with mock.patch.object(weewx.xtypes.DailySummaries, 'get_aggregate',
+                                   side_effect=day_summaries) as get_aggregate:
+                weewx.xtypes.get_series('outTemp', cases[1][0], db_manager, 'max', 'day')
+            self.assertEqual(get_aggregate.call_count, 20)
+
+    def test_get_series_archive_minmax(self):
+        """Test that aggregate 'minmax' gives the minimum and maximum of each interval with
+        data."""
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as db_manager:
+            start_vec, stop_vec, data_vec \
+                = weewx.xtypes.get_series('outTemp', TimeSpan(start_ts, stop_ts), db_manager,
+                                          'minmax', 6 * 3600)
+            self.assertEqual(data_vec[1:], ('degree_F', 'group_temperature'))
+            # Four intervals a day, for 31 days, with different minimums and maximums
+            self.assertEqual(len(data_vec[0]), 2 * 4 * 31)
+            for i in range(0, len(data_vec[0]), 2):
+                self.assertEqual(start_vec[0][i], start_vec[0][i + 1])
+                span = TimeSpan(start_vec[0][i], stop_vec[0][i])
+                expected = {weewx.xtypes.ArchiveTable.get_aggregate('outTemp', span, agg,
+                                                                    db_manager)[0]
+                            for agg in ('min', 'max')}
+                self.assertEqual({data_vec[0][i], data_vec[0][i + 1]}, expected)
+
+            # Intervals holding a single record give a single point
+            start_vec, stop_vec, data_vec \
+                = weewx.xtypes.get_series('outTemp', TimeSpan(start_ts, stop_ts), db_manager,
+                                          'minmax', 300)
+            raw_vec = weewx.xtypes.get_series('outTemp', TimeSpan(start_ts, stop_ts),
+                                              db_manager)[2]
+            self.assertEqual(data_vec[0], [v for v in raw_vec[0] if v is not None])
+
+    def test_get_series_archive_minmax_rows(self):
+        """Test that aggregate 'minmax' fetches no more than a row per interval, even if the
+        intervals do not divide the timespan, or cross a DST boundary."""
+        # Roughly what a plot 500 pixels wide would ask for
+        aggregate_interval = int(stop_ts - start_ts) // 500
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as db_manager:
+            rows = []
+            gen_sql = db_manager.genSql
+
+            def counting_gen_sql(*args, **kwargs):
+                for row in gen_sql(*args, **kwargs):
+                    rows.append(row)
+                    yield row
+
+            with mock.patch.object(db_manager, 'genSql', counting_gen_sql):
+                start_vec, stop_vec, data_vec \
+                    = weewx.xtypes.get_series('outTemp', TimeSpan(start_ts, stop_ts), db_manager,
+                                              'minmax', aggregate_interval)
+            self.assertLessEqual(len(rows), 501)
+            # Each point still holds the minimum or maximum of its interval
+            for start, stop, value in zip(start_vec[0], stop_vec[0], data_vec[0]):
+                span = TimeSpan(start, stop)
+                self.assertIn(value,
+                              {weewx.xtypes.ArchiveTable.get_aggregate('outTemp', span, agg,
+                                                                       db_manager)[0]
+                               for agg in ('min', 'max')})
+
     def test_get_series_archive_agg_rain_sum(self):
         """Test a series of daily aggregated rain totals, run against the main archive table"""
         with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as db_manager:
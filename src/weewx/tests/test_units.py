@@ -6,6 +6,7 @@
 #
 """Test module weewx.units"""
 
+import math
 import unittest
 import operator
 
@@ -63,6 +64,20 @@ class ConverterTest(unittest.TestCase):
         value_t_us_seq= ([50.0, 68.0, 86.0], "degree_F", "group_temperature")
         self.assertEqual(c.convert(value_t_m_seq), value_t_us_seq)
 
+        # ... and an array, with NaN for missing values:
+        if weewx.units.numpy is not None:
+            numpy = weewx.units.numpy
+            converted = c.convert((numpy.array([10.0, None, 30.0], dtype=float), "degree_C",
+                                   "group_temperature"))
+            self.assertEqual(converted[0][0], 50.0)
+            self.assertTrue(numpy.isnan(converted[0][1]))
+            self.assertEqual(converted[1:], ("degree_F", "group_temperature"))
+            # A conversion that cannot be applied to a whole array is done value by value
+            floored = weewx.units._convert_array(numpy.array([1.5, None], dtype=float),
+                                                 math.floor)
+            self.assertEqual(floored[0], 1.0)
+            self.assertTrue(numpy.isnan(floored[1]))
+
         # Now the metric converter:
         cm = weewx.units.Converter(weewx.units.MetricUnits)
         self.assertEqual(cm.convert(value_t_us), value_t_m)
@@ -7,13 +7,16 @@
 import locale
 import logging
 import os.path
+import re
 import sys
 import time
+import types
 import unittest
 
 import configobj
 
 import gen_fake_data
+import weedb
 import weeutil.logger
 import weeutil.weeutil
 import weewx.manager
@@ -189,5 +192,169 @@ class TestMySQL(Common, unittest.TestCase):
         super().setUp()
 
 
+class FakeFluxManager:
+    """Stands in for a manager bound to an InfluxDB database. It remembers the Flux queries it
+    is asked to run, and answers them with a canned row."""
+
+    table_name = 'archive'
+    database_name = 'test_bucket'
+    std_unit_system = weewx.US
+    connection = types.SimpleNamespace(dbtype='influxdb', has_math=True)
+    sqlkeys = ['dateTime', 'usUnits', 'interval', 'outTemp', 'windSpeed', 'windDir', 'windGust']
+
+    def __init__(self, row):
+        self.row = row
+        self.queries = []
+
+    def getSql(self, sql, sqlargs=(), cursor=None):
+        self.queries.append(sql)
+        return self.row
+
+    def genSql(self, sql, sqlargs=()):
+        self.queries.append(sql)
+        yield from self.row
+
+
+class TestFluxAggregate(unittest.TestCase):
+    """Test that aggregates on InfluxDB are pushed down to the server as Flux"""
+
+    def test_simple(self):
+        db_manager = FakeFluxManager((65.5,))
+        vt = weewx.xtypes.ArchiveTable.get_aggregate('outTemp', month_timespan, 'avg',
+                                                     db_manager)
+        self.assertEqual(vt, (65.5, 'degree_F', 'group_temperature'))
+        self.assertEqual(len(db_manager.queries), 1)
+        query = db_manager.queries[0]
+        self.assertIn('from(bucket: "test_bucket")', query)
+        # The interval (start, stop] becomes the Flux range [start+1, stop+1)
+        self.assertIn('range(start: %d, stop: %d)'
+                      % (month_timespan.start + 1, month_timespan.stop + 1), query)
+        self.assertIn('r._field == "outTemp"', query)
+        self.assertIn('mean()', query)
+
+    def test_wind(self):
+        db_manager = FakeFluxManager((20.0,))
+        vt = weewx.xtypes.ArchiveTable.get_aggregate('wind', month_timespan, 'max', db_manager)
+        self.assertEqual(vt[0], 20.0)
+        self.assertIn('r._field == "windGust"', db_manager.queries[0])
+
+    def test_time(self):
+        db_manager = FakeFluxManager((1283400000,))
+        vt = weewx.xtypes.ArchiveTable.get_aggregate('outTemp', month_timespan, 'maxtime',
+                                                     db_manager)
+        self.assertEqual(vt, (1283400000, 'unix_epoch', 'group_time'))
+
+    def test_vector(self):
+        db_manager = FakeFluxManager((270.0,))
+        vt = weewx.xtypes.ArchiveTable.get_aggregate('wind', month_timespan, 'vecdir',
+                                                     db_manager)
+        self.assertEqual(vt[0], 270.0)
+        query = db_manager.queries[0]
+        self.assertTrue(query.startswith('import "math"'))
+        self.assertIn('r._field == "windDir"', query)
+        self.assertIn('pivot(', query)
+
+    def test_windowed_series(self):
+        # Three hours, binned by the hour. Bins 0 and 2 have data.
+        db_manager = FakeFluxManager([(0, 2, 61.0, 59.0, 120.0), (2, 1, 70.0, 70.0, 70.0)])
+        db_manager.first_timestamp = month_timespan.start
+        db_manager.last_timestamp = month_timespan.stop
+        timespan = weeutil.weeutil.TimeSpan(month_timespan.start, month_timespan.start + 10800)
+        start_vec, stop_vec, data_vec = weewx.xtypes.ArchiveTable.get_series('outTemp', timespan,
+                                                                             db_manager, 'avg',
+                                                                             3600)
+        self.assertEqual(start_vec[0], [timespan.start, timespan.start + 3600,
+                                        timespan.start + 7200])
+        self.assertEqual(data_vec, ([60.0, None, 70.0], 'degree_F', 'group_temperature'))
+        self.assertEqual(len(db_manager.queries), 1)
+        self.assertIn('window(every: 3600s', db_manager.queries[0])
+
+    def test_unknown_type(self):
+        db_manager = FakeFluxManager((65.5,))
+        with self.assertRaises(weewx.UnknownType):
+            weewx.xtypes.ArchiveTable.get_aggregate('foo', month_timespan, 'avg', db_manager)
+        self.assertEqual(db_manager.queries, [])
+
+    def test_no_data(self):
+        db_manager = FakeFluxManager(None)
+        self.assertIsNone(weewx.xtypes.ArchiveTable.get_aggregate('outTemp', month_timespan,
+                                                                  'max', db_manager)[0])
+        self.assertEqual(weewx.xtypes.ArchiveTable.get_aggregate('outTemp', month_timespan,
+                                                                 'count', db_manager)[0], 0)
+        self.assertFalse(weewx.xtypes.ArchiveTable.get_aggregate('outTemp', month_timespan,
+                                                                 'not_null', db_manager)[0])
+
+
+class FluxDayManager(FakeFluxManager):
+    """Serves the daily summaries of a real (SQL) database, the way they would come back from
+    InfluxDB."""
+
+    def __init__(self, db_manager):
+        super().__init__(None)
+        self.db_manager = db_manager
+        self.std_unit_system = db_manager.std_unit_system
+        self.daykeys = db_manager.daykeys
+        self.first_timestamp = db_manager.first_timestamp
+        self.last_timestamp = db_manager.last_timestamp
+
+    def genSql(self, sql, sqlargs=()):
+        self.queries.append(sql)
+        start, stop = re.search(r'range\(start: (\d+), stop: (\d+)\)', sql).groups()
+        table = re.search(r'r._measurement == "(\w+)"', sql).group(1)
+        # A field that was never written does not exist
+        columns = [column for column in re.findall(r'r._field == "(\w+)"', sql)
+                   if column in self.db_manager.connection.columnsOf(table)]
+        for row in self.db_manager.genSql("SELECT dateTime, %s FROM %s "
+                                          "WHERE dateTime >= ? AND dateTime < ?"
+                                          % (', '.join(columns), table), (start, stop)):
+            for column, value in zip(columns, row[1:]):
+                # InfluxDB does not store nulls
+                if value is not None:
+                    yield row[0], column, value
+
+
+class TestFluxDailySummaries(unittest.TestCase):
+    """Test that the daily summaries in InfluxDB give the same results as in SQL"""
+
+    def setUp(self):
+        self.config_dict = configobj.ConfigObj(config_path, file_error=True, encoding='utf-8')
+        gen_fake_data.configDatabases(self.config_dict, database_type='sqlite')
+
+    def test_aggregates(self):
+        options = {'val': weewx.units.ValueTuple(60.0, 'degree_F', 'group_temperature')}
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as db_manager:
+            flux_manager = FluxDayManager(db_manager)
+            for obs_type in ('outTemp', 'wind'):
+                for aggregate_type in weewx.xtypes.DailySummaries.agg_sql_dict:
+                    try:
+                        expected = weewx.xtypes.DailySummaries.get_aggregate(
+                            obs_type, month_timespan, aggregate_type, db_manager, **options)
+                    except weedb.NoColumnError:
+                        # Such as 'gustdir' of a scalar type
+                        continue
+                    actual = weewx.xtypes.DailySummaries.get_aggregate(
+                        obs_type, month_timespan, aggregate_type, flux_manager, **options)
+                    if expected[0] is None:
+                        self.assertIsNone(actual[0], aggregate_type)
+                    else:
+                        self.assertAlmostEqual(actual[0], expected[0], 6, aggregate_type)
+                    self.assertEqual(actual[1:], expected[1:])
+
+    def test_series(self):
+        timespan = weeutil.weeutil.TimeSpan(gen_fake_data.start_ts, gen_fake_data.stop_ts)
+        with weewx.manager.open_manager_with_config(self.config_dict, 'wx_binding') as db_manager:
+            flux_manager = FluxDayManager(db_manager)
+            for aggregate_type in weewx.xtypes.DailySummaries.common:
+                for aggregate_interval in ('3d', 'month'):
+                    expected = weewx.xtypes.DailySummaries.get_series(
+                        'outTemp', timespan, db_manager, aggregate_type, aggregate_interval)
+                    actual = weewx.xtypes.DailySummaries.get_series(
+                        'outTemp', timespan, flux_manager, aggregate_type, aggregate_interval)
+                    self.assertEqual(actual[0], expected[0])
+                    self.assertEqual(actual[1], expected[1])
+                    for a, e in zip(actual[2][0], expected[2][0]):
+                        self.assertAlmostEqual(a, e, 6)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -21,6 +21,12 @@ import weeutil.weeutil
 import weewx
 from weeutil.weeutil import ListOfDicts, Polar, is_iterable
 
+# NumPy is optional. If it is installed, vectors held in NumPy arrays can be converted all at once.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 log = logging.getLogger(__name__)
 
 # Handy conversion constants and functions:
@@ -1452,8 +1458,11 @@ def convert(val_t, target_unit):
         except KeyError:
             log.debug("Unable to convert from %s to %s", val_t[1], target_unit)
             raise
-    # Are we converting a list, or a simple scalar?
-    if isinstance(val_t[0], (list, tuple)):
+    # Are we converting an array, a list, or a simple scalar?
+    if numpy is not None and isinstance(val_t[0], numpy.ndarray):
+        # An array, with NaN for missing values
+        new_val = _convert_array(val_t[0], conversion_func)
+    elif isinstance(val_t[0], (list, tuple)):
         # A list
         new_val = [conversion_func(x) if x is not None else None for x in val_t[0]]
     else:
@@ -1464,6 +1473,21 @@ def convert(val_t, target_unit):
     return ValueTuple(new_val, target_unit, val_t[2])
 
 
+def _convert_array(values, conversion_func):
+    """Convert a NumPy array of floats, where NaN marks a missing value. Most conversion
+    functions are arithmetic, and can be applied to the whole array at once. Those that cannot
+    are applied one value at a time."""
+    try:
+        with numpy.errstate(invalid='ignore'):
+            new_values = conversion_func(values)
+        if isinstance(new_values, numpy.ndarray) and new_values.shape == values.shape:
+            return new_values
+    except (TypeError, ValueError):
+        pass
+    return numpy.array([conversion_func(x) if not math.isnan(x) else math.nan
+                        for x in values.tolist()], dtype=float)
+
+
 def convertStd(val_t, target_std_unit_system):
     """Convert a value tuple to an appropriate unit in a target standardized
     unit system
@@ -5,7 +5,9 @@
 #
 """User-defined extensions to the WeeWX type system"""
 
+import bisect
 import datetime
+import functools
 import time
 import math
 
@@ -66,6 +68,20 @@ class XType:
           """
         raise weewx.UnknownAggregation
 
+    def get_aggregates(self, obs_type, timespan, aggregate_types, db_manager, **option_dict):
+        """Calculate several aggregations of the same type over the same timespan at once.
+        Specializing versions should return a dictionary, keyed by aggregation type, holding
+        the aggregations they could calculate. Any not in the dictionary will be calculated
+        one at a time by get_aggregate(). Like get_aggregate(), they should raise
+        `weewx.UnknownType` or `weewx.UnknownAggregation` if they know nothing about the type.
+
+        This version says nothing about types it might calculate through get_aggregate().
+        """
+        if type(self).get_aggregate is XType.get_aggregate:
+            # This extension does not calculate any aggregates.
+            raise weewx.UnknownAggregation
+        return {}
+
     def shut_down(self):
         """Opportunity to do any clean up."""
         pass
@@ -140,6 +156,35 @@ def get_aggregate(obs_type, timespan, aggregate_type, db_manager, **option_dict)
     raise weewx.UnknownAggregation("%s('%s')" % (aggregate_type, obs_type))
 
 
+def get_aggregates(obs_type, timespan, aggregate_types, db_manager, **option_dict):
+    """Calculate several aggregations of a type over a timespan.
+
+    Args:
+        obs_type (str): The type over which aggregation is to be done.
+        timespan (TimeSpan): The time period over which aggregation is to be done.
+        aggregate_types (Iterable[str]): The types of aggregation to be done.
+        db_manager (weewx.manager.Manager): An open database manager.
+        option_dict (dict): Options for the aggregations.
+
+    Returns:
+        dict[str, ValueTuple]: The aggregations that could be calculated together, keyed by
+            aggregation type. The rest must be calculated one at a time by get_aggregate().
+    """
+    # Search the list, stopping at the first extension that knows about the type. Any extension
+    # after it would not be consulted by get_aggregate() either.
+    for xtype in xtypes:
+        try:
+            get_them = xtype.get_aggregates
+        except AttributeError:
+            # A legacy style XType, which does not derive from class XType.
+            return {}
+        try:
+            return get_them(obs_type, timespan, aggregate_types, db_manager, **option_dict)
+        except (weewx.UnknownType, weewx.UnknownAggregation):
+            pass
+    return {}
+
+
 def has_data(obs_type, timespan, db_manager):
     """Search the list, looking for a version that has data.
     Args:
@@ -180,7 +225,9 @@ class ArchiveTable(XType):
         """Get a series, possibly with aggregation, from the main archive database.
 
         The general strategy is that if aggregation is asked for, chop the series up into separate
-        chunks, calculating the aggregate for each chunk. Then assemble the results.
+        chunks, calculating the aggregate for each chunk. Then assemble the results. For the
+        simple aggregates of a type in the archive table, all the chunks are calculated by a
+        single query. See get_windowed_series().
 
         If no aggregation is called for, just return the data directly out of the database.
         """
@@ -194,6 +241,17 @@ class ArchiveTable(XType):
             # Return a series with aggregation
             unit, unit_group = None, None
 
+            if aggregate_type in ArchiveTable.windowed_aggregates \
+                    and obs_type in db_manager.sqlkeys \
+                    and db_manager.connection.dbtype in ArchiveTable.bin_defs:
+                try:
+                    return ArchiveTable.get_windowed_series(obs_type, timespan, db_manager,
+                                                            aggregate_type, aggregate_interval)
+                except weewx.UnknownAggregation:
+                    # Some of the intervals are whole days. Do them one by one, so they can be
+                    # calculated from the daily summaries.
+                    pass
+
             if aggregate_type == 'cumulative':
                 do_aggregate = 'sum'
                 total = 0
@@ -264,6 +322,159 @@ class ArchiveTable(XType):
                 ValueTuple(stop_vec, 'unix_epoch', 'group_time'),
                 ValueTuple(data_vec, unit, unit_group))
 
+    # Aggregates that get_windowed_series() can calculate. Aggregate 'minmax' is for plots: it
+    # gives both the minimum and the maximum of each interval.
+    windowed_aggregates = {'sum', 'count', 'avg', 'max', 'min', 'cumulative', 'minmax'}
+
+    # Database-specific expressions that number the bins of a windowed series. A record falls in
+    # bin n if origin + n * width < dateTime <= origin + (n + 1) * width.
+    bin_defs = {
+        'sqlite': "(dateTime - %(origin)d - 1) / %(width)d",
+        'mysql': "(dateTime - %(origin)d - 1) DIV %(width)d",
+        'influxdb': None,
+    }
+
+    # The statistics of each bin, in the column order of a Flux result.
+    window_sql = "SELECT %(bin_def)s AS bin, COUNT(%(sql_type)s), MAX(%(sql_type)s), " \
+                 "MIN(%(sql_type)s), SUM(%(sql_type)s) FROM %(table_name)s " \
+                 "WHERE dateTime > %(origin)d AND dateTime <= %(stop)d " \
+                 "AND %(sql_type)s IS NOT NULL GROUP BY bin"
+
+    @staticmethod
+    def get_windowed_series(obs_type, timespan, db_manager, aggregate_type, aggregate_interval):
+        """Get an aggregated series from the main archive table, using a single query.
+
+        The aggregation intervals are not necessarily the same length (think of DST, or months),
+        so the database bins the records into windows of a constant width that evenly divides
+        every interval. The bin statistics are then combined into the aggregation intervals.
+        Intervals without data get the same value they would get from get_aggregate().
+
+        Intervals that get_aggregate() would calculate from the daily summaries (whole days) get
+        their time-weighted averages and their highs and lows from there, so if there are any,
+        weewx.UnknownAggregation is raised and the caller has to aggregate interval by interval.
+
+        For aggregate 'minmax', each interval with data gives two points, its minimum and its
+        maximum, in the order that follows on best from the point before, or just one if they
+        are the same. Intervals without data are left out. The points are for plots, so the
+        intervals do not follow local time: they are all the same width, counted from the start
+        of the timespan.
+        """
+        # The aggregation intervals, subject to the same rules as the loop in get_series().
+        startstamp, stopstamp = timespan
+        if aggregate_type == 'minmax':
+            interval = int(weeutil.weeutil.nominal_spans(aggregate_interval))
+            stamps = (weeutil.weeutil.TimeSpan(stamp, min(stamp + interval, int(stopstamp)))
+                      for stamp in range(int(startstamp), int(stopstamp), interval))
+        else:
+            stamps = weeutil.weeutil.intervalgen(startstamp, stopstamp, aggregate_interval)
+        spans = []
+        for stamp in stamps:
+            if db_manager.first_timestamp is None or stamp.stop <= db_manager.first_timestamp:
+                continue
+            if db_manager.last_timestamp is None or stamp.start >= db_manager.last_timestamp:
+                break
+            spans.append(stamp)
+
+        if aggregate_type != 'minmax':
+            for span in spans:
+                try:
+                    DailySummaries.check_eligibility(obs_type, span, db_manager, aggregate_type)
+                except (weewx.UnknownType, weewx.UnknownAggregation):
+                    continue
+                raise weewx.UnknownAggregation(aggregate_type)
+
+        unit, unit_group = weewx.units.getStandardUnitType(
+            db_manager.std_unit_system, obs_type,
+            {'cumulative': 'sum', 'minmax': 'max'}.get(aggregate_type, aggregate_type))
+
+        if not spans:
+            return (ValueTuple([], 'unix_epoch', 'group_time'),
+                    ValueTuple([], 'unix_epoch', 'group_time'),
+                    ValueTuple([], unit, unit_group))
+
+        origin = int(spans[0].start)
+        # The last interval can be cut short by the end of the timespan. Only the boundaries
+        # between intervals have to fall on a bin boundary.
+        width = functools.reduce(math.gcd, [int(span.start) - origin for span in spans[1:]],
+                                 int(spans[0].stop) - origin)
+        # The first bin of each aggregation interval
+        first_bins = [(int(span.start) - origin) // width for span in spans]
+
+        interpolate_dict = {
+            'bucket': db_manager.database_name,
+            'table_name': db_manager.table_name,
+            'sql_type': obs_type,
+            'origin': origin,
+            'width': width,
+            'offset': (origin + 1) % width,
+            'stop': int(spans[-1].stop),
+            'flux_start': origin + 1,
+            'flux_stop': int(spans[-1].stop) + 1,
+        }
+        dbtype = db_manager.connection.dbtype
+        if dbtype == 'influxdb':
+            stmt = ArchiveTable.window_flux % interpolate_dict
+        else:
+            interpolate_dict['bin_def'] = ArchiveTable.bin_defs[dbtype] % interpolate_dict
+            stmt = ArchiveTable.window_sql % interpolate_dict
+
+        # Combine the statistics of the bins into the statistics of each interval
+        counts = [0] * len(spans)
+        maxes = [None] * len(spans)
+        mins = [None] * len(spans)
+        sums = [None] * len(spans)
+        try:
+            for bin_number, count, max_value, min_value, sum_value in db_manager.genSql(stmt):
+                i = bisect.bisect_right(first_bins, bin_number) - 1
+                counts[i] += count
+                if maxes[i] is None or max_value > maxes[i]:
+                    maxes[i] = max_value
+                if mins[i] is None or min_value < mins[i]:
+                    mins[i] = min_value
+                sums[i] = sum_value if sums[i] is None else sums[i] + sum_value
+        except weedb.NoColumnError:
+            raise weewx.UnknownType(obs_type)
+
+        if aggregate_type == 'minmax':
+            start_vec, stop_vec, data_vec = [], [], []
+            for span, min_value, max_value in zip(spans, mins, maxes):
+                if min_value is None:
+                    continue
+                if min_value == max_value:
+                    values = [min_value]
+                elif data_vec and abs(data_vec[-1] - max_value) < abs(data_vec[-1] - min_value):
+                    values = [max_value, min_value]
+                else:
+                    values = [min_value, max_value]
+                start_vec += [span.start] * len(values)
+                stop_vec += [span.stop] * len(values)
+                data_vec += values
+            return (ValueTuple(start_vec, 'unix_epoch', 'group_time'),
+                    ValueTuple(stop_vec, 'unix_epoch', 'group_time'),
+                    ValueTuple(data_vec, unit, unit_group))
+        elif aggregate_type == 'count':
+            data_vec = counts
+        elif aggregate_type == 'max':
+            data_vec = maxes
+        elif aggregate_type == 'min':
+            data_vec = mins
+        elif aggregate_type == 'sum':
+            data_vec = sums
+        elif aggregate_type == 'avg':
+            data_vec = [s / n if n else None for s, n in zip(sums, counts)]
+        else:
+            assert aggregate_type == 'cumulative'
+            data_vec = []
+            total = 0
+            for s in sums:
+                if s is not None:
+                    total += s
+                data_vec.append(total)
+
+        return (ValueTuple([span.start for span in spans], 'unix_epoch', 'group_time'),
+                ValueTuple([span.stop for span in spans], 'unix_epoch', 'group_time'),
+                ValueTuple(data_vec, unit, unit_group))
+
     # Set of SQL statements to be used for calculating aggregates from the main archive table.
     agg_sql_dict = {
         'diff': "SELECT (b.%(sql_type)s - a.%(sql_type)s) FROM archive a, archive b "
@@ -322,6 +533,97 @@ class ArchiveTable(XType):
                      "WHERE dateTime > %(start)s AND dateTime <= %(stop)s " \
                      "AND %(sql_type)s IS NOT NULL"
 
+    # The same aggregates, for InfluxDB. Each is a single Flux pipeline that returns at most one
+    # row, holding the final value in column _value. The interval (start, stop] is expressed as
+    # the half-open range [start+1, stop+1). If there is no data, no row is returned.
+    flux_prefix = 'from(bucket: "%(bucket)s") ' \
+                  '|> range(start: %(flux_start)d, stop: %(flux_stop)d) '
+    # Select one field, then merge all series into a single, time-ordered table.
+    flux_field = flux_prefix \
+        + '|> filter(fn: (r) => r._measurement == "%(table_name)s" ' \
+          'and r._field == "%(sql_type)s") ' \
+          '|> group() |> sort(columns: ["_time"]) '
+    # Select several fields, then pivot them into columns, one row per timestamp. Tags are
+    # dropped first, so they don't get in the way of fields with the same name.
+    flux_pivot = flux_prefix \
+        + '|> filter(fn: (r) => r._measurement == "%(table_name)s" and (%(field_filter)s)) ' \
+          '|> keep(columns: ["_time", "_field", "_value"]) |> group() ' \
+          '|> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value") '
+    flux_value = '|> keep(columns: ["_value"])'
+    flux_time = '|> map(fn: (r) => ({_value: int(v: r._time) / 1000000000}))'
+    # Calculate the x- and y-components of the interval-weighted wind vectors
+    flux_wind_xy = '|> map(fn: (r) => ({r with ' \
+                   'x: if exists r.windDir then float(v: r.interval) * r.windSpeed ' \
+                   '* math.cos(x: (90.0 - r.windDir) * math.pi / 180.0) else 0.0, ' \
+                   'y: if exists r.windDir then float(v: r.interval) * r.windSpeed ' \
+                   '* math.sin(x: (90.0 - r.windDir) * math.pi / 180.0) else 0.0})) '
+    # Difference between the first and last values, joined into a single row
+    flux_first_last = 'data = ' + flux_field.replace('%(flux_start)d', '%(start)d') + '\n' \
+        'join(tables: {a: data |> first(), b: data |> last()}, on: ["_field"]) '
+
+    agg_flux_dict = {
+        'avg': flux_field + '|> mean() ' + flux_value,
+        'count': flux_field + '|> count() ' + flux_value,
+        'diff': flux_first_last + '|> map(fn: (r) => ({_value: r._value_b - r._value_a}))',
+        'first': flux_field + '|> first() ' + flux_value,
+        'firsttime': flux_field + '|> first() ' + flux_time,
+        'last': flux_field + '|> last() ' + flux_value,
+        'lasttime': flux_field + '|> last() ' + flux_time,
+        'max': flux_field + '|> max() ' + flux_value,
+        'maxtime': flux_field + '|> max() ' + flux_time,
+        'min': flux_field + '|> min() ' + flux_value,
+        'mintime': flux_field + '|> min() ' + flux_time,
+        'not_null': flux_field + '|> limit(n: 1) ' + flux_value,
+        'sum': flux_field + '|> sum() ' + flux_value,
+        'tderiv': flux_first_last + '|> filter(fn: (r) => r._time_b != r._time_a) '
+                  '|> map(fn: (r) => ({_value: (r._value_b - r._value_a) '
+                  '/ float(v: int(v: r._time_b) - int(v: r._time_a)) * 1000000000.0}))',
+        'gustdir': flux_pivot + '|> filter(fn: (r) => exists r.windGust) '
+                   '|> sort(columns: ["windGust"], desc: true) |> limit(n: 1) '
+                   '|> map(fn: (r) => ({_value: r.windGustDir}))',
+        'vecdir': 'import "math"\n' + flux_pivot
+                  + '|> filter(fn: (r) => exists r.windSpeed and exists r.windDir) '
+                  + flux_wind_xy
+                  + '|> reduce(identity: {xsum: 0.0, ysum: 0.0}, '
+                    'fn: (r, accumulator) => ({xsum: accumulator.xsum + r.x, '
+                    'ysum: accumulator.ysum + r.y})) '
+                    '|> filter(fn: (r) => r.xsum != 0.0 or r.ysum != 0.0) '
+                    '|> map(fn: (r) => { '
+                    'deg = 90.0 - math.atan2(y: r.ysum, x: r.xsum) * 180.0 / math.pi '
+                    'return {_value: if deg >= 0.0 then deg else deg + 360.0}})',
+        'vecavg': 'import "math"\n' + flux_pivot
+                  + '|> filter(fn: (r) => exists r.windSpeed) '
+                  + flux_wind_xy
+                  + '|> reduce(identity: {xsum: 0.0, ysum: 0.0, sumtime: 0.0}, '
+                    'fn: (r, accumulator) => ({xsum: accumulator.xsum + r.x, '
+                    'ysum: accumulator.ysum + r.y, '
+                    'sumtime: accumulator.sumtime + float(v: r.interval)})) '
+                    '|> filter(fn: (r) => r.sumtime > 0.0) '
+                    '|> map(fn: (r) => ({_value: '
+                    'math.sqrt(x: r.xsum * r.xsum + r.ysum * r.ysum) / r.sumtime}))',
+    }
+
+    # The statistics of each bin of a windowed series. See get_windowed_series().
+    window_flux = flux_field \
+        + '|> window(every: %(width)ds, offset: %(offset)ds, createEmpty: false) ' \
+          '|> reduce(identity: {count: 0, sum: 0.0, min: 0.0, max: 0.0}, ' \
+          'fn: (r, accumulator) => ({count: accumulator.count + 1, ' \
+          'sum: accumulator.sum + float(v: r._value), ' \
+          'min: if accumulator.count == 0 or float(v: r._value) < accumulator.min ' \
+          'then float(v: r._value) else accumulator.min, ' \
+          'max: if accumulator.count == 0 or float(v: r._value) > accumulator.max ' \
+          'then float(v: r._value) else accumulator.max})) ' \
+          '|> map(fn: (r) => ({bin: (int(v: r._start) / 1000000000 - %(origin)d - 1) ' \
+          '/ %(width)d, count: r.count, max: r.max, min: r.min, sum: r.sum})) ' \
+          '|> group()'
+
+    # The fields each of the pivoted aggregations needs
+    flux_pivot_fields = {
+        'gustdir': ('windGust', 'windGustDir'),
+        'vecdir': ('windSpeed', 'windDir', 'interval'),
+        'vecavg': ('windSpeed', 'windDir', 'interval'),
+    }
+
     @staticmethod
     def get_aggregate(obs_type, timespan, aggregate_type, db_manager, **option_dict):
         """Returns an aggregation of an observation type over a given time period, using the
@@ -357,6 +659,14 @@ class ArchiveTable(XType):
         else:
             sql_type = obs_type
 
+        if db_manager.connection.dbtype == 'influxdb':
+            # A missing field is not an error to Flux, so check for it here.
+            if sql_type not in db_manager.sqlkeys:
+                raise weewx.UnknownType(obs_type)
+            value = ArchiveTable.get_flux_aggregate(sql_type, timespan, aggregate_type,
+                                                    db_manager)
+            return ArchiveTable._form_value_tuple(obs_type, value, aggregate_type, db_manager)
+
         interpolate_dict = {
             'aggregate_type': aggregate_type,
             'sql_type': sql_type,
@@ -386,6 +696,47 @@ class ArchiveTable(XType):
         else:
             value = row[0] if row else None
 
+        return ArchiveTable._form_value_tuple(obs_type, value, aggregate_type, db_manager)
+
+    @staticmethod
+    def get_flux_aggregate(sql_type, timespan, aggregate_type, db_manager):
+        """Calculate an aggregate on the InfluxDB server, using a single Flux query.
+
+        Args:
+            sql_type (str): The field to be aggregated (e.g., 'outTemp').
+            timespan (weeutil.weeutil.TimeSpan): The time period over which aggregation is to
+                be done.
+            aggregate_type (str): The type of aggregation to be done.
+            db_manager (weewx.manager.Manager): A manager bound to an InfluxDB database.
+
+        Returns:
+            float|int|bool|None: The value of the aggregate.
+        """
+        fields = ArchiveTable.flux_pivot_fields.get(aggregate_type, ())
+        interpolate_dict = {
+            'bucket': db_manager.database_name,
+            'table_name': db_manager.table_name,
+            'sql_type': sql_type,
+            'field_filter': ' or '.join('r._field == "%s"' % f for f in fields),
+            'start': int(timespan.start),
+            'flux_start': int(timespan.start) + 1,
+            'flux_stop': int(timespan.stop) + 1,
+        }
+        flux_stmt = ArchiveTable.agg_flux_dict[aggregate_type] % interpolate_dict
+
+        row = db_manager.getSql(flux_stmt)
+
+        if aggregate_type == 'not_null':
+            return row is not None
+        elif aggregate_type == 'count':
+            # Flux returns no row at all if there is nothing to count
+            return row[0] if row else 0
+        return row[0] if row else None
+
+    @staticmethod
+    def _form_value_tuple(obs_type, value, aggregate_type, db_manager):
+        """Attach the unit and unit group to the value of an aggregate."""
+
         # Look up the unit type and group of this combination of observation type and aggregation:
         u, g = weewx.units.getStandardUnitType(db_manager.std_unit_system, obs_type,
                                                aggregate_type)
@@ -455,6 +806,39 @@ class ArchiveTable(XType):
         return weewx.units.ValueTuple(value, u, g)
 
 
+# The daily summaries in InfluxDB cannot be aggregated with SQL. Instead, they are fetched one
+# row per day, then aggregated in Python with the help of these functions. See
+# DailySummaries.agg_flux_dict.
+
+def _not_null(days, column):
+    return [day[column] for day in days if day.get(column) is not None]
+
+
+def _sum(values):
+    return sum(values) if values else None
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def _first_of(days, sort_key, column, *not_null):
+    """Mimic 'SELECT column ... ORDER BY sort_key LIMIT 1'."""
+    days = [day for day in days if all(day.get(c) is not None for c in not_null)]
+    return (min(days, key=sort_key).get(column),) if days else None
+
+
+def _count_if(days, column, predicate):
+    """Mimic 'SELECT SUM(predicate(column))'."""
+    values = _not_null(days, column)
+    return (sum(1 for v in values if predicate(v)),) if values else (None,)
+
+
+def _avgs(days):
+    return [day['wsum'] / day['sumtime'] for day in days
+            if day.get('wsum') is not None and day.get('sumtime')]
+
+
 #
 # ######################## Class DailySummaries ##############################
 #
@@ -537,6 +921,70 @@ class DailySummaries(XType):
                   "WHERE dateTime >= %(start)s AND dateTime < %(stop)s",
     }
 
+    # For the daily summaries in InfluxDB. For each aggregate, the columns it needs, and a function
+    # that calculates, from a list of days, the row the statement in agg_sql_dict would return.
+    # The function also takes the target value of the aggregates ending in '_ge' or '_le'.
+    agg_flux_dict = {
+        'avg': (('wsum', 'sumtime'),
+                lambda days, val: (_sum(_not_null(days, 'wsum')),
+                                   _sum(_not_null(days, 'sumtime')))),
+        'avg_ge': (('wsum', 'sumtime'),
+                   lambda days, val: (sum(1 for a in _avgs(days) if a >= val),)
+                   if _avgs(days) else (None,)),
+        'avg_le': (('wsum', 'sumtime'),
+                   lambda days, val: (sum(1 for a in _avgs(days) if a <= val),)
+                   if _avgs(days) else (None,)),
+        'count': (('count',), lambda days, val: (_sum(_not_null(days, 'count')),)),
+        'gustdir': (('max', 'maxtime', 'max_dir'),
+                    lambda days, val: _first_of(days, lambda d: (-d['max'], d.get('maxtime') or 0),
+                                                'max_dir', 'max')),
+        'max': (('max',), lambda days, val: (max(_not_null(days, 'max'), default=None),)),
+        'max_ge': (('max',), lambda days, val: _count_if(days, 'max', lambda v: v >= val)),
+        'max_le': (('max',), lambda days, val: _count_if(days, 'max', lambda v: v <= val)),
+        'maxmin': (('min',), lambda days, val: (max(_not_null(days, 'min'), default=None),)),
+        'maxmintime': (('min', 'mintime'),
+                       lambda days, val: _first_of(days, lambda d: (-d['min'], d['mintime']),
+                                                   'mintime', 'min', 'mintime')),
+        'maxsum': (('sum',), lambda days, val: (max(_not_null(days, 'sum'), default=None),)),
+        'maxsumtime': (('sum',),
+                       lambda days, val: _first_of(days, lambda d: (-d['sum'], d['dateTime']),
+                                                   'dateTime', 'sum')),
+        'maxtime': (('max', 'maxtime'),
+                    lambda days, val: _first_of(days, lambda d: (-d['max'], d['maxtime']),
+                                                'maxtime', 'max', 'maxtime')),
+        'meanmax': (('max',), lambda days, val: (_mean(_not_null(days, 'max')),)),
+        'meanmin': (('min',), lambda days, val: (_mean(_not_null(days, 'min')),)),
+        'min': (('min',), lambda days, val: (min(_not_null(days, 'min'), default=None),)),
+        'min_ge': (('min',), lambda days, val: _count_if(days, 'min', lambda v: v >= val)),
+        'min_le': (('min',), lambda days, val: _count_if(days, 'min', lambda v: v <= val)),
+        'minmax': (('max',), lambda days, val: (min(_not_null(days, 'max'), default=None),)),
+        'minmaxtime': (('max', 'maxtime'),
+                       lambda days, val: _first_of(days, lambda d: (d['max'], d['maxtime']),
+                                                   'maxtime', 'max', 'maxtime')),
+        'minsum': (('sum',), lambda days, val: (min(_not_null(days, 'sum'), default=None),)),
+        'minsumtime': (('sum',),
+                       lambda days, val: _first_of(days, lambda d: (d['sum'], d['dateTime']),
+                                                   'dateTime', 'sum')),
+        'mintime': (('min', 'mintime'),
+                    lambda days, val: _first_of(days, lambda d: (d['min'], d['mintime']),
+                                                'mintime', 'min', 'mintime')),
+        'not_null': (('count',),
+                     lambda days, val: (int(any(c > 0 for c in _not_null(days, 'count'))),)
+                     if days else None),
+        'rms': (('wsquaresum', 'sumtime'),
+                lambda days, val: (_sum(_not_null(days, 'wsquaresum')),
+                                   _sum(_not_null(days, 'sumtime')))),
+        'sum': (('sum',), lambda days, val: (_sum(_not_null(days, 'sum')),)),
+        'sum_ge': (('sum',), lambda days, val: _count_if(days, 'sum', lambda v: v >= val)),
+        'sum_le': (('sum',), lambda days, val: _count_if(days, 'sum', lambda v: v <= val)),
+        'vecavg': (('xsum', 'ysum', 'sumtime'),
+                   lambda days, val: (_sum(_not_null(days, 'xsum')), _sum(_not_null(days, 'ysum')),
+                                      _sum(_not_null(days, 'sumtime')))),
+        'vecdir': (('xsum', 'ysum'),
+                   lambda days, val: (_sum(_not_null(days, 'xsum')),
+                                      _sum(_not_null(days, 'ysum')))),
+    }
+
     @staticmethod
     def get_aggregate(obs_type, timespan, aggregate_type, db_manager, **option_dict):
         """Returns an aggregation of a statistical type for a given time period,
@@ -595,7 +1043,79 @@ class DailySummaries(XType):
         }
 
         # Run the query against the database:
-        row = db_manager.getSql(DailySummaries.agg_sql_dict[aggregate_type] % inter_dict)
+        if db_manager.connection.dbtype == 'influxdb':
+            days = DailySummaries.get_flux_days(obs_type, inter_dict['start'], timespan.stop,
+                                                db_manager,
+                                                DailySummaries.agg_flux_dict[aggregate_type][0])
+            row = DailySummaries.agg_flux_dict[aggregate_type][1](days, target_val)
+        else:
+            row = db_manager.getSql(DailySummaries.agg_sql_dict[aggregate_type] % inter_dict)
+
+        return DailySummaries._form_value_tuple(obs_type, aggregate_type, row, db_manager)
+
+    # The aggregates that can be calculated together in a single pass over the daily summaries,
+    # and the SQL columns each needs. The columns return the same row as the statement in
+    # agg_sql_dict. They use only columns that every version of the daily summaries has.
+    multi_sql_dict = {
+        'avg': ('SUM(wsum)', 'SUM(sumtime)'),
+        'count': ('SUM(count)',),
+        'max': ('MAX(max)',),
+        'maxmin': ('MAX(min)',),
+        'maxsum': ('MAX(sum)',),
+        'meanmax': ('AVG(max)',),
+        'meanmin': ('AVG(min)',),
+        'min': ('MIN(min)',),
+        'minmax': ('MIN(max)',),
+        'minsum': ('MIN(sum)',),
+        'sum': ('SUM(sum)',),
+    }
+
+    multi_sql = "SELECT %(columns)s FROM %(table_name)s_day_%(obs_key)s " \
+                "WHERE dateTime >= %(start)s AND dateTime < %(stop)s"
+
+    @staticmethod
+    def get_aggregates(obs_type, timespan, aggregate_types, db_manager, **option_dict):
+        """Calculate several aggregations of a type with one query of the daily summaries.
+        Only the aggregates in multi_sql_dict are calculated; the rest are left to
+        get_aggregate()."""
+
+        aggregate_types = sorted({a for a in aggregate_types
+                                  if a and a.lower() in DailySummaries.multi_sql_dict})
+        if not aggregate_types:
+            return {}
+
+        # Check to see whether we can use the daily summaries:
+        DailySummaries.check_eligibility(obs_type, timespan, db_manager, aggregate_types[0])
+
+        start = weeutil.weeutil.startOfDay(timespan.start)
+        rows = {}
+        if db_manager.connection.dbtype == 'influxdb':
+            columns = sorted({column for a in aggregate_types
+                              for column in DailySummaries.agg_flux_dict[a.lower()][0]})
+            days = DailySummaries.get_flux_days(obs_type, start, timespan.stop, db_manager,
+                                                columns)
+            for a in aggregate_types:
+                rows[a] = DailySummaries.agg_flux_dict[a.lower()][1](days, None)
+        else:
+            columns = [DailySummaries.multi_sql_dict[a.lower()] for a in aggregate_types]
+            row = db_manager.getSql(DailySummaries.multi_sql % {
+                'columns': ', '.join(c for group in columns for c in group),
+                'table_name': db_manager.table_name,
+                'obs_key': obs_type,
+                'start': start,
+                'stop': timespan.stop,
+            })
+            i = 0
+            for a, group in zip(aggregate_types, columns):
+                rows[a] = row[i:i + len(group)] if row else None
+                i += len(group)
+
+        return {a: DailySummaries._form_value_tuple(obs_type, a.lower(), rows[a], db_manager)
+                for a in aggregate_types}
+
+    @staticmethod
+    def _form_value_tuple(obs_type, aggregate_type, row, db_manager):
+        """Form the ValueTuple of an aggregation from the row returned by the database."""
 
         # Each aggregation type requires a slightly different calculation.
         if not row or None in row:
@@ -719,16 +1239,23 @@ class DailySummaries(XType):
             group_by_group = 'month'
         else:
             group_by_group = 'day'
-        # Add the database-specific GROUP_BY clause to the interpolation dictionary
-        interp_dict['group_def'] = DailySummaries.group_defs[dbtype][group_by_group] % interp_dict
-        # This is the final SELECT statement.
-        sql_stmt = DailySummaries.common[aggregate_type] % interp_dict
+        if dbtype == 'influxdb':
+            rows = DailySummaries.gen_flux_series_rows(obs_type, timespan, db_manager,
+                                                       aggregate_type, group_by_group,
+                                                       interp_dict)
+        else:
+            # Add the database-specific GROUP_BY clause to the interpolation dictionary
+            interp_dict['group_def'] = DailySummaries.group_defs[dbtype][group_by_group] \
+                                       % interp_dict
+            # This is the final SELECT statement.
+            sql_stmt = DailySummaries.common[aggregate_type] % interp_dict
+            rows = db_manager.genSql(sql_stmt)
 
         start_list = list()
         stop_list = list()
         data_list = list()
 
-        for row in db_manager.genSql(sql_stmt):
+        for row in rows:
             # Find the start of this aggregation interval. That's easy: it's the minimum value.
             start_time = row[0]
             # The stop is a little trickier. It's the maximum dateTime in the interval, plus one
@@ -756,6 +1283,64 @@ class DailySummaries(XType):
                 ValueTuple(stop_list, 'unix_epoch', 'group_time'),
                 ValueTuple(data_list, unit, unit_group))
 
+    # Flux query that fetches some columns of the daily summaries in InfluxDB. Each row is
+    # (dateTime, column, value). See weewx.manager.DaySummaryManager.
+    day_flux = 'from(bucket: "%(bucket)s") |> range(start: %(start)d, stop: %(stop)d) ' \
+               '|> filter(fn: (r) => r._measurement == "%(table_name)s_day_%(obs_key)s" ' \
+               'and (%(field_filter)s)) ' \
+               '|> map(fn: (r) => ({dateTime: int(v: r._time) / 1000000000, stat: r._field, ' \
+               'value: r._value}))'
+
+    @staticmethod
+    def get_flux_days(obs_type, start, stop, db_manager, columns):
+        """Fetch the daily summaries of a type from InfluxDB.
+
+        Args:
+            obs_type (str): The type, such as 'outTemp'.
+            start (int): Fetch days starting on or after this time...
+            stop (int): ... and before this time.
+            db_manager (weewx.manager.Manager): A manager bound to an InfluxDB database.
+            columns (tuple[str]): The columns to fetch.
+
+        Returns:
+            list[dict]: One dictionary per day, in time order, with the day in key 'dateTime'.
+        """
+        stmt = DailySummaries.day_flux % {
+            'bucket': db_manager.database_name,
+            'table_name': db_manager.table_name,
+            'obs_key': obs_type,
+            'start': int(start),
+            'stop': int(stop),
+            'field_filter': ' or '.join('r._field == "%s"' % c for c in columns),
+        }
+        days = {}
+        for ts, column, value in db_manager.genSql(stmt):
+            days.setdefault(ts, {'dateTime': ts})[column] = value
+        return [days[ts] for ts in sorted(days)]
+
+    @staticmethod
+    def gen_flux_series_rows(obs_type, timespan, db_manager, aggregate_type, group_by_group,
+                             interp_dict):
+        """Group the daily summaries in InfluxDB the way the GROUP BY clauses in group_defs do.
+        Yields the same rows the SQL statements in 'common' would."""
+        days = DailySummaries.get_flux_days(obs_type, timespan.start, timespan.stop, db_manager,
+                                            DailySummaries.agg_flux_dict[aggregate_type][0])
+        sod_date = datetime.date.fromtimestamp(interp_dict['sod'])
+        groups = {}
+        for day in days:
+            date = datetime.date.fromtimestamp(day['dateTime'])
+            if group_by_group == 'year':
+                key = date.year
+            elif group_by_group == 'month':
+                key = (date.year, date.month)
+            else:
+                key = (date - sod_date).days // interp_dict['agg_days']
+            groups.setdefault(key, []).append(day)
+        for key in sorted(groups):
+            group = groups[key]
+            yield (group[0]['dateTime'], group[-1]['dateTime']) \
+                + DailySummaries.agg_flux_dict[aggregate_type][1](group, None)
+
     @staticmethod
     def check_eligibility(obs_type, timespan, db_manager, aggregate_type):
 
@@ -786,6 +1371,13 @@ class AggregateHeatCool(XType):
     default_coolbase = (65.0, "degree_F", "group_temperature")
     default_growbase = (50.0, "degree_F", "group_temperature")
 
+    @staticmethod
+    def get_aggregates(obs_type, timespan, aggregate_types, db_manager, **option_dict):
+        """Degree days are calculated one aggregate at a time."""
+        if obs_type not in ['heatdeg', 'cooldeg', 'growdeg']:
+            raise weewx.UnknownType(obs_type)
+        return {}
+
     @staticmethod
     def get_aggregate(obs_type, timespan, aggregate_type, db_manager, **option_dict):
         """Returns heating and cooling degree days over a time period.
@@ -1071,6 +1663,13 @@ class WindVec(XType):
                 ValueTuple(stop_vec, 'unix_epoch', 'group_time'),
                 ValueTuple(data_vec, unit, unit_group))
 
+    @staticmethod
+    def get_aggregates(obs_type, timespan, aggregate_types, db_manager, **option_dict):
+        """Wind vectors are aggregated one aggregate at a time."""
+        if obs_type not in WindVec.windvec_types:
+            raise weewx.UnknownType(obs_type)
+        return {}
+
     @staticmethod
     def get_aggregate(obs_type, timespan, aggregate_type, db_manager, **option_dict):
         """Returns an aggregation of a wind vector type over a timespan by using the main archive
@@ -1189,6 +1788,13 @@ class WindVec(XType):
 class WindVecDaily(XType):
     """Extension for calculating the average windvec, using the  daily summaries."""
 
+    @staticmethod
+    def get_aggregates(obs_type, timespan, aggregate_types, db_manager, **option_dict):
+        """The average windvec is calculated one aggregate at a time."""
+        if obs_type != 'windvec':
+            raise weewx.UnknownType(obs_type)
+        return {}
+
     @staticmethod
     def get_aggregate(obs_type, timespan, aggregate_type, db_manager, **option_dict):
         """Optimization for calculating 'avg' aggregations for type 'windvec'. The